@@ -1,8 +1,156 @@
 from django.contrib import admin
-from .models import Project, Assignment, UserProfile, Application, Category
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.functional import cached_property
+from . import notifications, recommendations
+from .assignments import LOOKUP_CHUNK_SIZE, chunked
+from .caching import PROJECTS_TAG
+from .forms import ReferenceDataMultipleChoiceField
+from .invalidation import bus
+from .models import Project, Assignment, UserProfile, Application, Category, DeletionTask, OutboxMessage
+
+
+def estimated_row_count(model, using='default'):
+    """Cheap estimate of a table's size, without a full COUNT(*)."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    # Primary keys only grow, so the largest one bounds the row count
+    return model.objects.using(using).aggregate(max_pk=Max('pk'))['max_pk'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts exactly up to EXACT_COUNT_LIMIT rows with a bounded subquery.
+    Larger unfiltered changelists use estimated_row_count(), larger
+    filtered ones stop at the limit.
+    """
+    EXACT_COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = self.EXACT_COUNT_LIMIT
+        count = queryset.order_by()[:limit + 1].count()
+        if count <= limit:
+            return count
+        if not queryset.query.has_filters():
+            return max(estimated_row_count(queryset.model, queryset.db), count)
+        return count
+
+
+class ScalableChangeListMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(Project)
+class ProjectAdmin(ScalableChangeListMixin, admin.ModelAdmin):
+    list_display = ('name', 'created_at', 'deletion_pending')
+    list_filter = ('created_at', 'deletion_pending')
+    search_fields = ('^name',)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        # Category choices come from the process-local reference-data cache
+        if db_field.name == 'categories':
+            kwargs['form_class'] = ReferenceDataMultipleChoiceField
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+@admin.register(Application)
+class ApplicationAdmin(ScalableChangeListMixin, admin.ModelAdmin):
+    list_display = ('user', 'project', 'status', 'created_at')
+    list_select_related = ('user', 'project')
+    list_filter = ('status', 'created_at')
+    search_fields = ('^user__username', '^project__name')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('project',)
+    actions = ['accept_applications', 'reject_applications']
+
+    def _notify(self, application_ids, status):
+        # Outbox rows for the applicants, in the action's transaction
+        event = notifications.DECISION_EVENTS[status]
+        for chunk in chunked(application_ids, LOOKUP_CHUNK_SIZE):
+            rows = Application.objects.filter(id__in=chunk).values_list('user_id', 'project_id', 'project__name')
+            notifications.notify_many(
+                (user_id, event, {'project_id': project_id, 'project_name': project_name})
+                for user_id, project_id, project_name in rows
+            )
+
+    @admin.action(description="Accept selected pending applications")
+    def accept_applications(self, request, queryset):
+        pending = queryset.filter(status='pending')
+        with transaction.atomic():
+            decided = list(pending.values_list('id', flat=True))
+            # Assignments for the accepted pairs, inserted in chunks
+            pairs = pending.values_list('user_id', 'project_id').iterator(chunk_size=1000)
+            batch, project_ids = [], set()
+            for user_id, project_id in pairs:
+                batch.append(Assignment(user_id=user_id, project_id=project_id))
+                project_ids.add(project_id)
+                if len(batch) >= 1000:
+                    Assignment.objects.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+            if batch:
+                Assignment.objects.bulk_create(batch, ignore_conflicts=True)
+            updated = pending.update(status='accepted', decided_at=timezone.now())
+            self._notify(decided, 'accepted')
+            bus.publish(PROJECTS_TAG)
+            # bulk_create() sends no signals
+            recommendations.mark(project_ids)
+        self.message_user(request, f"Accepted {updated} application(s).")
+
+    @admin.action(description="Reject selected pending applications")
+    def reject_applications(self, request, queryset):
+        pending = queryset.filter(status='pending')
+        with transaction.atomic():
+            decided = list(pending.values_list('id', flat=True))
+            updated = pending.update(status='rejected', decided_at=timezone.now())
+            self._notify(decided, 'rejected')
+            bus.publish(PROJECTS_TAG)
+        self.message_user(request, f"Rejected {updated} application(s).")
+
+
+@admin.register(Assignment)
+class AssignmentAdmin(ScalableChangeListMixin, admin.ModelAdmin):
+    list_display = ('user', 'project')
+    list_select_related = ('user', 'project')
+    search_fields = ('^user__username', '^project__name')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('project',)
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(ScalableChangeListMixin, admin.ModelAdmin):
+    list_select_related = ('user',)
+    search_fields = ('^user__username',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(DeletionTask)
+class DeletionTaskAdmin(ScalableChangeListMixin, admin.ModelAdmin):
+    list_display = ('target', 'object_repr', 'status', 'step', 'rows_deleted', 'created_at', 'finished_at')
+    list_filter = ('status', 'target')
+    readonly_fields = [field.name for field in DeletionTask._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(ScalableChangeListMixin, admin.ModelAdmin):
+    list_display = ('user', 'event', 'status', 'attempts', 'created_at', 'sent_at')
+    list_select_related = ('user',)
+    list_filter = ('status', 'event')
+    search_fields = ('^user__username',)
+    raw_id_fields = ('user',)
+
 
-admin.site.register(Project)
-admin.site.register(Assignment)
-admin.site.register(UserProfile)
-admin.site.register(Application)
 admin.site.register(Category)
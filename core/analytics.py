@@ -0,0 +1,231 @@
+"""
+Club analytics served from daily rollups.
+
+refresh() adds the applications created and the decisions made since the
+watermark to per-day counters in AnalyticsRollup, then moves the watermark.
+Each run reads only the new rows: counts are grouped in SQL per day, and
+per category or mentor of the project, and decision times are binned into
+a fixed histogram (with NumPy when it is installed). A row is only picked
+up once it is SETTLE old, so a transaction that commits just after a run
+can't be skipped.
+
+summary() builds the page and the JSON API from the rollups of the last
+`days` days. Its cost depends on the window and the number of categories
+and mentors, not on the number of applications. Project fill ratios are a
+snapshot of the current projects, rewritten by every refresh.
+"""
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import jobs, refdata
+from .models import AnalyticsRollup, AnalyticsWatermark, Application, Job, Project
+
+try:
+    import numpy
+except ImportError:  # Optional; binning falls back to bisect
+    numpy = None
+
+REFRESH_JOB = 'core.refresh_analytics'
+WATERMARK = 'rollups'
+EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+# Rows younger than this are left for the next run
+SETTLE = timedelta(minutes=1)
+
+# Reading analytics older than this queues a refresh
+REFRESH_AFTER = timedelta(minutes=5)
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 365
+
+DECISIONS = ('accepted', 'rejected')
+
+# Upper bounds, in hours, of the decision time buckets; one more bucket holds the rest
+DECISION_BUCKETS = (1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720)
+BUCKET_LABELS = tuple(f"≤ {bound} h" for bound in DECISION_BUCKETS) + (f"> {DECISION_BUCKETS[-1]} h",)
+
+FILL_LABELS = ('Under 25%', '25–50%', '50–75%', '75–99%', 'Full', 'No limit')
+
+# Decisions are also counted per key of these relations of the project
+DIMENSIONS = {
+    'category': 'project__categories',
+    'mentor': 'project__mentors',
+}
+
+
+def decision_buckets(hours):
+    """Histogram bucket of each decision time, in hours."""
+    if numpy is not None:
+        bounds = numpy.asarray(DECISION_BUCKETS, dtype=float)
+        return numpy.searchsorted(bounds, numpy.asarray(hours, dtype=float), side='left').tolist()
+    return [bisect_left(DECISION_BUCKETS, value) for value in hours]
+
+
+def fill_bucket(capacity, assigned):
+    if capacity is None:
+        return 5
+    if assigned >= capacity:
+        return 4
+    return min(int(4 * assigned / capacity), 3)
+
+
+def _new_rows(since, until):
+    counts = Counter()
+    created = Application.objects.filter(created_at__gt=since, created_at__lte=until)
+    rows = created.annotate(day=TruncDate('created_at')).values_list('day').annotate(n=Count('id')).order_by()
+    for day, n in rows:
+        counts[day, 'applications', '', 0] += n
+
+    decided = Application.objects.filter(decided_at__gt=since, decided_at__lte=until, status__in=DECISIONS)
+    per_day = decided.annotate(day=TruncDate('decided_at'))
+    for day, status, n in per_day.values_list('day', 'status').annotate(n=Count('id')).order_by():
+        counts[day, status, '', 0] += n
+    for dimension, field in DIMENSIONS.items():
+        rows = per_day.filter(**{f'{field}__isnull': False}).values_list('day', 'status', field)
+        for day, status, key, n in rows.annotate(n=Count('id')).order_by():
+            counts[day, status, dimension, key] += n
+
+    days, hours = [], []
+    for created_at, decided_at in decided.values_list('created_at', 'decided_at').iterator(chunk_size=5000):
+        days.append(timezone.localdate(decided_at))
+        hours.append((decided_at - created_at).total_seconds() / 3600)
+    for day, bucket in zip(days, decision_buckets(hours)):
+        counts[day, 'decision_time', 'bucket', bucket] += 1
+    return counts
+
+
+def _add(counts):
+    """Add the counters to their rollup rows, creating missing ones."""
+    if not counts:
+        return
+    days = [day for day, *_ in counts]
+    existing = {
+        (row.day, row.metric, row.dimension, row.key): row
+        for row in AnalyticsRollup.objects.filter(day__gte=min(days), day__lte=max(days))
+    }
+    changed, added = [], []
+    for (day, metric, dimension, key), n in counts.items():
+        row = existing.get((day, metric, dimension, key))
+        if row is None:
+            added.append(AnalyticsRollup(day=day, metric=metric, dimension=dimension, key=key, value=n))
+        else:
+            row.value += n
+            changed.append(row)
+    AnalyticsRollup.objects.bulk_update(changed, ['value'], batch_size=1000)
+    AnalyticsRollup.objects.bulk_create(added, batch_size=1000)
+
+
+def _snapshot_fill(today):
+    counts = Counter()
+    projects = Project.objects.visible().annotate(assigned=Count('assignment')).order_by()
+    for capacity, assigned in projects.values_list('capacity', 'assigned').iterator(chunk_size=5000):
+        counts[fill_bucket(capacity, assigned)] += 1
+    AnalyticsRollup.objects.filter(metric='fill').delete()
+    AnalyticsRollup.objects.bulk_create([
+        AnalyticsRollup(day=today, metric='fill', dimension='bucket', key=key, value=n)
+        for key, n in counts.items()
+    ])
+
+
+def refresh(now=None):
+    """Add everything since the watermark to the rollups and move it forward."""
+    now = now or timezone.now()
+    until = now - SETTLE
+    with transaction.atomic():
+        watermark, _ = AnalyticsWatermark.objects.select_for_update().get_or_create(
+            name=WATERMARK, defaults={'value': EPOCH},
+        )
+        since = watermark.value
+        counts = _new_rows(since, until) if until > since else Counter()
+        _add(counts)
+        _snapshot_fill(timezone.localdate(now))
+        if until > since:
+            watermark.value = until
+            watermark.save(update_fields=['value', 'updated_at'])
+    return {'counters': len(counts), 'since': since.isoformat(), 'until': watermark.value.isoformat()}
+
+
+def schedule_refresh():
+    """Queue a refresh if the rollups are stale and none is waiting."""
+    watermark = AnalyticsWatermark.objects.filter(name=WATERMARK).values_list('value', flat=True).first()
+    if watermark is not None and watermark > timezone.now() - SETTLE - REFRESH_AFTER:
+        return None
+    if Job.objects.filter(name=REFRESH_JOB, status__in=('queued', 'running')).exists():
+        return None
+    return jobs.enqueue(REFRESH_JOB)
+
+
+def percentile(histogram, fraction):
+    """Label of the bucket holding the given fraction of decisions."""
+    total = sum(histogram)
+    if not total:
+        return None
+    running = 0
+    for bucket, n in enumerate(histogram):
+        running += n
+        if running >= fraction * total:
+            break
+    return BUCKET_LABELS[bucket]
+
+
+def _rates(counts, names):
+    rows = []
+    for key, row in counts.items():
+        decided = row['accepted'] + row['rejected']
+        rows.append({
+            'id': key,
+            'name': names.get(key, f"#{key}"),
+            'accepted': row['accepted'],
+            'rejected': row['rejected'],
+            'rate': row['accepted'] / decided if decided else None,
+        })
+    return sorted(rows, key=lambda row: row['name'].casefold())
+
+
+def summary(days=DEFAULT_DAYS, today=None):
+    """Chart data for the last `days` days, read from the rollups."""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    per_day = {start + timedelta(days=n): dict.fromkeys(('applications', *DECISIONS), 0) for n in range(days)}
+    by_key = {dimension: defaultdict(lambda: dict.fromkeys(DECISIONS, 0)) for dimension in DIMENSIONS}
+    histogram = [0] * (len(DECISION_BUCKETS) + 1)
+    fill = [0] * len(FILL_LABELS)
+
+    rollups = AnalyticsRollup.objects.filter(day__gte=start, day__lte=today).exclude(metric='fill')
+    for day, metric, dimension, key, value in rollups.values_list('day', 'metric', 'dimension', 'key', 'value'):
+        if not dimension:
+            per_day[day][metric] += value
+        elif dimension == 'bucket':
+            histogram[key] += value
+        else:
+            by_key[dimension][key][metric] += value
+    for key, value in AnalyticsRollup.objects.filter(metric='fill').values_list('key', 'value'):
+        fill[key] += value
+
+    categories = {category.pk: category.name for category in refdata.categories()}
+    mentors = dict(User.objects.filter(id__in=list(by_key['mentor'])).values_list('id', 'username'))
+    watermark = AnalyticsWatermark.objects.filter(name=WATERMARK).values_list('value', flat=True).first()
+    totals = {metric: sum(row[metric] for row in per_day.values()) for metric in ('applications', *DECISIONS)}
+    decided = totals['accepted'] + totals['rejected']
+    return {
+        'days': days,
+        'updated_at': watermark.isoformat() if watermark else None,
+        'totals': {**totals, 'rate': totals['accepted'] / decided if decided else None},
+        'per_day': [{'date': day.isoformat(), **counts} for day, counts in per_day.items()],
+        'by_category': _rates(by_key['category'], categories),
+        'by_mentor': _rates(by_key['mentor'], mentors),
+        'decision_time': {
+            'histogram': [{'label': label, 'count': n} for label, n in zip(BUCKET_LABELS, histogram)],
+            'p50': percentile(histogram, 0.5),
+            'p90': percentile(histogram, 0.9),
+            'p99': percentile(histogram, 0.99),
+        },
+        'fill': [{'label': label, 'count': n} for label, n in zip(FILL_LABELS, fill)],
+    }
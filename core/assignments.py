@@ -0,0 +1,148 @@
+"""
+Bulk assignment of users to projects.
+
+Everything is validated against id sets loaded with one query per table,
+and the new rows are written with chunked bulk_create() in one transaction.
+"""
+import csv
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .caching import PROJECTS_TAG
+from .invalidation import bus
+from .models import Assignment, Project
+
+CHUNK_SIZE = 1000
+
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def chunked(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class BulkAssignmentError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def resolve_usernames(usernames):
+    """
+    Map usernames to ids, raising BulkAssignmentError for unknown ones.
+    Deactivated users and users waiting for deletion count as unknown.
+    """
+    from . import deletion
+
+    usernames = set(usernames)
+    ids = {}
+    assignable = User.objects.filter(is_active=True).exclude(id__in=deletion.pending_ids(User))
+    for chunk in chunked(usernames, LOOKUP_CHUNK_SIZE):
+        ids.update(assignable.filter(username__in=chunk).values_list('username', 'id'))
+    unknown = sorted(usernames - ids.keys())
+    if unknown:
+        raise BulkAssignmentError([f"Unknown user(s): {', '.join(unknown[:10])}" + ("…" if len(unknown) > 10 else "")])
+    return ids
+
+
+def _decoded_lines(uploaded_file):
+    for line_number, line in enumerate(uploaded_file, start=1):
+        try:
+            yield line.decode('utf-8-sig' if line_number == 1 else 'utf-8')
+        except UnicodeDecodeError:
+            raise BulkAssignmentError([f"Line {line_number}: the file isn't valid UTF-8."])
+
+
+def parse_assignment_csv(uploaded_file):
+    """
+    Read (user_id, project_id) pairs from a CSV with `username` and
+    `project` columns; `project` is a project id or an exact project name.
+    """
+    reader = csv.DictReader(_decoded_lines(uploaded_file))
+    rows = []
+    try:
+        if not reader.fieldnames or not {'username', 'project'} <= set(reader.fieldnames):
+            raise BulkAssignmentError(["CSV must have 'username' and 'project' columns."])
+        for row in reader:
+            # Short rows leave the missing cells None
+            username = (row.get('username') or '').strip()
+            if username:
+                rows.append((username, (row.get('project') or '').strip()))
+    except csv.Error as exc:
+        raise BulkAssignmentError([f"Line {reader.line_num}: {exc}"])
+    user_ids = resolve_usernames(username for username, _ in rows)
+
+    project_refs = {ref for _, ref in rows}
+    numeric_refs = {int(ref) for ref in project_refs if ref.isdigit()}
+    project_ids = set(Project.objects.visible().filter(id__in=numeric_refs).values_list('id', flat=True))
+    ids_by_name = {}
+    for project_id, name in Project.objects.visible().filter(name__in=project_refs - {str(i) for i in project_ids}).values_list('id', 'name'):
+        ids_by_name.setdefault(name, []).append(project_id)
+
+    errors = []
+    pairs = set()
+    for line, (username, ref) in enumerate(rows, start=2):
+        if ref.isdigit() and int(ref) in project_ids:
+            project_id = int(ref)
+        elif len(ids_by_name.get(ref, [])) == 1:
+            project_id = ids_by_name[ref][0]
+        elif ref in ids_by_name:
+            errors.append(f"Line {line}: project name '{ref}' is ambiguous, use its id.")
+            continue
+        else:
+            errors.append(f"Line {line}: unknown project '{ref}'.")
+            continue
+        pairs.add((user_ids[username], project_id))
+    if errors:
+        raise BulkAssignmentError(errors[:10])
+    return pairs
+
+
+def _insert(assignments):
+    """Insert a chunk of assignments; returns how many rows were actually added."""
+    try:
+        with transaction.atomic():
+            Assignment.objects.bulk_create(assignments)
+        return len(assignments)
+    except IntegrityError:
+        # Some were assigned concurrently since the lookup; add the rest one by one
+        return sum(
+            Assignment.objects.get_or_create(user_id=assignment.user_id, project_id=assignment.project_id)[1]
+            for assignment in assignments
+        )
+
+
+def bulk_assign(pairs, chunk_size=CHUNK_SIZE):
+    """
+    Create an Assignment for every (user_id, project_id) pair.
+    Returns (created, already_existing).
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return 0, 0
+    user_ids = {user_id for user_id, _ in pairs}
+    project_ids = {project_id for _, project_id in pairs}
+
+    with transaction.atomic():
+        existing = set()
+        for chunk in chunked(user_ids, LOOKUP_CHUNK_SIZE):
+            existing.update(
+                Assignment.objects.filter(user_id__in=chunk, project_id__in=project_ids)
+                .values_list('user_id', 'project_id')
+            )
+        existing &= pairs
+        new = [Assignment(user_id=user_id, project_id=project_id) for user_id, project_id in sorted(pairs - existing)]
+        created = 0
+        for start in range(0, len(new), chunk_size):
+            created += _insert(new[start:start + chunk_size])
+        if new:
+            from . import recommendations
+
+            # bulk_create() sends no signals
+            bus.publish(PROJECTS_TAG)
+            recommendations.mark(assignment.project_id for assignment in new)
+    return created, len(pairs) - created
@@ -0,0 +1,202 @@
+"""
+Prefix autocomplete for project names and usernames/emails.
+
+Each index is a sorted list of (case-folded key, id) pairs searched with
+bisect, so a lookup costs O(log n + k). The index is loaded once per worker,
+updated in place by the writing worker after commit, and dropped in the
+other workers through the invalidation bus. Above `max_entries` rows the
+index is not kept in memory and lookups use an istartswith query instead.
+"""
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+from .invalidation import bus
+from .models import Project
+
+NAMESPACE = 'autocomplete'
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+class PrefixIndex:
+    def __init__(self, model, max_entries=None):
+        self.model = model
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._overflow = False
+        self._entries = []
+        self._labels = {}
+        self._keys = {}
+
+    # Subclasses describe how rows are keyed and labelled
+    fields = ()
+
+    def keys_for(self, row):
+        raise NotImplementedError
+
+    def label_for(self, row):
+        raise NotImplementedError
+
+    def fallback_queryset(self, prefix):
+        raise NotImplementedError
+
+    def queryset(self):
+        return self.model.objects.all()
+
+    def is_listed(self, instance):
+        return True
+
+    def _max_entries(self):
+        if self.max_entries is not None:
+            return self.max_entries
+        return getattr(settings, 'CORE_AUTOCOMPLETE_MAX_ENTRIES', 200_000)
+
+    def clear(self):
+        with self._lock:
+            self._loaded = False
+            self._overflow = False
+            self._entries = []
+            self._labels = {}
+            self._keys = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            limit = self._max_entries()
+            entries, labels, keys = [], {}, {}
+            rows = self.queryset().values_list('id', *self.fields).iterator(chunk_size=2000)
+            for row in rows:
+                row_keys = self.keys_for(row)
+                entries.extend((key, row[0]) for key in row_keys)
+                labels[row[0]] = self.label_for(row)
+                keys[row[0]] = row_keys
+                if len(labels) > limit:
+                    entries, labels, keys = [], {}, {}
+                    self._overflow = True
+                    break
+            entries.sort()
+            self._entries, self._labels, self._keys = entries, labels, keys
+            self._loaded = True
+
+    def _remove_locked(self, pk):
+        for key in self._keys.pop(pk, ()):
+            i = bisect_left(self._entries, (key, pk))
+            if i < len(self._entries) and self._entries[i] == (key, pk):
+                del self._entries[i]
+        self._labels.pop(pk, None)
+
+    def update(self, row):
+        """Insert or replace one row, given as values_list('id', *fields)."""
+        with self._lock:
+            if not self._loaded or self._overflow:
+                return
+            pk = row[0]
+            self._remove_locked(pk)
+            if len(self._labels) >= self._max_entries():
+                # Grew past the cap: switch to the database path
+                self._overflow = True
+                self._entries, self._labels, self._keys = [], {}, {}
+                return
+            row_keys = self.keys_for(row)
+            for key in row_keys:
+                insort(self._entries, (key, pk))
+            self._labels[pk] = self.label_for(row)
+            self._keys[pk] = row_keys
+
+    def remove(self, pk):
+        with self._lock:
+            if self._loaded and not self._overflow:
+                self._remove_locked(pk)
+
+    def search(self, prefix, limit=DEFAULT_LIMIT):
+        """Top `limit` rows with a key starting with `prefix`, in key order."""
+        prefix = prefix.casefold()
+        self._ensure_loaded()
+        if self._overflow:
+            rows = self.fallback_queryset(prefix).values_list('id', *self.fields)[:limit]
+            return [{'id': row[0], 'label': self.label_for(row)} for row in rows]
+
+        entries = self._entries
+        results, seen = [], set()
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(results) < limit:
+            key, pk = entries[i]
+            if not key.startswith(prefix):
+                break
+            if pk not in seen:
+                seen.add(pk)
+                results.append({'id': pk, 'label': self._labels[pk]})
+            i += 1
+        return results
+
+
+class ProjectIndex(PrefixIndex):
+    fields = ('name',)
+
+    def keys_for(self, row):
+        return (row[1].casefold(),)
+
+    def label_for(self, row):
+        return row[1]
+
+    def fallback_queryset(self, prefix):
+        return self.queryset().filter(name__istartswith=prefix).order_by('name')
+
+    def queryset(self):
+        return self.model.objects.visible()
+
+    def is_listed(self, instance):
+        return not instance.deletion_pending
+
+
+class UserIndex(PrefixIndex):
+    fields = ('username', 'email')
+
+    def keys_for(self, row):
+        _, username, email = row
+        return tuple(dict.fromkeys(key.casefold() for key in (username, email) if key))
+
+    def label_for(self, row):
+        _, username, email = row
+        return f"{username} ({email})" if email else username
+
+    def queryset(self):
+        return self.model.objects.filter(is_active=True)
+
+    def is_listed(self, instance):
+        return instance.is_active
+
+    def fallback_queryset(self, prefix):
+        return self.queryset().filter(
+            Q(username__istartswith=prefix) | Q(email__istartswith=prefix)
+        ).order_by('username')
+
+
+indexes = {
+    'projects': ProjectIndex(Project),
+    'users': UserIndex(User),
+}
+
+
+def _clear_all():
+    for index in indexes.values():
+        index.clear()
+
+
+bus.subscribe(NAMESPACE, _clear_all)
+
+
+def index_for_model(model):
+    for index in indexes.values():
+        if index.model is model:
+            return index
+    return None
@@ -0,0 +1,147 @@
+"""
+Per-worker bitmap index over Course for the course list filters and facets.
+
+Courses are numbered by their position in the list order (level, name).
+For every level and every programming language the index keeps a Python
+int whose bit i is set when course i has it. A filter is then an OR of the
+checked languages ANDed with the level's bitset, and a facet count is the
+popcount of one more AND, with no join or DISTINCT. The database is read to
+build the index, for the text search (one query on the course table), and
+to load the rows of the final result.
+
+The index is dropped whenever the 'courses' namespace is published on the
+invalidation bus (every Course or course-language write, see
+core/signals.py), and rebuilt on next use.
+"""
+import threading
+
+from django.db.models import Q
+
+from .caching import COURSES_TAG
+from .invalidation import bus
+from .models import Course
+
+CourseLanguage = Course.programming_languages.through
+
+
+def bitset(positions, size):
+    """An int with the given bit positions set, built in O(size)."""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def positions_of(mask):
+    """Set bit positions of `mask`, lowest first."""
+    # Scanning the binary string skips runs of zeros in C
+    bits = bin(mask)[:1:-1]
+    position = bits.find('1')
+    while position != -1:
+        yield position
+        position = bits.find('1', position + 1)
+
+
+class CourseBitmapIndex:
+    def __init__(self, ids, levels, languages):
+        self.ids = ids
+        self.positions = {course_id: position for position, course_id in enumerate(ids)}
+        self.all = (1 << len(ids)) - 1
+        self.levels = levels
+        self.languages = languages
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls):
+        ids, by_level = [], {}
+        rows = Course.objects.order_by('level', 'name').values_list('id', 'level')
+        for position, (course_id, level) in enumerate(rows.iterator(chunk_size=5000)):
+            ids.append(course_id)
+            by_level.setdefault(level, []).append(position)
+
+        positions = {course_id: position for position, course_id in enumerate(ids)}
+        by_language = {}
+        links = CourseLanguage.objects.values_list('course_id', 'programminglanguage_id')
+        for course_id, language_id in links.iterator(chunk_size=5000):
+            by_language.setdefault(language_id, []).append(positions[course_id])
+
+        size = len(ids)
+        return cls(
+            ids,
+            {level: bitset(p, size) for level, p in by_level.items()},
+            {language_id: bitset(p, size) for language_id, p in by_language.items()},
+        )
+
+    def search(self, query):
+        """Bitset of the courses whose name or description contains `query`."""
+        matching = Course.objects.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        return bitset(
+            (self.positions[pk] for pk in matching.values_list('id', flat=True) if pk in self.positions),
+            len(self.ids),
+        )
+
+    def any_language(self, language_ids):
+        mask = 0
+        for language_id in language_ids:
+            mask |= self.languages.get(language_id, 0)
+        return mask
+
+    def match(self, language_ids=(), level=None, within=None):
+        """Courses with any of `language_ids` and the given level, within `within`."""
+        mask = self.all if within is None else within
+        if language_ids:
+            mask &= self.any_language(language_ids)
+        if level is not None:
+            mask &= self.levels.get(level, 0)
+        return mask
+
+    def ids_of(self, mask):
+        """Course ids of a bitset, in list order."""
+        return [self.ids[position] for position in positions_of(mask)]
+
+    def facets(self, language_ids=(), level=None, within=None):
+        """
+        Counts per level and per language. Languages are ORed, so language
+        counts ignore the language selection; level counts ignore the level.
+        """
+        base = self.all if within is None else within
+        by_level = self.match(language_ids, None, base)
+        by_language = self.match((), level, base)
+        return {
+            "total": self.match(language_ids, level, base).bit_count(),
+            "levels": {lvl: (by_level & mask).bit_count() for lvl, mask in self.levels.items()},
+            "languages": {lang: (by_language & mask).bit_count() for lang, mask in self.languages.items()},
+        }
+
+
+_lock = threading.Lock()
+_index = None
+_generation = 0
+
+
+def course_index():
+    """This worker's index, built on first use after every course change."""
+    global _index
+    index = _index
+    if index is not None:
+        return index
+    with _lock:
+        if _index is None:
+            generation = _generation
+            index = CourseBitmapIndex.build()
+            # A write during the build has made this copy stale already
+            if generation == _generation:
+                _index = index
+            return index
+        return _index
+
+
+def clear():
+    global _index, _generation
+    _generation += 1
+    _index = None
+
+
+bus.subscribe(COURSES_TAG, clear)
@@ -0,0 +1,135 @@
+"""
+Tag-invalidated cache for catalog queries and rendered template fragments.
+
+Every cached entry is stored under a key that embeds the current version of
+each of its tags. Invalidating a tag just gives it a new version, so all
+entries built against the old one stop matching and age out on their own.
+Only plain get/set/add calls are used, which keeps this working with both the
+local-memory and the file-based cache backends. Tags are also namespaces on
+the invalidation bus, so workers with a local-memory cache drop their copy
+when another worker writes.
+"""
+import hashlib
+import json
+import threading
+import uuid
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .invalidation import bus
+
+# Tags used by the catalog pages
+PROJECTS_TAG = 'projects'
+CATEGORIES_TAG = 'categories'
+COURSES_TAG = 'courses'
+LANGUAGES_TAG = 'languages'
+
+ALL_TAGS = (PROJECTS_TAG, CATEGORIES_TAG, COURSES_TAG, LANGUAGES_TAG)
+
+DEFAULT_TIMEOUT = 300
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'CORE_CACHE_ALIAS', 'default')]
+
+
+class CacheStats:
+    """Process-local hit/miss counters, grouped by namespace"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, namespace, hit):
+        with self._lock:
+            self._counters[namespace]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            namespaces = {name: dict(counts) for name, counts in self._counters.items()}
+        hits = sum(c['hits'] for c in namespaces.values())
+        misses = sum(c['misses'] for c in namespaces.values())
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'namespaces': namespaces,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = CacheStats()
+
+
+def _tag_key(tag):
+    return f'core:tag:{tag}'
+
+
+def tag_versions(tags):
+    """Return the current version of each tag, creating missing ones."""
+    cache = get_cache()
+    keys = [_tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            # add() keeps a version another worker created in the meantime
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def invalidate_tags(*tags):
+    """Give each tag a new version, orphaning every entry built against it."""
+    get_cache().set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+
+
+for _tag in ALL_TAGS:
+    bus.subscribe(_tag, partial(invalidate_tags, _tag))
+
+
+def make_key(namespace, parts, tags):
+    payload = json.dumps([parts, tag_versions(tags)], sort_keys=True, default=str)
+    digest = hashlib.sha1(payload.encode()).hexdigest()
+    return f'core:{namespace}:{digest}'
+
+
+def get_or_set(namespace, parts, tags, compute, timeout=DEFAULT_TIMEOUT):
+    """
+    Return the cached value for (namespace, parts), computing it on a miss.
+    `parts` must be JSON-serializable and identify the query (filters, role).
+    """
+    cache = get_cache()
+    key = make_key(namespace, parts, tags)
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        stats.record(namespace, hit=True)
+        return value
+
+    stats.record(namespace, hit=False)
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+def cached_fragment(namespace, parts, tags, template_name, context, timeout=DEFAULT_TIMEOUT):
+    """Render a template fragment once per tag version and cache the HTML."""
+    html = get_or_set(
+        namespace, parts, tags,
+        lambda: str(render_to_string(template_name, context() if callable(context) else context)),
+        timeout=timeout,
+    )
+    return mark_safe(html)
@@ -0,0 +1,292 @@
+"""
+Catalog import: categories, programming languages and courses.
+
+Input rows are diffed against the existing ones by name, then written with
+chunked bulk_create() calls: plain inserts for categories and languages, an
+upsert (update_conflicts) for courses, and direct inserts into the course ↔
+language through table. The whole import runs in one transaction; a dry run
+only computes the diff.
+"""
+import csv
+import json
+from pathlib import Path
+
+from django.db import transaction
+
+from . import similar_courses
+from .assignments import LOOKUP_CHUNK_SIZE, chunked
+from .invalidation import bus
+from .models import Category, Course, ProgrammingLanguage
+from .signals import MODEL_NAMESPACES
+
+CHUNK_SIZE = 1000
+
+KINDS = ('categories', 'languages', 'courses')
+
+# Separators accepted in the `languages` column of a courses CSV
+LANGUAGE_SEPARATORS = (';', '|')
+
+CourseLanguage = Course.programming_languages.through
+
+
+class CatalogImportError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def empty_catalog():
+    return {kind: [] for kind in KINDS}
+
+
+def _split_languages(value):
+    for separator in LANGUAGE_SEPARATORS:
+        value = value.replace(separator, ',')
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _names(rows):
+    return [row['name'] if isinstance(row, dict) else row for row in rows]
+
+
+def read_json(stream):
+    """Read {"categories": [...], "languages": [...], "courses": [...]}."""
+    data = json.load(stream)
+    if not isinstance(data, dict) or not set(data) <= set(KINDS):
+        raise CatalogImportError([f"JSON catalog must be an object with keys {', '.join(KINDS)}."])
+    catalog = empty_catalog()
+    catalog['categories'] = _names(data.get('categories', []))
+    catalog['languages'] = _names(data.get('languages', []))
+    catalog['courses'] = list(data.get('courses', []))
+    return catalog
+
+
+def read_csv(stream, kind):
+    """
+    Read one kind from a CSV. Categories and languages need a `name` column,
+    courses `name`, `description`, `level` and an optional `languages` column.
+    """
+    reader = csv.DictReader(stream)
+    required = {'name', 'description', 'level'} if kind == 'courses' else {'name'}
+    if not reader.fieldnames or not required <= set(reader.fieldnames):
+        raise CatalogImportError([f"{kind} CSV must have {', '.join(sorted(required))} columns."])
+    catalog = empty_catalog()
+    for row in reader:
+        if kind != 'courses':
+            catalog[kind].append(row['name'])
+            continue
+        catalog['courses'].append({
+            'name': row['name'],
+            'description': row['description'],
+            'level': row['level'],
+            'languages': _split_languages(row.get('languages') or ''),
+        })
+    return catalog
+
+
+def read_file(path, kind=None):
+    """Read a .json or .csv catalog file; a CSV's kind defaults to its name."""
+    path = Path(path)
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        if path.suffix.lower() == '.json':
+            return read_json(stream)
+        kind = kind or path.stem.lower()
+        if kind not in KINDS:
+            raise CatalogImportError([f"{path.name}: cannot tell which of {', '.join(KINDS)} it holds."])
+        return read_csv(stream, kind)
+
+
+def merge(*catalogs):
+    merged = empty_catalog()
+    for catalog in catalogs:
+        for kind in KINDS:
+            merged[kind].extend(catalog.get(kind, []))
+    return merged
+
+
+class ImportResult:
+    """created / updated / unchanged counts per kind"""
+
+    def __init__(self):
+        self.counts = {kind: {'created': 0, 'updated': 0, 'unchanged': 0} for kind in KINDS}
+
+    def add(self, kind, outcome, count=1):
+        self.counts[kind][outcome] += count
+
+    @property
+    def changed(self):
+        return any(c['created'] or c['updated'] for c in self.counts.values())
+
+    def as_dict(self):
+        return {kind: dict(counts) for kind, counts in self.counts.items()}
+
+
+def _clean_names(kind, names, errors):
+    cleaned, seen = [], set()
+    for name in names:
+        name = str(name).strip()
+        if not name:
+            errors.append(f"{kind}: empty name.")
+        elif name not in seen:
+            # Names are the whole row, so repeats are harmless
+            seen.add(name)
+            cleaned.append(name)
+    return cleaned
+
+
+def _clean_courses(rows, errors):
+    levels = dict(Course.LEVEL_CHOICES)
+    courses = {}
+    for number, row in enumerate(rows, start=1):
+        name = str(row.get('name', '')).strip()
+        if not name:
+            errors.append(f"courses: row {number} has no name.")
+            continue
+        if name in courses:
+            errors.append(f"courses: duplicate name '{name}'.")
+            continue
+        try:
+            level = int(row.get('level', 1))
+        except (TypeError, ValueError):
+            level = None
+        if level not in levels:
+            errors.append(f"courses: '{name}' has an invalid level '{row.get('level')}'.")
+            continue
+        languages = row.get('languages') or []
+        if isinstance(languages, str):
+            languages = _split_languages(languages)
+        courses[name] = {
+            'description': str(row.get('description', '')),
+            'level': level,
+            'languages': frozenset(str(language).strip() for language in languages),
+        }
+    return courses
+
+
+def _existing_names(model, names):
+    found = set()
+    for chunk in chunked(names, LOOKUP_CHUNK_SIZE):
+        found.update(model.objects.filter(name__in=chunk).values_list('name', flat=True))
+    return found
+
+
+def _ids_by_name(model, names):
+    ids = {}
+    for chunk in chunked(names, LOOKUP_CHUNK_SIZE):
+        ids.update(model.objects.filter(name__in=chunk).values_list('name', 'id'))
+    return ids
+
+
+def _existing_courses(names):
+    """name -> (id, description, level, frozenset of language names)"""
+    rows = {}
+    for chunk in chunked(names, LOOKUP_CHUNK_SIZE):
+        for course_id, name, description, level in (
+            Course.objects.filter(name__in=chunk).values_list('id', 'name', 'description', 'level')
+        ):
+            rows[name] = (course_id, description, level)
+    languages = {course_id: set() for course_id, _, _ in rows.values()}
+    for chunk in chunked(languages, LOOKUP_CHUNK_SIZE):
+        for course_id, language in (
+            CourseLanguage.objects.filter(course_id__in=chunk).values_list('course_id', 'programminglanguage__name')
+        ):
+            languages[course_id].add(language)
+    return {
+        name: (course_id, description, level, frozenset(languages[course_id]))
+        for name, (course_id, description, level) in rows.items()
+    }
+
+
+def import_catalog(catalog, dry_run=False, chunk_size=CHUNK_SIZE):
+    """
+    Sync the catalog into the database and return an ImportResult.
+    Raises CatalogImportError, without writing anything, on invalid input.
+    """
+    errors = []
+    categories = _clean_names('categories', catalog.get('categories', []), errors)
+    languages = _clean_names('languages', catalog.get('languages', []), errors)
+    courses = _clean_courses(catalog.get('courses', []), errors)
+    if errors:
+        raise CatalogImportError(errors[:10])
+
+    result = ImportResult()
+    existing_categories = _existing_names(Category, categories)
+    new_categories = [name for name in categories if name not in existing_categories]
+    result.add('categories', 'created', len(new_categories))
+    result.add('categories', 'unchanged', len(existing_categories))
+
+    existing_languages = _existing_names(ProgrammingLanguage, languages)
+    new_languages = [name for name in languages if name not in existing_languages]
+    result.add('languages', 'created', len(new_languages))
+    result.add('languages', 'unchanged', len(existing_languages))
+
+    referenced = set().union(*(course['languages'] for course in courses.values()))
+    unknown = referenced - set(languages) - _existing_names(ProgrammingLanguage, referenced - set(languages))
+    if unknown:
+        raise CatalogImportError([f"Unknown language(s): {', '.join(sorted(unknown)[:10])}"])
+
+    existing_courses = _existing_courses(list(courses))
+    upserts, relinked = [], []
+    for name, course in courses.items():
+        current = existing_courses.get(name)
+        if current is None:
+            result.add('courses', 'created')
+            upserts.append(name)
+            if course['languages']:
+                relinked.append(name)
+            continue
+        _, description, level, current_languages = current
+        fields_changed = (description, level) != (course['description'], course['level'])
+        languages_changed = current_languages != course['languages']
+        if not (fields_changed or languages_changed):
+            result.add('courses', 'unchanged')
+            continue
+        result.add('courses', 'updated')
+        if fields_changed:
+            upserts.append(name)
+        if languages_changed:
+            relinked.append(name)
+
+    if dry_run or not result.changed:
+        return result
+
+    with transaction.atomic():
+        Category.objects.bulk_create(
+            [Category(name=name) for name in new_categories], batch_size=chunk_size, ignore_conflicts=True,
+        )
+        ProgrammingLanguage.objects.bulk_create(
+            [ProgrammingLanguage(name=name) for name in new_languages], batch_size=chunk_size, ignore_conflicts=True,
+        )
+        Course.objects.bulk_create(
+            [Course(name=name, description=courses[name]['description'], level=courses[name]['level']) for name in upserts],
+            batch_size=chunk_size,
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['description', 'level'],
+        )
+
+        if relinked:
+            course_ids = _ids_by_name(Course, relinked)
+            language_ids = _ids_by_name(ProgrammingLanguage, referenced)
+            stale = [existing_courses[name][0] for name in relinked if name in existing_courses]
+            for chunk in chunked(stale, LOOKUP_CHUNK_SIZE):
+                CourseLanguage.objects.filter(course_id__in=chunk).delete()
+            links = [
+                CourseLanguage(course_id=course_ids[name], programminglanguage_id=language_ids[language])
+                for name in relinked
+                for language in courses[name]['languages']
+            ]
+            CourseLanguage.objects.bulk_create(links, batch_size=chunk_size, ignore_conflicts=True)
+
+        # bulk_create() and the through-table writes send no signals
+        namespaces = set()
+        if new_categories:
+            namespaces.update(MODEL_NAMESPACES[Category])
+        if new_languages:
+            namespaces.update(MODEL_NAMESPACES[ProgrammingLanguage])
+        if upserts or relinked:
+            namespaces.update(MODEL_NAMESPACES[Course])
+        if upserts:
+            namespaces.add(similar_courses.NAMESPACE)
+        bus.publish(*sorted(namespaces))
+    return result
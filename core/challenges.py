@@ -0,0 +1,228 @@
+"""
+Prediction challenges: participants of a project upload CSVs of
+predictions, scored against a ground truth only staff can see.
+
+Uploads are streamed to disk and stored as DatasetBlobs like datasets
+(core/datasets.py). Nothing is scored in the request: setup() queues a
+`core.prepare_challenge` job that compiles the ground truth once into the
+sorted, memory-mapped file score_file() reads, and submit() queues a
+`core.score_submission` job per submission. Both run the work of
+core/metrics.py in a ProcessPoolExecutor of CORE_SCORING_WORKERS processes
+(0 runs it in the job's own process), so a large file neither holds the
+GIL of a worker serving other jobs nor keeps its memory afterwards.
+
+The leaderboard is LeaderboardEntry, one row per participant holding their
+best submission. A scored submission replaces it with one conditional
+UPDATE, and the board is read as a range scan of the (challenge,
+rank_score, submitted_at) index; nothing is recomputed from submissions.
+"""
+import csv
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import jobs, metrics
+from .datasets import blob_path, dataset_dir, file_blob, remove_blob_if_unused
+from .models import Assignment, Challenge, LeaderboardEntry, Submission
+
+PREPARE_JOB = 'core.prepare_challenge'
+SCORE_JOB = 'core.score_submission'
+
+DAILY_SUBMISSIONS = 5
+DEFAULT_MAX_SUBMISSION_SIZE = 1024 ** 3
+LEADERBOARD_SIZE = 50
+
+
+class SubmissionRejected(Exception):
+    pass
+
+
+def max_submission_size():
+    return getattr(settings, 'CORE_SUBMISSION_MAX_SIZE', DEFAULT_MAX_SUBMISSION_SIZE)
+
+
+def daily_submissions():
+    return getattr(settings, 'CORE_DAILY_SUBMISSIONS', DAILY_SUBMISSIONS)
+
+
+def truth_path(challenge_id):
+    return dataset_dir() / 'challenges' / f"{challenge_id}.truth"
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def run_scoring(func, *args):
+    """Run `func(*args)` in the scoring process pool and wait for its result."""
+    workers = getattr(settings, 'CORE_SCORING_WORKERS', None)
+    if workers == 0:
+        return func(*args)
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = jobs.process_pool(workers)
+        pool = _pool
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        # A worker died (killed for memory, most likely); start a new pool next time
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def is_participant(challenge, user):
+    return Assignment.objects.filter(user=user, project_id=challenge.project_id).exists()
+
+
+def setup(project, upload, metric, id_column='id', target_column='target', closes_at=None):
+    """Create or replace the project's challenge; its submissions are scored again."""
+    with transaction.atomic():
+        previous = Challenge.objects.filter(project=project).values_list('ground_truth_id', flat=True).first()
+        challenge, _ = Challenge.objects.update_or_create(
+            project=project,
+            defaults={
+                'metric': metric,
+                'id_column': id_column,
+                'target_column': target_column,
+                'closes_at': closes_at,
+                'ground_truth': file_blob(upload),
+                'truth_rows': None,
+                'status': 'preparing',
+                'error': '',
+            },
+        )
+        if previous is not None and previous != challenge.ground_truth_id:
+            remove_blob_if_unused(previous)
+        LeaderboardEntry.objects.filter(challenge=challenge).delete()
+        challenge.submissions.update(status='pending', score=None, rows=None, error='', scored_at=None)
+        jobs.enqueue(PREPARE_JOB, {'challenge_id': challenge.pk})
+    return challenge
+
+
+def prepare(challenge_id):
+    """Compile the ground truth, open the challenge and queue its pending submissions."""
+    challenge = Challenge.objects.select_related('ground_truth').get(pk=challenge_id)
+    path = truth_path(challenge.pk)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    try:
+        rows = run_scoring(
+            metrics.build_truth, str(blob_path(challenge.ground_truth.sha256)),
+            challenge.id_column, challenge.target_column, str(temporary),
+        )
+    except (metrics.ScoringError, csv.Error, UnicodeError) as exc:
+        temporary.unlink(missing_ok=True)
+        Challenge.objects.filter(pk=challenge.pk).update(status='failed', error=str(exc))
+        return {'status': 'failed', 'error': str(exc)}
+    os.replace(temporary, path)
+    with transaction.atomic():
+        Challenge.objects.filter(pk=challenge.pk).update(status='open', truth_rows=rows, error='')
+        pending = list(challenge.submissions.filter(status='pending').values_list('pk', flat=True))
+        for submission_id in pending:
+            jobs.enqueue(SCORE_JOB, {'submission_id': submission_id})
+    return {'status': 'open', 'rows': rows, 'rescoring': len(pending)}
+
+
+def submit(challenge, user, upload):
+    """Store a participant's predictions and queue their scoring."""
+    if challenge.status == 'failed':
+        raise SubmissionRejected("This challenge isn't accepting submissions.")
+    if challenge.closes_at and timezone.now() >= challenge.closes_at:
+        raise SubmissionRejected("This challenge is closed.")
+    with transaction.atomic():
+        # Locking the assignment serializes a participant's uploads, so the daily limit holds
+        if not Assignment.objects.select_for_update().filter(user=user, project_id=challenge.project_id).exists():
+            raise SubmissionRejected("Only participants of the project can submit.")
+        since = timezone.now() - timedelta(days=1)
+        if Submission.objects.filter(challenge=challenge, user=user, created_at__gte=since).count() >= daily_submissions():
+            raise SubmissionRejected(f"You can submit {daily_submissions()} times a day.")
+        submission = Submission.objects.create(challenge=challenge, user=user, blob=file_blob(upload))
+        jobs.enqueue(SCORE_JOB, {'submission_id': submission.pk})
+    return submission
+
+
+def rank_score(challenge, score):
+    return -score if challenge.higher_is_better else score
+
+
+def record_best(submission):
+    """Make the submission its author's leaderboard entry if it beats their best."""
+    challenge = submission.challenge
+    values = {
+        'submission': submission,
+        'score': submission.score,
+        'rank_score': rank_score(challenge, submission.score),
+        'submitted_at': submission.created_at,
+    }
+    entry, created = LeaderboardEntry.objects.get_or_create(
+        challenge_id=challenge.pk, user_id=submission.user_id, defaults=values,
+    )
+    if created:
+        return True
+    better = Q(rank_score__gt=values['rank_score']) | Q(
+        rank_score=values['rank_score'], submitted_at__gt=values['submitted_at'],
+    )
+    return bool(LeaderboardEntry.objects.filter(pk=entry.pk).filter(better).update(**values))
+
+
+def score(submission_id):
+    """Score a submission and update its author's leaderboard entry."""
+    submission = Submission.objects.select_related('challenge', 'blob').get(pk=submission_id)
+    challenge = submission.challenge
+    if submission.status != 'pending' or challenge.status != 'open':
+        # prepare() queues the challenge's pending submissions once it opens
+        return {'skipped': True}
+    try:
+        result = run_scoring(
+            metrics.score_file, str(truth_path(challenge.pk)), str(blob_path(submission.blob.sha256)),
+            challenge.metric, challenge.id_column, challenge.target_column,
+        )
+    except (metrics.ScoringError, csv.Error, UnicodeError) as exc:
+        # Retrying won't fix the file
+        Submission.objects.filter(pk=submission.pk, status='pending').update(
+            status='failed', error=str(exc), scored_at=timezone.now(),
+        )
+        return {'status': 'failed', 'error': str(exc)}
+    submission.status, submission.score, submission.rows = 'done', result['score'], result['rows']
+    submission.scored_at = timezone.now()
+    with transaction.atomic():
+        scored = Submission.objects.filter(pk=submission.pk, status='pending').update(
+            status='done', score=submission.score, rows=submission.rows, scored_at=submission.scored_at,
+        )
+        best = scored and record_best(submission)
+    return {'status': 'done', 'score': submission.score, 'rows': submission.rows, 'best': bool(best)}
+
+
+def leaderboard(challenge, limit=LEADERBOARD_SIZE):
+    """Best entry of each participant, best first"""
+    entries = challenge.leaderboard.select_related('user').order_by('rank_score', 'submitted_at', 'id')[:limit]
+    return [
+        {
+            'rank': rank,
+            'user': entry.user.username,
+            'score': entry.score,
+            'submission': entry.submission_id,
+            'submitted_at': entry.submitted_at.isoformat(),
+        }
+        for rank, entry in enumerate(entries, start=1)
+    ]
+
+
+def standing(challenge, user):
+    """(rank, entry) of the user's best submission, or (None, None) if nothing is scored."""
+    entry = challenge.leaderboard.filter(user=user).first()
+    if entry is None:
+        return None, None
+    ahead = challenge.leaderboard.filter(
+        Q(rank_score__lt=entry.rank_score) | Q(rank_score=entry.rank_score, submitted_at__lt=entry.submitted_at)
+    ).count()
+    return ahead + 1, entry
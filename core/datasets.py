@@ -0,0 +1,343 @@
+"""
+Dataset library: streaming uploads, content-addressed storage, quotas and
+ranged downloads.
+
+Uploads are read by HashingUploadHandler, which writes every chunk of the
+request body straight to a temporary file under CORE_DATASET_DIR and feeds
+it to an incremental SHA-256, so no file is ever held in memory. store()
+then files the content under its hash: identical uploads share one
+DatasetBlob and one file on disk.
+
+Quotas are counters in DatasetQuota, reserved with a single conditional
+UPDATE per upload and released on delete, never recomputed by summing file
+sizes. Rows removed without going through delete() (a project's background
+deletion) are settled by `manage.py cleanup_datasets`, which also removes
+blobs nobody references any more.
+
+Downloads honour a single-range `Range` header. Without a front server the
+file is returned through FileResponse, which WSGI servers with a
+`wsgi.file_wrapper` (gunicorn, uWSGI) send with sendfile(); with
+CORE_DATASET_SENDFILE set the response only carries an X-Accel-Redirect or
+X-Sendfile header and the front server sends the bytes itself.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+from .models import Dataset, DatasetBlob, DatasetQuota
+
+DEFAULT_QUOTA = 1024 ** 3
+BLOCK_SIZE = 64 * 1024
+
+# Seconds after which a file with no blob row is considered abandoned
+STALE_FILE_AGE = 3600
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class UnsatisfiableRange(ValueError):
+    pass
+
+
+def dataset_dir():
+    return Path(getattr(settings, 'CORE_DATASET_DIR', settings.BASE_DIR / 'datasets'))
+
+
+def quota_bytes():
+    return getattr(settings, 'CORE_DATASET_QUOTA', DEFAULT_QUOTA)
+
+
+def blob_path(sha256):
+    return dataset_dir() / sha256[:2] / sha256
+
+
+def remaining(user):
+    used = DatasetQuota.objects.filter(user=user).values_list('used_bytes', flat=True).first() or 0
+    return max(quota_bytes() - used, 0)
+
+
+class HashedUploadedFile(UploadedFile):
+    """An upload already on disk, with the SHA-256 of its content."""
+
+    def __init__(self, file, name, content_type, size, charset, sha256, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Writes each uploaded file to disk chunk by chunk while hashing it. A
+    file that grows past `limit` bytes is dropped as it arrives and
+    `exceeded` is set.
+    """
+
+    def __init__(self, request=None, limit=None):
+        super().__init__(request)
+        self.limit = limit
+        self.exceeded = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        directory = dataset_dir() / 'tmp'
+        directory.mkdir(parents=True, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory, suffix='.upload', delete=False)
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def _discard(self):
+        # The parser closes `file` itself when it gives up on an upload
+        file = getattr(self, 'file', None)
+        if file is not None:
+            file.close()
+            Path(file.name).unlink(missing_ok=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.limit is not None and self.size > self.limit:
+            self.exceeded = True
+            self._discard()
+            raise SkipFile()
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+        # Consumed here; no other handler needs the bytes
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        upload = HashedUploadedFile(
+            self.file, self.file_name, self.content_type, self.size, self.charset,
+            self.hash.hexdigest(), self.content_type_extra,
+        )
+        del self.file
+        return upload
+
+    def upload_interrupted(self):
+        self._discard()
+
+
+def reserve(user, size):
+    """Charge `size` bytes to the user's quota, or raise QuotaExceeded."""
+    DatasetQuota.objects.get_or_create(user=user)
+    charged = DatasetQuota.objects.filter(user=user, used_bytes__lte=quota_bytes() - size).update(
+        used_bytes=F('used_bytes') + size, files=F('files') + 1,
+    )
+    if not charged:
+        raise QuotaExceeded(f"Uploading {size} bytes would exceed your quota of {quota_bytes()} bytes.")
+
+
+def release(user_id, size):
+    DatasetQuota.objects.filter(user_id=user_id, used_bytes__gte=size, files__gte=1).update(
+        used_bytes=F('used_bytes') - size, files=F('files') - 1,
+    )
+
+
+def file_blob(upload):
+    """
+    The DatasetBlob of an upload's content, moving its temporary file into
+    place if the content is new. Call inside a transaction.
+    """
+    blob, created = DatasetBlob.objects.get_or_create(sha256=upload.sha256, defaults={'size': upload.size})
+    path = blob_path(blob.sha256)
+    if created or not path.exists():
+        upload.file.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(upload.temporary_file_path(), path)
+    return blob
+
+
+def store(upload, project, user, description=''):
+    """Add an uploaded file to the project's datasets, deduplicated by content."""
+    temporary = Path(upload.temporary_file_path())
+    try:
+        with transaction.atomic():
+            reserve(user, upload.size)
+            return Dataset.objects.create(
+                project=project,
+                uploaded_by=user,
+                name=os.path.basename(upload.name)[:255],
+                description=description,
+                content_type=(upload.content_type or 'application/octet-stream')[:100],
+                blob=file_blob(upload),
+            )
+    finally:
+        upload.close()
+        temporary.unlink(missing_ok=True)
+
+
+def unused_blobs():
+    """Blobs no dataset, challenge or submission refers to."""
+    blobs = DatasetBlob.objects.all()
+    for rel in DatasetBlob._meta.related_objects:
+        if rel.on_delete is models.PROTECT:
+            blobs = blobs.exclude(Exists(rel.related_model.objects.filter(**{rel.field.name: OuterRef('pk')})))
+    return blobs
+
+
+def remove_blob_if_unused(blob_id):
+    """Delete a blob and, after commit, its file once nothing refers to it."""
+    blob = unused_blobs().filter(pk=blob_id).first()
+    if blob is not None:
+        path = blob_path(blob.sha256)
+        blob.delete()
+        transaction.on_commit(lambda: path.unlink(missing_ok=True))
+
+
+def delete(dataset):
+    """Remove a dataset, refund its uploader and drop content nobody else uses."""
+    with transaction.atomic():
+        if dataset.uploaded_by_id:
+            release(dataset.uploaded_by_id, dataset.blob.size)
+        dataset.delete()
+        remove_blob_if_unused(dataset.blob_id)
+
+
+def cleanup():
+    """Recount every quota and remove unreferenced blobs and stray files."""
+    with transaction.atomic():
+        usage = {
+            row['uploaded_by']: row
+            for row in Dataset.objects.filter(uploaded_by__isnull=False)
+            .values('uploaded_by').annotate(used=Sum('blob__size'), n=Count('id')).order_by()
+        }
+        quotas = list(DatasetQuota.objects.all())
+        for quota in quotas:
+            row = usage.pop(quota.user_id, {'used': 0, 'n': 0})
+            quota.used_bytes, quota.files = row['used'], row['n']
+        DatasetQuota.objects.bulk_update(quotas, ['used_bytes', 'files'], batch_size=1000)
+        DatasetQuota.objects.bulk_create(
+            [DatasetQuota(user_id=user_id, used_bytes=row['used'], files=row['n']) for user_id, row in usage.items()]
+        )
+        unused = unused_blobs()
+        removed = list(unused.values_list('sha256', flat=True))
+        unused.delete()
+
+    # Younger files may belong to an upload whose transaction is still open
+    known = set(DatasetBlob.objects.values_list('sha256', flat=True))
+    cutoff = time.time() - STALE_FILE_AGE
+    files = 0
+    for path in [*dataset_dir().glob('??/*'), *dataset_dir().glob('tmp/*.upload')]:
+        if path.is_file() and path.name not in known and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            files += 1
+    return {'quotas': len(quotas) + len(usage), 'blobs': len(removed), 'files': files}
+
+
+def parse_range(header, size):
+    """
+    Inclusive (start, end) of a single `bytes=` range, or None to send the
+    whole file (no header, several ranges, or one we don't understand).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise UnsatisfiableRange(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise UnsatisfiableRange(header)
+    return start, end
+
+
+class RangeFile:
+    """Read-only view of bytes [start, end] of an open file, for FileResponse."""
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = end - start + 1
+        self.name = file.name
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def _sendfile_response(dataset, path):
+    header = getattr(settings, 'CORE_DATASET_SENDFILE', None)
+    response = HttpResponse(content_type=dataset.content_type)
+    if header == 'X-Accel-Redirect':
+        prefix = getattr(settings, 'CORE_DATASET_ACCEL_PREFIX', '/protected/datasets/')
+        response[header] = prefix + str(path.relative_to(dataset_dir()))
+    else:
+        response[header] = str(path)
+    return response
+
+
+def download_response(request, dataset):
+    """The dataset's file, or the requested part of it (206)."""
+    blob = dataset.blob
+    path = blob_path(blob.sha256)
+    etag = f'"{blob.sha256}"'
+
+    if getattr(settings, 'CORE_DATASET_SENDFILE', None):
+        # The front server handles Range itself
+        response = _sendfile_response(dataset, path)
+        response['Content-Disposition'] = content_disposition_header(True, dataset.name)
+        response['ETag'] = etag
+        return response
+
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        header = None
+    try:
+        byte_range = parse_range(header, blob.size)
+    except UnsatisfiableRange:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{blob.size}"
+        return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(
+            file, as_attachment=True, filename=dataset.name, content_type=dataset.content_type,
+        )
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            RangeFile(file, start, end), as_attachment=True, filename=dataset.name,
+            content_type=dataset.content_type, status=206,
+        )
+        response['Content-Range'] = f"bytes {start}-{end}/{blob.size}"
+        response['Content-Length'] = str(end - start + 1)
+    response.block_size = BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
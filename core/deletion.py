@@ -0,0 +1,253 @@
+"""
+Chunked background deletion of projects and users.
+
+schedule_deletion() hides the object straight away (projects get
+deletion_pending, users are deactivated) and records a DeletionTask. The
+task then removes the dependents one table at a time in bounded batches:
+raw DELETE ... WHERE id IN (SELECT id ... LIMIT n) for leaf tables and M2M
+through tables, and ORM deletes of small pk batches for dependents that
+have dependents of their own. Every batch commits together with the task's
+progress, so a task interrupted by a restart resumes where it stopped.
+Finally the object itself is deleted through the ORM, which sends the
+usual signals.
+
+Each task is run by a `core.delete` job (core/jobs.py) queued in the same
+transaction; `process_deletions` runs or resumes tasks directly.
+"""
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import datasets, enrollments, jobs
+from .invalidation import bus
+from .models import CourseEnrollment, Dataset, DeletionTask, Project
+from .signals import MODEL_NAMESPACES
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# A running task whose progress hasn't moved for this long is resumed
+STALE_AFTER = timedelta(minutes=5)
+
+
+def _hide_project(project):
+    project.deletion_pending = True
+    project.save(update_fields=['deletion_pending'])
+
+
+def _hide_user(user):
+    # Inactive users can't log in and their sessions stop working
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+
+
+# Models that are deleted in the background, and how to hide them meanwhile
+DELETABLE = {
+    Project: _hide_project,
+    User: _hide_user,
+}
+
+
+def target_of(model):
+    return model._meta.label_lower
+
+
+class RawDeleteStep:
+    """Delete rows of a leaf table that point at the object, n at a time."""
+
+    def __init__(self, model, column):
+        self.model = model
+        self.column = column
+
+    def __str__(self):
+        return f"{self.model._meta.db_table}.{self.column}"
+
+    def _sql(self):
+        qn = connection.ops.quote_name
+        table, pk = qn(self.model._meta.db_table), qn(self.model._meta.pk.column)
+        return (
+            f"DELETE FROM {table} WHERE {pk} IN "
+            f"(SELECT {pk} FROM {table} WHERE {qn(self.column)} = %s LIMIT %s)"
+        )
+
+    def run_batch(self, object_id, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(self._sql(), [object_id, batch_size])
+            return cursor.rowcount
+
+
+class SetNullStep(RawDeleteStep):
+    """Clear a nullable foreign key (on_delete=SET_NULL), n rows at a time."""
+
+    def _sql(self):
+        qn = connection.ops.quote_name
+        table, pk = qn(self.model._meta.db_table), qn(self.model._meta.pk.column)
+        column = qn(self.column)
+        return (
+            f"UPDATE {table} SET {column} = NULL WHERE {pk} IN "
+            f"(SELECT {pk} FROM {table} WHERE {column} = %s LIMIT %s)"
+        )
+
+
+class CollectorDeleteStep(RawDeleteStep):
+    """Delete dependents that have dependents of their own through the ORM."""
+
+    def run_batch(self, object_id, batch_size):
+        manager = self.model._base_manager
+        ids = list(manager.filter(**{self.column: object_id}).values_list('pk', flat=True)[:batch_size])
+        if ids:
+            manager.filter(pk__in=ids).delete()
+        return len(ids)
+
+
+class WithdrawEnrollmentsStep(RawDeleteStep):
+    """Delete a user's course enrollments, giving their seats to the waitlist."""
+
+    def run_batch(self, object_id, batch_size):
+        return enrollments.withdraw_user(object_id, batch_size)
+
+
+class DeleteDatasetsStep(RawDeleteStep):
+    """Delete a project's datasets, refunding their uploaders and dropping unused blobs."""
+
+    def run_batch(self, object_id, batch_size):
+        rows = list(self.model.objects.filter(**{self.column: object_id}).select_related('blob')[:batch_size])
+        for dataset in rows:
+            datasets.delete(dataset)
+        return len(rows)
+
+
+# Dependents whose rows can't just be deleted, by (model, foreign key column)
+CUSTOM_STEPS = {
+    (CourseEnrollment, 'user_id'): WithdrawEnrollmentsStep,
+    (Dataset, 'project_id'): DeleteDatasetsStep,
+}
+
+
+def _reverse_relations(model):
+    # _meta.related_objects leaves out related_name='+' relations, which the
+    # final delete would otherwise have to collect in one go
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one or field.many_to_many)
+    ]
+
+
+def _has_dependents(model):
+    return bool(_reverse_relations(model) or model._meta.many_to_many)
+
+
+@lru_cache(maxsize=None)
+def deletion_steps(model):
+    """
+    The batched steps that empty every table pointing at `model`.
+    Relations other than CASCADE and SET_NULL are left to the final delete.
+    """
+    steps = []
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        if through._meta.auto_created:
+            steps.append(RawDeleteStep(through, field.m2m_column_name()))
+    for rel in _reverse_relations(model):
+        if rel.many_to_many:
+            through = rel.through
+            if through._meta.auto_created:
+                steps.append(RawDeleteStep(through, rel.field.m2m_reverse_name()))
+        elif rel.related_model._meta.auto_created:
+            # The foreign keys of M2M through tables, emptied above
+            continue
+        elif rel.on_delete is models.CASCADE:
+            step = CUSTOM_STEPS.get((rel.related_model, rel.field.column))
+            if step is None:
+                step = CollectorDeleteStep if _has_dependents(rel.related_model) else RawDeleteStep
+            steps.append(step(rel.related_model, rel.field.column))
+        elif rel.on_delete is models.SET_NULL:
+            steps.append(SetNullStep(rel.related_model, rel.field.column))
+    return steps
+
+
+def _namespaces(model):
+    namespaces = set(MODEL_NAMESPACES.get(model, ()))
+    for step in deletion_steps(model):
+        namespaces.update(MODEL_NAMESPACES.get(step.model, ()))
+    return sorted(namespaces)
+
+
+def pending_ids(model):
+    """Ids of `model` objects with an unfinished deletion task."""
+    return DeletionTask.objects.filter(target=target_of(model)).exclude(status='done').values('object_id')
+
+
+def schedule_deletion(obj):
+    """Hide `obj` now and delete it in the background; returns the task."""
+    model = type(obj)
+    with transaction.atomic():
+        DELETABLE[model](obj)
+        task, created = DeletionTask.objects.get_or_create(
+            target=target_of(model), object_id=obj.pk,
+            defaults={'object_repr': str(obj)[:255]},
+        )
+        if created or task.status == 'failed':
+            jobs.enqueue('core.delete', {'task_id': task.pk})
+    return task
+
+
+def claim(task_id):
+    """Mark a pending (or stalled) task as running; False if another worker has it."""
+    now = timezone.now()
+    return bool(
+        DeletionTask.objects.filter(pk=task_id)
+        .filter(Q(status='pending') | Q(status='running', updated_at__lt=now - STALE_AFTER))
+        .update(status='running', updated_at=now)
+    )
+
+
+def run_task(task, batch_size=BATCH_SIZE):
+    """Run a claimed task to completion, one committed batch at a time."""
+    model = apps.get_model(task.target)
+    steps = deletion_steps(model)
+    try:
+        while task.step < len(steps):
+            with transaction.atomic():
+                rows = steps[task.step].run_batch(task.object_id, batch_size)
+                task.rows_deleted += rows
+                if rows < batch_size:
+                    task.step += 1
+                task.save(update_fields=['step', 'rows_deleted', 'updated_at'])
+
+        with transaction.atomic():
+            # Nothing left to collect, so this only sends the signals
+            model._base_manager.filter(pk=task.object_id).delete()
+            task.status = 'done'
+            task.finished_at = timezone.now()
+            task.save(update_fields=['status', 'finished_at', 'updated_at'])
+            # The batches above sent no signals
+            bus.publish(*_namespaces(model))
+    except Exception as exc:
+        logger.exception("Deletion of %s %s failed", task.target, task.object_id)
+        DeletionTask.objects.filter(pk=task.pk).update(status='failed', error=str(exc), updated_at=timezone.now())
+        raise
+    return task
+
+
+def process_pending(batch_size=BATCH_SIZE, limit=None):
+    """Claim and run pending or stalled tasks; returns the tasks finished."""
+    finished = []
+    candidates = DeletionTask.objects.filter(status__in=('pending', 'running')).order_by('id')
+    for task_id in candidates.values_list('id', flat=True)[:limit]:
+        if not claim(task_id):
+            continue
+        try:
+            finished.append(run_task(DeletionTask.objects.get(pk=task_id), batch_size))
+        except Exception:
+            # Recorded as failed; carry on with the other tasks
+            continue
+    return finished
+
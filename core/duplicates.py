@@ -0,0 +1,150 @@
+"""
+Near-duplicate project detection with MinHash and LSH banding.
+
+A project's text (name and description, case-folded, punctuation dropped,
+cut off after TEXT_LIMIT characters) is cut into overlapping
+SHINGLE-character shingles. Its signature keeps,
+for each of NUM_HASHES seeded hash functions, the smallest hash of any
+shingle: two signatures agree in a position with probability equal to the
+Jaccard similarity of the shingle sets.
+
+The signature is split into BANDS bands of ROWS values and every band is
+hashed to a bucket stored in ProjectBand, indexed on (band, bucket).
+Looking up a new text reads only the projects that share a bucket with it
+(one indexed query), then compares their full signatures; pairs above a
+Jaccard similarity of about (1 / BANDS) ** (1 / ROWS) are found with high
+probability. A save that touches the name or the description drops the
+project's signature and queues a SIGNATURE_JOB that computes the missing
+ones (see core/signals.py); the `compute_project_signatures` command
+recomputes them all.
+"""
+import random
+import re
+import struct
+from array import array
+from hashlib import blake2b
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import jobs
+from .assignments import LOOKUP_CHUNK_SIZE, chunked
+from .models import Job, Project, ProjectBand, ProjectSignature
+
+SIGNATURE_JOB = 'core.compute_project_signatures'
+
+SHINGLE = 4
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+# Every shingle costs NUM_HASHES multiplications, so only the start of a
+# long description is hashed; it is what tells near duplicates apart anyway
+TEXT_LIMIT = 4096
+
+# Estimated Jaccard similarity from which a project is reported as a likely duplicate
+THRESHOLD = 0.6
+MAX_RESULTS = 5
+
+# Universal hashing modulo a Mersenne prime; the seed keeps every worker's functions identical
+PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+COEFFICIENTS = [(_rng.randrange(1, PRIME), _rng.randrange(PRIME)) for _ in range(NUM_HASHES)]
+
+WORD_RE = re.compile(r"\w+")
+
+
+def shingles(name, description=''):
+    """Character shingles of the normalized text; short texts give one shingle."""
+    text = " ".join(WORD_RE.findall(f"{name} {description}".casefold()))[:TEXT_LIMIT]
+    if len(text) <= SHINGLE:
+        return {text}
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def signature(name, description=''):
+    """NUM_HASHES minimum hashes of the text's shingles."""
+    values = [
+        int.from_bytes(blake2b(shingle.encode(), digest_size=8).digest(), 'little') % PRIME
+        for shingle in shingles(name, description)
+    ]
+    return [min((a * value + b) % PRIME for value in values) for a, b in COEFFICIENTS]
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(first, second)) / NUM_HASHES
+
+
+def bands(minhash):
+    """(band, bucket) pairs of a signature; buckets are signed 64-bit hashes."""
+    return [
+        (band, int.from_bytes(
+            blake2b(struct.pack(f'<{ROWS}Q', *minhash[band * ROWS:(band + 1) * ROWS]), digest_size=8).digest(),
+            'little', signed=True,
+        ))
+        for band in range(BANDS)
+    ]
+
+
+def pack(minhash):
+    return array('Q', minhash).tobytes()
+
+
+def unpack(data):
+    return array('Q', bytes(data)).tolist()
+
+
+def find(name, description='', exclude=None, threshold=THRESHOLD, limit=MAX_RESULTS):
+    """Visible projects whose text is likely a near duplicate, most similar first."""
+    minhash = signature(name, description)
+    shared_bucket = Q()
+    for band, bucket in bands(minhash):
+        shared_bucket |= Q(band=band, bucket=bucket)
+    candidates = ProjectSignature.objects.filter(
+        project__in=ProjectBand.objects.filter(shared_bucket).values('project_id'),
+        project__deletion_pending=False,
+    )
+    if exclude is not None:
+        candidates = candidates.exclude(project_id=exclude)
+    matches = []
+    for project_id, project_name, data in candidates.values_list('project_id', 'project__name', 'minhash'):
+        score = similarity(minhash, unpack(data))
+        if score >= threshold:
+            matches.append({'id': project_id, 'name': project_name, 'similarity': score})
+    matches.sort(key=lambda match: (-match['similarity'], match['id']))
+    return matches[:limit]
+
+
+def _write(rows):
+    """Replace the signatures and bands of (project_id, name, description) rows."""
+    signatures, project_bands = [], []
+    for project_id, name, description in rows:
+        minhash = signature(name, description)
+        signatures.append(ProjectSignature(project_id=project_id, minhash=pack(minhash)))
+        project_bands.extend(ProjectBand(project_id=project_id, band=band, bucket=bucket) for band, bucket in bands(minhash))
+    with transaction.atomic():
+        ProjectBand.objects.filter(project_id__in=[row.project_id for row in signatures]).delete()
+        ProjectSignature.objects.bulk_create(
+            signatures, update_conflicts=True, unique_fields=['project'], update_fields=['minhash'],
+        )
+        ProjectBand.objects.bulk_create(project_bands, batch_size=1000)
+
+
+def schedule(project_id, created=False):
+    """Drop the project's stale signature and queue the computation of the missing ones."""
+    if not created:
+        ProjectBand.objects.filter(project_id=project_id).delete()
+        ProjectSignature.objects.filter(project_id=project_id).delete()
+    if not Job.objects.filter(name=SIGNATURE_JOB, status='queued').exists():
+        jobs.enqueue(SIGNATURE_JOB)
+
+
+def compute_all(missing_only=False, chunk_size=LOOKUP_CHUNK_SIZE):
+    """(Re)compute the signatures of every project, or only of those without one."""
+    projects = Project.objects.order_by('id')
+    if missing_only:
+        projects = projects.filter(signature__isnull=True)
+    ids = list(projects.values_list('id', flat=True))
+    for chunk in chunked(ids, chunk_size):
+        _write(Project.objects.filter(id__in=chunk).values_list('id', 'name', 'description'))
+    return len(ids)
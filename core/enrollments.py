@@ -0,0 +1,140 @@
+"""
+Course enrollment with a fixed number of seats and a FIFO waitlist.
+
+A course with a capacity has a CourseSeats row counting its free seats. A
+seat is taken with a single conditional UPDATE (seats_left = seats_left - 1
+WHERE seats_left > 0): the database serializes concurrent attempts on that
+one row, so the course can't be overbooked and nobody reads the count first.
+An enrollment that finds no seat joins the waitlist instead. The seat is
+taken first, so on PostgreSQL the row stays locked only for the insert that
+follows; on SQLite the settings start transactions IMMEDIATE, so concurrent
+enrollments queue for the write lock instead of failing to upgrade a read
+lock.
+
+Cancelling an enrollment gives its seat back and promote() hands free seats
+to the oldest waitlisted users, notifying them through the outbox. It runs
+after every commit that frees a seat or joins the waitlist, so a seat freed
+while someone was joining the waitlist is still handed out. Deleting a user
+does the same for their enrollments through withdraw_user(), called by the
+background deletion and before the ORM cascade.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import notifications
+from .models import Course, CourseEnrollment, CourseSeats
+
+
+def _notify_promoted(course, user_ids):
+    notifications.notify_many([
+        (user_id, 'course_seat_granted', {'course_id': course.pk, 'course_name': course.name}) for user_id in user_ids
+    ])
+
+
+def sync_capacity(course):
+    """Recount the free seats after the course's capacity was set or changed."""
+    with transaction.atomic():
+        if course.capacity is None:
+            CourseSeats.objects.filter(course=course).delete()
+            waitlist = CourseEnrollment.objects.filter(course=course, status='waitlisted')
+            _notify_promoted(course, waitlist.values_list('user_id', flat=True))
+            waitlist.update(status='enrolled', promoted_at=timezone.now())
+            return
+        seats, _ = CourseSeats.objects.select_for_update().get_or_create(course=course, defaults={'seats_left': 0})
+        enrolled = CourseEnrollment.objects.filter(course=course, status='enrolled').count()
+        seats.seats_left = max(course.capacity - enrolled, 0)
+        seats.save(update_fields=['seats_left'])
+        transaction.on_commit(lambda: promote(course))
+
+
+def enroll(course, user):
+    """Enroll the user, or put them on the waitlist when the course is full."""
+    try:
+        with transaction.atomic():
+            took_seat = CourseSeats.objects.filter(course=course, seats_left__gt=0).update(
+                seats_left=F('seats_left') - 1,
+            )
+            limited = True
+            if not took_seat and not CourseSeats.objects.filter(course=course).exists():
+                course.capacity = Course.objects.values_list('capacity', flat=True).get(pk=course.pk)
+                limited = course.capacity is not None
+                if limited:
+                    # Capacity set without going through sync_capacity(); count the seats now
+                    sync_capacity(course)
+                    took_seat = CourseSeats.objects.filter(course=course, seats_left__gt=0).update(
+                        seats_left=F('seats_left') - 1,
+                    )
+            enrolled = took_seat or not limited
+            enrollment = CourseEnrollment.objects.create(
+                course=course, user=user, status='enrolled' if enrolled else 'waitlisted',
+            )
+            if not enrolled:
+                transaction.on_commit(lambda: promote(course))
+            return enrollment
+    except IntegrityError:
+        # Already enrolled or waitlisted; the seat taken above was rolled back
+        return CourseEnrollment.objects.get(course=course, user=user)
+
+
+def cancel(course, user):
+    """Leave the course or its waitlist; returns False if the user was in neither."""
+    with transaction.atomic():
+        if CourseEnrollment.objects.filter(course=course, user=user, status='enrolled').delete()[0]:
+            CourseSeats.objects.filter(course=course).update(seats_left=F('seats_left') + 1)
+            transaction.on_commit(lambda: promote(course))
+            return True
+        return bool(CourseEnrollment.objects.filter(course=course, user=user, status='waitlisted').delete()[0])
+
+
+def withdraw_user(user_id, limit=None):
+    """
+    Delete up to `limit` of a user's enrollments, giving their seats back;
+    returns the number deleted.
+    """
+    with transaction.atomic():
+        # Locked, so promote() can't change their status meanwhile
+        rows = list(
+            CourseEnrollment.objects.select_for_update().filter(user_id=user_id)
+            .order_by('id').values_list('id', 'course_id', 'status')[:limit]
+        )
+        if not rows:
+            return 0
+        CourseEnrollment.objects.filter(id__in=[row_id for row_id, _, _ in rows]).delete()
+        freed = Counter(course_id for _, course_id, status in rows if status == 'enrolled')
+        for course_id, seats in freed.items():
+            CourseSeats.objects.filter(course_id=course_id).update(seats_left=F('seats_left') + seats)
+        for course in Course.objects.filter(pk__in=freed):
+            transaction.on_commit(lambda course=course: promote(course))
+    return len(rows)
+
+
+def promote(course):
+    """Give free seats to the waitlist, oldest first; returns the promoted enrollments."""
+    promoted = []
+    while True:
+        with transaction.atomic():
+            if not CourseSeats.objects.filter(course=course, seats_left__gt=0).update(seats_left=F('seats_left') - 1):
+                return promoted
+            head = (
+                CourseEnrollment.objects.select_for_update(skip_locked=True)
+                .filter(course=course, status='waitlisted').order_by('id').first()
+            )
+            if head is None:
+                CourseSeats.objects.filter(course=course).update(seats_left=F('seats_left') + 1)
+                return promoted
+            head.status, head.promoted_at = 'enrolled', timezone.now()
+            head.save(update_fields=['status', 'promoted_at'])
+            _notify_promoted(course, [head.user_id])
+            promoted.append(head)
+
+
+def waitlist_position(enrollment):
+    """1 for the head of the waitlist; None once enrolled."""
+    if enrollment.status != 'waitlisted':
+        return None
+    return CourseEnrollment.objects.filter(
+        course_id=enrollment.course_id, status='waitlisted', id__lt=enrollment.id,
+    ).count() + 1
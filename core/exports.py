@@ -0,0 +1,182 @@
+"""
+Streaming CSV / NDJSON exports of projects, applications and assignments.
+
+Rows come from a single values_list() query with the usernames and category
+names joined in SQL, read with iterator(chunk_size), and are encoded in
+batches, so memory use does not depend on the size of the export.
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Aggregate, CharField, Q, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Application, Assignment, Project
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+class GroupConcat(Aggregate):
+    """Names of the related rows joined with '; ' (SQLite and PostgreSQL)."""
+    function = 'GROUP_CONCAT'
+    output_field = CharField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, Value('; '), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='STRING_AGG', **extra_context)
+
+
+def parse_bound(value, end=False):
+    """
+    Turn a date or datetime string into an aware datetime.
+    A plain date as the upper bound covers that whole day.
+    """
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    elif moment is None:
+        raise ExportError(f"Invalid date: '{value}'. Use YYYY-MM-DD.")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Export:
+    """One exportable table: its columns, base query and supported filters."""
+    date_field = None
+    project_field = None
+    has_status = False
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def filtered(self, project=None, status=None, since=None, until=None):
+        queryset = self.queryset()
+        if project:
+            try:
+                queryset = queryset.filter(**{self.project_field: int(project)})
+            except ValueError:
+                raise ExportError(f"Invalid project id: '{project}'.")
+        if status:
+            if not self.has_status:
+                raise ExportError(f"{self.name} cannot be filtered by status.")
+            if status not in dict(Application.STATUS_CHOICES):
+                raise ExportError(f"Invalid status: '{status}'.")
+            queryset = queryset.filter(status=status)
+        if since or until:
+            if self.date_field is None:
+                raise ExportError(f"{self.name} cannot be filtered by date.")
+            if since:
+                queryset = queryset.filter(**{f'{self.date_field}__gte': parse_bound(since)})
+            if until:
+                queryset = queryset.filter(**{f'{self.date_field}__lt': parse_bound(until, end=True)})
+        return queryset.values_list(*self.columns)
+
+
+# Rows of projects and users waiting for deletion are left out, as ProjectExport
+# leaves out the projects themselves
+VISIBLE_ROWS = Q(project__deletion_pending=False, user__is_active=True)
+
+
+class ProjectExport(Export):
+    date_field = 'created_at'
+    project_field = 'id'
+
+    def queryset(self):
+        return (
+            Project.objects.visible().order_by('id')
+            .values('id', 'name', 'created_at')
+            .annotate(categories=GroupConcat('categories__name'))
+        )
+
+
+class ApplicationExport(Export):
+    date_field = 'created_at'
+    project_field = 'project_id'
+    has_status = True
+
+    def queryset(self):
+        return Application.objects.filter(VISIBLE_ROWS).order_by('id')
+
+
+class AssignmentExport(Export):
+    project_field = 'project_id'
+
+    def queryset(self):
+        return Assignment.objects.filter(VISIBLE_ROWS).order_by('id')
+
+
+EXPORTS = {
+    'projects': ProjectExport('projects', ('id', 'name', 'created_at', 'categories')),
+    'applications': ApplicationExport(
+        'applications',
+        ('id', 'user__username', 'project_id', 'project__name', 'status', 'created_at'),
+    ),
+    'assignments': AssignmentExport('assignments', ('id', 'user__username', 'project_id', 'project__name')),
+}
+
+
+class Echo:
+    """File-like object whose write() just hands the value back"""
+
+    def write(self, value):
+        return value
+
+
+def _header(export):
+    return [column.replace('__', '_') for column in export.columns]
+
+
+def stream_rows(export, rows, fmt, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export in pieces of up to `chunk_size` rows."""
+    header = _header(export)
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        encode = writer.writerow
+        yield encode(header)
+    else:
+        encoder = DjangoJSONEncoder()
+
+        def encode(row):
+            return encoder.encode(dict(zip(header, row))) + '\n'
+
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(encode(row))
+        if len(batch) >= chunk_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def export(kind, fmt='csv', chunk_size=CHUNK_SIZE, **filters):
+    """Validate the request and return a generator over the encoded export."""
+    if kind not in EXPORTS:
+        raise ExportError(f"Unknown export: '{kind}'.")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format: '{fmt}'.")
+    table = EXPORTS[kind]
+    rows = table.filtered(**filters)
+    return stream_rows(table, rows, fmt, chunk_size)
@@ -0,0 +1,91 @@
+"""
+Facet counts for the project list filters.
+
+Categories are disjunctive: a project matches when it has any checked
+category, so a category's count ignores the category selection and says how
+many projects match the other filters and have that category. The flags
+(has open slots, has mentors) are ANDed, so each flag's count ignores only
+that flag.
+
+Category counts come from one GROUP BY over the Project.categories through
+table, and the flag counts from one conditional aggregate over the matching
+projects. Neither costs a query per category. Both are cached together per
+query for FACET_TIMEOUT seconds, and dropped early when projects change.
+"""
+from django.db.models import Count, Exists, OuterRef, Q
+
+from . import caching, refdata
+from .models import Project
+
+# Boolean annotations of ProjectQuerySet.with_flags() usable as filters
+FLAGS = ('has_open_slots', 'has_mentors')
+
+FACET_TIMEOUT = 60
+
+ProjectCategory = Project.categories.through
+
+
+def parse_flags(values):
+    return sorted(set(values) & set(FLAGS))
+
+
+def filter_projects(queryset, search_query='', category_filters=(), flags=()):
+    """
+    Apply the project list filters. `queryset` must come from with_flags()
+    when `flags` is given.
+    """
+    if search_query:
+        queryset = queryset.filter(Q(name__icontains=search_query) | Q(description__icontains=search_query))
+    if category_filters:
+        # EXISTS rather than a join, so no DISTINCT is needed
+        queryset = queryset.filter(Exists(
+            ProjectCategory.objects.filter(project_id=OuterRef('pk'), category_id__in=category_filters)
+        ))
+    for flag in flags:
+        queryset = queryset.filter(**{flag: True})
+    return queryset
+
+
+def _all_set(flags):
+    # The expressions themselves: aggregate filters can't refer to annotations
+    expressions = Project.objects.flag_expressions()
+    condition = Q()
+    for flag in flags:
+        condition &= Q(expressions[flag])
+    return condition or None
+
+
+def facet_counts(search_query='', category_filters=(), flags=()):
+    """Counts for every category and flag under the given filters."""
+    matching = filter_projects(Project.objects.visible().with_flags(), search_query, flags=flags)
+    by_category = (
+        ProjectCategory.objects.filter(project__in=matching.values('pk'))
+        .values_list('category_id')
+        .annotate(n=Count('project_id'))
+        .order_by()
+    )
+    categories = {category.pk: 0 for category in refdata.categories()}
+    categories.update(by_category)
+
+    counts = filter_projects(Project.objects.visible(), search_query, category_filters).aggregate(
+        total=Count('pk', filter=_all_set(flags)),
+        **{
+            flag: Count('pk', filter=_all_set([flag, *(other for other in flags if other != flag)]))
+            for flag in FLAGS
+        },
+    )
+    return {
+        "total": counts.pop('total'),
+        "categories": categories,
+        "flags": counts,
+    }
+
+
+def cached_facet_counts(search_query='', category_filters=(), flags=()):
+    return caching.get_or_set(
+        'project_facets',
+        [search_query, sorted(category_filters), sorted(flags)],
+        [caching.PROJECTS_TAG, caching.CATEGORIES_TAG],
+        lambda: facet_counts(search_query, category_filters, flags),
+        timeout=FACET_TIMEOUT,
+    )
@@ -2,11 +2,106 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, PasswordChangeForm
 from django.contrib.auth import authenticate
-from .models import Project, Category, Course, ProgrammingLanguage
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from . import duplicates
+from .assignments import BulkAssignmentError, parse_assignment_csv, resolve_usernames
+from .models import Project, Category, Challenge, Course, ProgrammingLanguage
+from .refdata import refdata
+
+
+class ReferenceDataChoiceIterator(ModelChoiceIterator):
+    """Choices read from the reference-data cache instead of the queryset"""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in refdata.all(self.queryset.model):
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(refdata.all(self.queryset.model)) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(refdata.all(self.queryset.model))
+
+
+class ReferenceDataMultipleChoiceField(forms.ModelMultipleChoiceField):
+    """
+    ModelMultipleChoiceField for a cached lookup table (see core/refdata.py).
+    Rendering and validation use the cached rows, so no query is issued.
+    """
+    iterator = ReferenceDataChoiceIterator
+
+    def _check_values(self, value):
+        try:
+            value = dict.fromkeys(value)
+        except TypeError:
+            raise ValidationError(self.error_messages["invalid_list"], code="invalid_list")
+        by_pk = refdata.by_pk(self.queryset.model)
+        selected = []
+        for pk in value:
+            try:
+                obj = by_pk.get(int(pk))
+            except (TypeError, ValueError):
+                raise ValidationError(
+                    self.error_messages["invalid_pk_value"],
+                    code="invalid_pk_value",
+                    params={"pk": pk},
+                )
+            if obj is None:
+                raise ValidationError(
+                    self.error_messages["invalid_choice"],
+                    code="invalid_choice",
+                    params={"value": pk},
+                )
+            selected.append(obj)
+        return selected
 
 class AssignUserForm(forms.Form):
     user = forms.ModelChoiceField(queryset=User.objects.filter(is_staff=False), label="User")
-    project = forms.ModelChoiceField(queryset=Project.objects.all(), label="Project")
+    project = forms.ModelChoiceField(queryset=Project.objects.visible(), label="Project")
+
+
+class BulkAssignForm(forms.Form):
+    """N users x M projects, and/or (username, project) rows from a CSV file"""
+    usernames = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 6, 'class': 'form-control'}),
+        help_text="One username per line (commas also work). Each user is assigned to every selected project."
+    )
+    projects = forms.ModelMultipleChoiceField(
+        queryset=Project.objects.visible().only('id', 'name').order_by('name'),
+        required=False,
+        widget=forms.SelectMultiple(attrs={'size': 10, 'class': 'form-select'}),
+    )
+    csv_file = forms.FileField(
+        required=False,
+        label="CSV file",
+        help_text="Columns: username,project (project id or exact project name)."
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        names = {n.strip() for n in cleaned_data.get('usernames', '').replace(',', '\n').splitlines() if n.strip()}
+        projects = cleaned_data.get('projects') or []
+        csv_file = cleaned_data.get('csv_file')
+
+        if not csv_file and not (names and projects):
+            raise forms.ValidationError("Select users and projects, or upload a CSV file.")
+
+        self.pairs = set()
+        try:
+            if names:
+                if not projects:
+                    raise BulkAssignmentError(["Select at least one project for the listed users."])
+                user_ids = resolve_usernames(names).values()
+                self.pairs |= {(user_id, project.id) for user_id in user_ids for project in projects}
+            if csv_file:
+                self.pairs |= parse_assignment_csv(csv_file)
+        except BulkAssignmentError as exc:
+            raise forms.ValidationError(exc.errors)
+        return cleaned_data
 
 
 class UserRegisterForm(UserCreationForm):
@@ -25,16 +120,20 @@ class UserRegisterForm(UserCreationForm):
 
 
 class ProjectForm(forms.ModelForm):
-    categories = forms.ModelMultipleChoiceField(
+    categories = ReferenceDataMultipleChoiceField(
         queryset=Category.objects.all(),
         required=False,
         widget=forms.CheckboxSelectMultiple,
         help_text="Select all categories that apply"
     )
+    confirm_duplicate = forms.BooleanField(
+        required=False,
+        label="This is not a duplicate, save it anyway",
+    )
 
     class Meta:
         model = Project
-        fields = ['name', 'description', 'categories']
+        fields = ['name', 'description', 'capacity', 'categories']
 
     def clean_name(self):
         name = self.cleaned_data.get('name')
@@ -42,9 +141,49 @@ class ProjectForm(forms.ModelForm):
             raise forms.ValidationError("Project name cannot contain commas.")
         return name
 
+    def clean(self):
+        cleaned_data = super().clean()
+        self.duplicates = []
+        name, description = cleaned_data.get('name'), cleaned_data.get('description')
+        text_changed = {'name', 'description'} & set(self.changed_data)
+        if name and description is not None and text_changed and not cleaned_data.get('confirm_duplicate'):
+            self.duplicates = duplicates.find(name, description, exclude=self.instance.pk)
+            if self.duplicates:
+                raise forms.ValidationError(
+                    "This looks like a duplicate of an existing project. "
+                    "Check the projects below, or confirm that it is a different one."
+                )
+        return cleaned_data
+
+
+class DatasetForm(forms.Form):
+    project = forms.ModelChoiceField(queryset=Project.objects.none())
+    file = forms.FileField()
+    description = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 2}))
+
+    def __init__(self, *args, projects=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if projects is not None:
+            self.fields['project'].queryset = projects.order_by('name')
+
+
+class ChallengeForm(forms.ModelForm):
+    ground_truth = forms.FileField(help_text="CSV with the id and target columns; never shown to participants")
+
+    class Meta:
+        model = Challenge
+        fields = ['metric', 'id_column', 'target_column', 'closes_at']
+        widgets = {
+            'closes_at': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+        }
+
+
+class SubmissionForm(forms.Form):
+    file = forms.FileField(help_text="CSV with the same id and target columns as the ground truth")
+
 
 class CourseForm(forms.ModelForm):
-    programming_languages = forms.ModelMultipleChoiceField(
+    programming_languages = ReferenceDataMultipleChoiceField(
         queryset=ProgrammingLanguage.objects.all(),
         required=False,
         widget=forms.CheckboxSelectMultiple,
@@ -53,7 +192,7 @@ class CourseForm(forms.ModelForm):
 
     class Meta:
         model = Course
-        fields = ['name', 'description', 'level', 'programming_languages']
+        fields = ['name', 'description', 'level', 'capacity', 'programming_languages']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
         }
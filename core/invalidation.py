@@ -0,0 +1,170 @@
+"""
+Cross-worker invalidation bus for process-local caches.
+
+Every cache namespace has a generation in a shared store. A write publishes
+the namespaces it touched: this worker's handlers run right away, and the
+new generation is stored once the transaction commits. Every other worker
+compares the stored generations with the ones it has seen at the start of
+each request (InvalidationMiddleware) and runs the handlers of the
+namespaces that moved.
+
+Two stores are available, neither needs an external service:
+- DatabaseGenerationStore (default): one CacheVersion row per namespace,
+  read with a single query per request.
+- MmapGenerationStore: counters in a memory-mapped file shared by all the
+  workers on one host; checking costs no query at all. Enabled by setting
+  CORE_INVALIDATION_MMAP_PATH.
+"""
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CacheVersion
+
+
+class DatabaseGenerationStore:
+    def read(self, namespaces):
+        return dict(
+            CacheVersion.objects.filter(namespace__in=list(namespaces)).values_list('namespace', 'version')
+        )
+
+    def bump(self, namespace):
+        """Store a new version; returns (previous, new)."""
+        version = uuid.uuid4().hex
+        with transaction.atomic():
+            row, created = CacheVersion.objects.select_for_update().get_or_create(
+                namespace=namespace, defaults={'version': version},
+            )
+            if created:
+                return None, version
+            previous = row.version
+            CacheVersion.objects.filter(namespace=namespace).update(version=version)
+        return previous, version
+
+
+class MmapGenerationStore:
+    """
+    Fixed-size table of 64-bit counters in a shared file. Namespaces are
+    hashed to slots; a collision only causes a spurious invalidation.
+    """
+    SLOTS = 256
+    SLOT = struct.Struct('<Q')
+
+    def __init__(self, path):
+        self.path = path
+        size = self.SLOTS * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _offset(self, namespace):
+        return (zlib.crc32(namespace.encode()) % self.SLOTS) * self.SLOT.size
+
+    def get(self, namespace):
+        return self.SLOT.unpack_from(self._map, self._offset(namespace))[0]
+
+    def read(self, namespaces):
+        return {namespace: self.get(namespace) for namespace in namespaces}
+
+    def bump(self, namespace):
+        """Increment the counter; returns (previous, new)."""
+        import fcntl
+
+        offset = self._offset(namespace)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            previous = self.SLOT.unpack_from(self._map, offset)[0]
+            self.SLOT.pack_into(self._map, offset, previous + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return previous, previous + 1
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+def default_store():
+    path = getattr(settings, 'CORE_INVALIDATION_MMAP_PATH', None)
+    return MmapGenerationStore(path) if path else DatabaseGenerationStore()
+
+
+class InvalidationBus:
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self._handlers = defaultdict(list)
+        self._seen = {}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = default_store()
+        return self._store
+
+    def subscribe(self, namespace, handler):
+        """Run `handler()` whenever `namespace` is invalidated."""
+        self._handlers[namespace].append(handler)
+
+    def _notify(self, namespace):
+        for handler in self._handlers[namespace]:
+            handler()
+
+    def publish(self, *namespaces, local=True):
+        """
+        Invalidate namespaces here now and in other workers after commit.
+        With local=False this worker's handlers are skipped, for caches the
+        writer has already updated in place.
+        """
+        if local:
+            for namespace in namespaces:
+                self._notify(namespace)
+
+        def bump():
+            for namespace in namespaces:
+                previous, generation = self.store.bump(namespace)
+                with self._lock:
+                    # Another worker published since our last check; recording the
+                    # new generation alone would hide its change from check()
+                    missed = previous != self._seen.get(namespace)
+                    self._seen[namespace] = generation
+                if local or missed:
+                    # Drop anything reloaded while the transaction was open
+                    self._notify(namespace)
+
+        transaction.on_commit(bump)
+
+    def check(self):
+        """
+        Run the handlers of every namespace published by another worker.
+        The first check only records the generations: nothing has been
+        cached yet, and a shared cache must not be flushed by every new
+        worker.
+        """
+        generations = self.store.read(self._handlers)
+        changed = []
+        with self._lock:
+            for namespace in self._handlers:
+                generation = generations.get(namespace)
+                if namespace not in self._seen:
+                    self._seen[namespace] = generation
+                elif self._seen[namespace] != generation:
+                    self._seen[namespace] = generation
+                    changed.append(namespace)
+        for namespace in changed:
+            self._notify(namespace)
+        return changed
+
+    def generation(self, namespace):
+        return self._seen.get(namespace)
+
+
+bus = InvalidationBus()
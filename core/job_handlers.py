@@ -0,0 +1,106 @@
+"""
+Handlers of the built-in background jobs. Payloads are the keyword
+arguments, so they must be JSON-serializable.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from . import analytics, catalog, challenges, deletion, duplicates, exports, notifications, profiling, recommendations, user_import, warmup
+from .jobs import register
+from .models import DeletionTask
+
+
+@register('core.delete')
+def delete(task_id):
+    """Run a DeletionTask; a failed one starts over from its recorded step."""
+    DeletionTask.objects.filter(pk=task_id, status='failed').update(status='pending')
+    if not deletion.claim(task_id):
+        return {'skipped': True}
+    task = deletion.run_task(DeletionTask.objects.get(pk=task_id))
+    return {'rows_deleted': task.rows_deleted}
+
+
+@register('core.export')
+def export(kind, fmt='csv', filename=None, **filters):
+    """Write an export to CORE_EXPORT_DIR and return its path."""
+    directory = Path(getattr(settings, 'CORE_EXPORT_DIR', settings.BASE_DIR / 'exports'))
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / (filename or f"{kind}.{fmt}")
+    lines = 0
+    with open(path, 'w', newline='', encoding='utf-8') as output:
+        for piece in exports.export(kind, fmt, **filters):
+            output.write(piece)
+            lines += piece.count('\n')
+    return {'path': str(path), 'lines': lines}
+
+
+@register('core.import_catalog')
+def import_catalog(paths, dry_run=False, kind=None):
+    data = catalog.merge(*(catalog.read_file(path, kind) for path in paths))
+    return catalog.import_catalog(data, dry_run=dry_run).as_dict()
+
+
+@register('core.import_users')
+def import_users(path, workers=None, default_role='user'):
+    # A job has nowhere to hand reset tokens to, so every row needs a
+    # password; `manage.py import_users --tokens-output` takes the others
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        report = user_import.import_users(
+            user_import.read_rows(stream, default_role), workers=workers, require_password=True,
+        )
+    return {
+        'created': report.created,
+        'duplicates': report.duplicates,
+        'invalid': report.invalid,
+        'errors': report.errors,
+        'seconds': round(report.seconds, 3),
+    }
+
+
+@register('core.warm_caches')
+def warm_caches():
+    """Warm the shared caches; fails with a process-local cache backend"""
+    return warmup.warm_shared()['steps']
+
+
+@register('core.send_email')
+def send_email(subject, message, recipient_list, from_email=None):
+    """Send through the configured EMAIL_BACKEND"""
+    return {'sent': send_mail(subject, message, from_email, recipient_list)}
+
+
+@register(notifications.DISPATCH_JOB)
+def dispatch_notifications():
+    return notifications.dispatch()
+
+
+@register(analytics.REFRESH_JOB)
+def refresh_analytics():
+    return analytics.refresh()
+
+
+@register(recommendations.REFRESH_JOB)
+def refresh_recommendations(full=False):
+    return recommendations.refresh(full=full)
+
+
+@register(duplicates.SIGNATURE_JOB)
+def compute_project_signatures():
+    return {'computed': duplicates.compute_all(missing_only=True)}
+
+
+@register(profiling.PROFILE_JOB)
+def profile_dataset(blob_id):
+    return profiling.run(blob_id)
+
+
+@register(challenges.PREPARE_JOB)
+def prepare_challenge(challenge_id):
+    return challenges.prepare(challenge_id)
+
+
+@register(challenges.SCORE_JOB)
+def score_submission(submission_id):
+    return challenges.score(submission_id)
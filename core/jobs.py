@@ -0,0 +1,267 @@
+"""
+Database-backed background jobs.
+
+enqueue() inserts a Job row, in the caller's transaction, naming a handler
+registered with @register. `manage.py run_workers` runs a pool of threads
+that claim due jobs and run them. On PostgreSQL a job is claimed with
+SELECT ... FOR UPDATE SKIP LOCKED. Elsewhere (SQLite) the claim is a
+conditional UPDATE ... WHERE status = 'queued', which only one worker can win.
+Failed jobs are retried with exponential backoff until max_attempts. While
+a job runs its locked_at is refreshed every HEARTBEAT_INTERVAL, so a job
+whose worker died is claimed again once its lock hasn't been refreshed for
+JOB_TIMEOUT (counting as another attempt, so one lost on its last attempt
+is marked failed instead); a worker that lost its job that way doesn't
+record an outcome.
+No broker is involved.
+"""
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# A running job locked for longer than this is assumed lost and run again
+JOB_TIMEOUT = timedelta(minutes=15)
+# How often a running job's lock is refreshed; well under JOB_TIMEOUT
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+
+RETRY_BASE_DELAY = 10  # seconds; doubled after every failed attempt
+RETRY_MAX_DELAY = 3600
+
+# Due jobs looked at per claim attempt where SKIP LOCKED isn't available
+CLAIM_CANDIDATES = 10
+
+handlers = {}
+
+
+class UnknownJobError(LookupError):
+    pass
+
+
+def register(name):
+    """Register the decorated function as the handler of `name` jobs."""
+
+    def decorator(func):
+        handlers[name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(name, payload=None, delay=None, max_attempts=3):
+    """Queue a job; it is only visible to workers once the caller commits."""
+    if name not in handlers:
+        raise UnknownJobError(f"No job handler named '{name}'")
+    run_after = timezone.now() + (delay or timedelta())
+    return Job.objects.create(name=name, payload=payload or {}, run_after=run_after, max_attempts=max_attempts)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY))
+
+
+def _stale(now):
+    return Q(status='running', locked_at__lt=now - JOB_TIMEOUT)
+
+
+def _due(now):
+    # A stale job is only run again while it has attempts left
+    return Q(status='queued', run_after__lte=now) | (_stale(now) & Q(attempts__lt=F('max_attempts')))
+
+
+def _fail_abandoned(now):
+    """Mark stale jobs that have used up their attempts as failed."""
+    abandoned = Job.objects.filter(_stale(now), attempts__gte=F('max_attempts'))
+    # Checked first so that idle polling doesn't take the write lock
+    if not abandoned.exists():
+        return 0
+    return abandoned.update(
+        status='failed', finished_at=now, locked_by='', locked_at=None,
+        last_error=f"Lost by its worker on the last attempt; not retried (no heartbeat for {JOB_TIMEOUT}).",
+    )
+
+
+def claim(worker_id):
+    """Lock the next due job for `worker_id` and return it, or None."""
+    now = timezone.now()
+    _fail_abandoned(now)
+    due = Job.objects.filter(_due(now)).order_by('run_after', 'id')
+    changes = {'status': 'running', 'attempts': F('attempts') + 1, 'locked_by': worker_id, 'locked_at': now}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_id = due.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+            Job.objects.filter(pk=job_id).update(**changes)
+        return Job.objects.get(pk=job_id)
+
+    for job_id in due.values_list('id', flat=True)[:CLAIM_CANDIDATES]:
+        # Writes are serialized, so only one worker's UPDATE matches
+        if Job.objects.filter(_due(now), pk=job_id).update(**changes):
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+class Heartbeat:
+    """Refresh a claimed job's locked_at from a thread while it runs."""
+
+    def __init__(self, job, interval=HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval.total_seconds()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'core-jobs-heartbeat-{job.pk}', daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    owned = Job.objects.filter(pk=self.job.pk, status='running', locked_by=self.job.locked_by).update(
+                        locked_at=timezone.now(),
+                    )
+                except Exception:
+                    # e.g. the database was locked for too long; try again next time
+                    logger.exception("Heartbeat of job %s failed", self.job)
+                    continue
+                if not owned:
+                    return
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def _finish(job, fields):
+    """Store the outcome unless another worker has claimed the job meanwhile."""
+    values = {field: getattr(job, field) for field in fields}
+    if not Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+        locked_by='', locked_at=None, **values,
+    ):
+        logger.warning("Job %s was claimed by another worker; its outcome here is discarded", job)
+        return job
+    job.locked_by, job.locked_at = '', None
+    return job
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome."""
+    try:
+        handler = handlers.get(job.name)
+        if handler is None:
+            raise UnknownJobError(f"No job handler named '{job.name}'")
+        with Heartbeat(job):
+            result = handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s failed (attempt %s/%s)", job, job.attempts, job.max_attempts)
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            job.status, job.finished_at = 'failed', now
+        else:
+            job.status, job.run_after = 'queued', now + retry_delay(job.attempts)
+        job.last_error = error[-10000:]
+        return _finish(job, ['status', 'run_after', 'finished_at', 'last_error'])
+
+    job.status, job.result, job.finished_at = 'succeeded', result, timezone.now()
+    return _finish(job, ['status', 'result', 'finished_at'])
+
+
+def run_pending(worker_id=None, limit=None):
+    """Run due jobs one after another until none is left; returns them."""
+    worker_id = worker_id or default_worker_id()
+    done = []
+    while limit is None or len(done) < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        done.append(run_job(job))
+    return done
+
+
+def retry(job_id):
+    """Queue a failed job again straight away, with a fresh set of attempts."""
+    return Job.objects.filter(pk=job_id, status='failed').update(
+        status='queued', attempts=0, run_after=timezone.now(), finished_at=None,
+    )
+
+
+def process_pool(max_workers=None):
+    """
+    A ProcessPoolExecutor for handlers to offload CPU-bound work to. Its
+    processes are started fresh (forkserver, or spawn) instead of forked:
+    forking the threaded worker pool could copy locks (logging, database
+    drivers) held by another thread, and the child would wait on them forever.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context(method),
+        # Fresh interpreters have to load the project's settings and apps
+        initializer=django.setup,
+    )
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkerPool:
+    """Threads that poll for due jobs until stop() is called."""
+
+    def __init__(self, threads=None, poll_interval=1.0, worker_id=None):
+        self.threads = threads or getattr(settings, 'CORE_JOB_WORKER_THREADS', 2)
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or default_worker_id()
+        self._stop = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, number):
+        worker_id = f"{self.worker_id}:{number}"
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                job = claim(worker_id)
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                run_job(job)
+                with self._lock:
+                    self.processed += 1
+        finally:
+            connection.close()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='core-jobs') as executor:
+            futures = [executor.submit(self._loop, number) for number in range(self.threads)]
+            try:
+                while not self._stop.is_set():
+                    time.sleep(0.2)
+            finally:
+                self.stop()
+                for future in futures:
+                    future.result()
+        return self.processed
@@ -0,0 +1,109 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import bitmaps
+from core.models import Course, ProgrammingLanguage
+
+
+def timed(func, repeat):
+    """Best of `repeat` runs, in milliseconds, and the last result."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def orm_filter(language_ids, level):
+    courses = Course.objects.all()
+    if language_ids:
+        courses = courses.filter(programming_languages__id__in=language_ids).distinct()
+    if level is not None:
+        courses = courses.filter(level=level)
+    return list(courses.values_list('id', flat=True))
+
+
+def orm_facets(language_ids, level):
+    """The straightforward way: one COUNT per language and per level."""
+    counts = {'levels': {}, 'languages': {}}
+    for value, _ in Course.LEVEL_CHOICES:
+        courses = Course.objects.filter(level=value)
+        if language_ids:
+            courses = courses.filter(programming_languages__id__in=language_ids).distinct()
+        counts['levels'][value] = courses.count()
+    for language_id in ProgrammingLanguage.objects.values_list('id', flat=True):
+        courses = Course.objects.filter(programming_languages__id=language_id)
+        if level is not None:
+            courses = courses.filter(level=level)
+        counts['languages'][language_id] = courses.count()
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the course list filters and facet counts through the ORM and through "
+        "the bitmap index, on synthetic courses that are rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100000)
+        parser.add_argument('--languages', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['courses'] < 1 or options['languages'] < 3:
+            raise CommandError("Use at least 1 course and 3 languages.")
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        with transaction.atomic():
+            self.stdout.write(f"Creating {options['courses']} courses...")
+            languages = ProgrammingLanguage.objects.bulk_create([
+                ProgrammingLanguage(name=f"Benchmark language {i}") for i in range(options['languages'])
+            ])
+            courses = Course.objects.bulk_create([
+                Course(name=f"Benchmark course {i}", description="Benchmark", level=rng.randint(1, 5))
+                for i in range(options['courses'])
+            ], batch_size=5000)
+            if any(course.pk is None for course in courses):
+                courses = list(Course.objects.filter(name__startswith="Benchmark course "))
+            bitmaps.CourseLanguage.objects.bulk_create([
+                bitmaps.CourseLanguage(course_id=course.pk, programminglanguage_id=language.pk)
+                for course in courses
+                for language in rng.sample(languages, rng.randint(1, 3))
+            ], batch_size=5000)
+
+            bitmaps.clear()
+            build_ms, index = timed(bitmaps.CourseBitmapIndex.build, 1)
+            self.stdout.write(f"Index built in {build_ms:.0f} ms ({len(index)} courses).")
+
+            ids = [language.pk for language in languages]
+            cases = [
+                ("no filter", [], None),
+                ("1 language", ids[:1], None),
+                ("3 languages", ids[:3], None),
+                ("level", [], 3),
+                ("3 languages + level", ids[:3], 3),
+            ]
+            self.stdout.write(f"{'case':<22}{'ORM filter':>12}{'bitmap':>10}{'ORM facets':>13}{'bitmap':>10}")
+            for name, language_ids, level in cases:
+                orm_ms, expected = timed(lambda: orm_filter(language_ids, level), repeat)
+                bitmap_ms, found = timed(lambda: index.ids_of(index.match(language_ids, level)), repeat)
+                if sorted(found) != sorted(expected):
+                    raise CommandError(f"'{name}': the index returned different courses than the ORM.")
+                orm_facets_ms, _ = timed(lambda: orm_facets(language_ids, level), 1)
+                bitmap_facets_ms, _ = timed(lambda: index.facets(language_ids, level), repeat)
+                self.stdout.write(
+                    f"{name:<22}{orm_ms:>10.1f}ms{bitmap_ms:>8.1f}ms{orm_facets_ms:>11.1f}ms{bitmap_facets_ms:>8.1f}ms"
+                )
+            transaction.set_rollback(True)
+
+        # The index may have been rebuilt from the rolled back rows
+        bitmaps.clear()
+        self.stdout.write(self.style.SUCCESS("Benchmark finished; synthetic courses rolled back."))
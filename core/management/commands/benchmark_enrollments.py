@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from core import enrollments, jobs
+from core.models import Course
+
+USERNAME_PREFIX = "benchmark-rush-"
+
+
+def rush(course_id, user_ids, threads):
+    """Worker process: enroll its users from several threads at once; returns the outcomes."""
+    course = Course.objects.get(pk=course_id)
+    counts = Counter()
+    lock = threading.Lock()
+
+    def enroll(ids):
+        try:
+            for user_id in ids:
+                try:
+                    status = enrollments.enroll(course, User(pk=user_id)).status
+                except DatabaseError:
+                    status = 'errors'
+                with lock:
+                    counts[status] += 1
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=enroll, args=(user_ids[i::threads],)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure course enrollment throughput with many processes and threads enrolling "
+        "synthetic users in one course at once; the course and users are deleted afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=400)
+        parser.add_argument('--capacity', type=int, default=150)
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        users, capacity = options['users'], options['capacity']
+        processes, threads = options['processes'], options['threads']
+        if min(users, capacity, processes, threads) < 1:
+            raise CommandError("Use at least 1 user, seat, process and thread.")
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError("Worker processes can't share an in-memory SQLite database.")
+
+        # Committed up front: the worker processes have their own connections
+        course = Course.objects.create(name="Benchmark course", description="Benchmark", capacity=capacity)
+        try:
+            enrollments.sync_capacity(course)
+            User.objects.bulk_create(
+                [User(username=f"{USERNAME_PREFIX}{i}") for i in range(users)], batch_size=1000,
+            )
+            user_ids = list(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+
+            with jobs.process_pool(processes) as pool:
+                # Start the workers, which set up Django, before the clock does
+                list(pool.map(time.sleep, [0.1] * processes))
+                started = time.perf_counter()
+                futures = [pool.submit(rush, course.pk, user_ids[i::processes], threads) for i in range(processes)]
+                counts = sum((future.result() for future in futures), Counter())
+                elapsed = time.perf_counter() - started
+        finally:
+            course.delete()
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        self.stdout.write(
+            f"{users} enrollment(s) from {processes} process(es) x {threads} thread(s) in {elapsed:.2f} s "
+            f"({users / elapsed:.0f}/s): {counts['enrolled']} enrolled, {counts['waitlisted']} waitlisted, "
+            f"{counts['errors']} error(s)."
+        )
+        if counts['errors'] or counts['enrolled'] != min(capacity, users):
+            raise CommandError("The course was over- or underbooked.")
+        self.stdout.write(self.style.SUCCESS("Benchmark finished; synthetic course and users deleted."))
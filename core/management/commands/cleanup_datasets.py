@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from core.datasets import cleanup
+
+
+class Command(BaseCommand):
+    help = "Recount dataset quotas and remove dataset files that nothing references"
+
+    def handle(self, *args, **options):
+        result = cleanup()
+        self.stdout.write(
+            f"Recounted {result['quotas']} quota(s), removed {result['blobs']} unused blob(s) "
+            f"and {result['files']} stray file(s)."
+        )
+        self.stdout.write(self.style.SUCCESS("Dataset library cleaned up."))
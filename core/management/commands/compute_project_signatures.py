@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from core.duplicates import compute_all
+
+
+class Command(BaseCommand):
+    help = "Compute the MinHash signatures used to detect near-duplicate projects"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help="Only compute projects that have no signature yet",
+        )
+
+    def handle(self, *args, **options):
+        count = compute_all(missing_only=options['missing'])
+        self.stdout.write(self.style.SUCCESS(f"Computed signatures for {count} project(s)."))
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from core.catalog import import_catalog
 from core.models import Category
 
 
@@ -18,11 +19,7 @@ class Command(BaseCommand):
             "Research",
         ]
 
-        for category_name in categories:
-            category, created = Category.objects.get_or_create(name=category_name)
-            if created:
-                self.stdout.write(self.style.SUCCESS(f'Created category: {category_name}'))
-            else:
-                self.stdout.write(f'Category already exists: {category_name}')
+        counts = import_catalog({'categories': categories}).counts['categories']
+        self.stdout.write(f"Created {counts['created']} categories, {counts['unchanged']} already existed.")
 
         self.stdout.write(self.style.SUCCESS(f'\nTotal categories: {Category.objects.count()}'))
@@ -1,32 +1,24 @@
-import random
 from django.core.management.base import BaseCommand
-from core.models import Course, ProgrammingLanguage
+from core.catalog import import_catalog
+from core.models import Course
 
 
 class Command(BaseCommand):
     help = 'Create programming languages and sample courses'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Also reset existing sample courses to their original description, level and languages',
+        )
+
     def handle(self, *args, **kwargs):
-        # Create programming languages
-        self.stdout.write("Creating programming languages...")
         languages_data = [
             'Python', 'JavaScript', 'Java', 'C++', 'C#',
             'Ruby', 'Go', 'Rust', 'PHP', 'TypeScript',
             'Swift', 'Kotlin', 'R', 'SQL', 'Scala'
         ]
 
-        languages = []
-        for lang_name in languages_data:
-            lang, created = ProgrammingLanguage.objects.get_or_create(name=lang_name)
-            if created:
-                self.stdout.write(f"  Created: {lang_name}")
-            else:
-                self.stdout.write(f"  Already exists: {lang_name}")
-            languages.append(lang)
-
-        # Create courses
-        self.stdout.write("\nCreating courses...")
-
         courses_data = [
             {
                 "name": "Introduction to Python Programming",
@@ -150,27 +142,15 @@ class Command(BaseCommand):
             }
         ]
 
-        for course_data in courses_data:
-            # Check if course already exists
-            course, created = Course.objects.get_or_create(
-                name=course_data['name'],
-                defaults={
-                    'description': course_data['description'],
-                    'level': course_data['level']
-                }
-            )
-
-            if created:
-                # Add programming languages
-                for lang_name in course_data['languages']:
-                    try:
-                        lang = ProgrammingLanguage.objects.get(name=lang_name)
-                        course.programming_languages.add(lang)
-                    except ProgrammingLanguage.DoesNotExist:
-                        self.stdout.write(self.style.WARNING(f"  Language not found: {lang_name}"))
+        if not kwargs['update']:
+            # Leave courses staff may have edited alone
+            existing = set(Course.objects.filter(name__in=[c['name'] for c in courses_data]).values_list('name', flat=True))
+            courses_data = [course for course in courses_data if course['name'] not in existing]
 
-                self.stdout.write(self.style.SUCCESS(f"  Created: {course.name} (Level {course.level})"))
-            else:
-                self.stdout.write(f"  Already exists: {course.name}")
+        self.stdout.write("Syncing programming languages and courses...")
+        result = import_catalog({'languages': languages_data, 'courses': courses_data})
+        for kind in ('languages', 'courses'):
+            counts = result.counts[kind]
+            self.stdout.write(f"  {kind}: {counts['created']} created, {counts['updated']} updated, {counts['unchanged']} unchanged")
 
-        self.stdout.write(self.style.SUCCESS(f"\nDone! Created {len(languages_data)} languages and {len(courses_data)} courses."))
+        self.stdout.write(self.style.SUCCESS(f"\nDone! Synced {len(languages_data)} languages and {len(courses_data)} courses."))
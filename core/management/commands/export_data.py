@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.exports import EXPORTS, FORMATS, ExportError, export
+
+
+class Command(BaseCommand):
+    help = "Stream projects, applications or assignments as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', dest='fmt', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--project', help="Only rows of this project id")
+        parser.add_argument('--status', help="Only applications with this status")
+        parser.add_argument('--since', help="Created on or after this date (YYYY-MM-DD)")
+        parser.add_argument('--until', help="Created on or before this date (YYYY-MM-DD)")
+        parser.add_argument('-o', '--output', help="Write to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        try:
+            content = export(
+                options['kind'], options['fmt'],
+                project=options['project'], status=options['status'],
+                since=options['since'], until=options['until'],
+            )
+            if options['output']:
+                lines = 0
+                with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                    for piece in content:
+                        output.write(piece)
+                        lines += piece.count('\n')
+                self.stderr.write(f"Wrote {lines} line(s) to {options['output']}.")
+            else:
+                for piece in content:
+                    self.stdout.write(piece, ending='')
+        except ExportError as exc:
+            raise CommandError(str(exc))
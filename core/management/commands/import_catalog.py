@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.catalog import CHUNK_SIZE, KINDS, CatalogImportError, import_catalog, merge, read_file
+
+
+class Command(BaseCommand):
+    help = "Sync categories, programming languages and courses from JSON/CSV files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help=".json catalogs or .csv files of one kind")
+        parser.add_argument('--kind', choices=KINDS, help="Kind of every CSV file (default: taken from the file name)")
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without writing them")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            catalog = merge(*(read_file(path, options['kind']) for path in options['files']))
+            result = import_catalog(catalog, dry_run=options['dry_run'], chunk_size=options['chunk_size'])
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except CatalogImportError as exc:
+            raise CommandError("\n".join(exc.errors))
+
+        for kind, counts in result.as_dict().items():
+            self.stdout.write(
+                f"  {kind}: {counts['created']} created, {counts['updated']} updated, {counts['unchanged']} unchanged"
+            )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run: nothing was written."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Catalog imported."))
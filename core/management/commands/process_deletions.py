@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.deletion import BATCH_SIZE, process_pending
+from core.models import DeletionTask
+
+
+class Command(BaseCommand):
+    help = "Run pending background deletions and resume interrupted ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--retry-failed', action='store_true', help="Queue failed tasks again first")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new tasks")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = DeletionTask.objects.filter(status='failed').update(status='pending', error='')
+            self.stdout.write(f"Queued {retried} failed task(s) again.")
+
+        while True:
+            for task in process_pending(batch_size=options['batch_size']):
+                self.stdout.write(f"  Deleted {task.target} {task.object_repr}: {task.rows_deleted} dependent row(s)")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        failed = DeletionTask.objects.filter(status='failed').count()
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} task(s) failed; see the admin or use --retry-failed."))
+        self.stdout.write(self.style.SUCCESS("Deletions processed."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.analytics import refresh
+
+
+class Command(BaseCommand):
+    help = "Add the applications and decisions since the last run to the analytics rollups"
+
+    def handle(self, *args, **options):
+        result = refresh()
+        self.stdout.write(
+            f"Updated {result['counters']} counter(s) with rows from {result['since']} to {result['until']}."
+        )
+        self.stdout.write(self.style.SUCCESS("Analytics refreshed."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core.recommendations import refresh
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar-project lists behind the project recommendations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Recompute every project, not only the ones changed since the last run",
+        )
+
+    def handle(self, *args, **options):
+        result = refresh(full=options['full'])
+        self.stdout.write(f"Stored {result['neighbours']} neighbour(s) for {result['projects']} project(s).")
+        self.stdout.write(self.style.SUCCESS("Recommendations refreshed."))
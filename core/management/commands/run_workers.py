@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from core.jobs import WorkerPool, run_pending
+
+
+class Command(BaseCommand):
+    help = "Run background jobs with a pool of worker threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, help="Worker threads (default: CORE_JOB_WORKER_THREADS)")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle")
+        parser.add_argument('--once', action='store_true', help="Run the jobs that are due now, then exit")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            jobs = run_pending()
+            for job in jobs:
+                self.stdout.write(f"  {job}")
+            self.stdout.write(self.style.SUCCESS(f"Ran {len(jobs)} job(s)."))
+            return
+
+        pool = WorkerPool(threads=options['threads'], poll_interval=options['poll_interval'])
+        # Finish the running jobs on SIGTERM (docker stop) as on Ctrl-C
+        signal.signal(signal.SIGTERM, lambda *args: pool.stop())
+        self.stdout.write(f"Starting {pool.threads} worker thread(s) as {pool.worker_id}")
+        try:
+            processed = pool.run()
+        except KeyboardInterrupt:
+            pool.stop()
+            processed = pool.processed
+        self.stdout.write(self.style.SUCCESS(f"Stopped after {processed} job(s)."))
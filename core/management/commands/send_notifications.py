@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from core.notifications import BATCH_SIZE, dispatch
+
+
+class Command(BaseCommand):
+    help = "Send the pending notifications in the outbox now"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        counts = dispatch(batch_size=options['batch_size'])
+        self.stdout.write(
+            f"Sent {counts['sent']} notification(s) in {counts['emails']} email(s); "
+            f"{counts['skipped']} skipped, {counts['retrying']} to retry, {counts['failed']} failed."
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.warmup import ProcessLocalCache, warm_shared
+
+
+class Command(BaseCommand):
+    help = (
+        "Prime the shared list caches and touch the main indexes. Needs a cache backend shared between "
+        "processes; with a process-local one, set CORE_WARMUP_ON_STARTUP instead"
+    )
+
+    def handle(self, *args, **options):
+        try:
+            status = warm_shared()
+        except ProcessLocalCache as exc:
+            raise CommandError(str(exc))
+        for step, seconds in status['steps'].items():
+            self.stdout.write(f"  {step}: {seconds * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS("Caches warmed."))
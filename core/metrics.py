@@ -0,0 +1,293 @@
+"""
+Challenge metrics, computed over a stream of CSV rows in bounded memory.
+
+The ground truth of a challenge is compiled once by build_truth() into a
+binary file: the 64-bit hashes of its ids, sorted, followed by the target
+values in the same order. score_file() memory-maps that file and reads a
+submission CHUNK_ROWS rows at a time: each chunk's ids are looked up with a
+binary search, duplicates are caught with one byte per truth row, and the
+chunk is folded into the metric's running sums. Memory use depends on the
+number of truth rows (one byte each) and the chunk size, not on the size
+of the submission. AUC bins predictions into AUC_BUCKETS buckets per class
+instead of sorting them.
+
+With NumPy installed the lookups and the per-chunk reductions are
+vectorized; without it the same is computed with bisect and builtins.
+Nothing here touches Django, so scoring can run in worker processes.
+"""
+import csv
+import math
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from itertools import islice
+
+try:
+    import numpy
+except ImportError:  # Optional; the same sums are computed with builtins
+    numpy = None
+
+CHUNK_ROWS = 100_000
+AUC_BUCKETS = 100_000
+
+TRUTH_HEADER = struct.Struct('<8sQ')
+TRUTH_MAGIC = b'CORETRU1'
+
+
+class ScoringError(ValueError):
+    pass
+
+
+def hash_id(value):
+    return int.from_bytes(blake2b(value.strip().encode(), digest_size=8).digest(), 'little', signed=True)
+
+
+def read_chunks(path, id_column, value_column, size=None):
+    """(ids, values) of successive chunks of a CSV file's two columns."""
+    size = size or CHUNK_ROWS
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as stream:
+        rows = csv.reader(stream)
+        header = [name.strip() for name in next(rows, [])]
+        missing = [name for name in (id_column, value_column) if name not in header]
+        if missing:
+            raise ScoringError(f"Missing column(s): {', '.join(missing)}.")
+        id_index, value_index = header.index(id_column), header.index(value_column)
+        line = 1
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            ids, values = [], []
+            for line, row in enumerate(chunk, start=line + 1):
+                if not row:
+                    continue
+                try:
+                    value = float(row[value_index])
+                    ids.append(row[id_index])
+                except (IndexError, ValueError):
+                    raise ScoringError(f"Line {line}: expected a number in '{value_column}'.")
+                if not math.isfinite(value):
+                    raise ScoringError(f"Line {line}: '{value_column}' must be a finite number.")
+                values.append(value)
+            yield ids, values
+
+
+class Metric:
+    higher_is_better = True
+
+    def add(self, truth, predicted):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class RMSE(Metric):
+    higher_is_better = False
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, truth, predicted):
+        if numpy is not None:
+            error = predicted - truth
+            self.total += float(numpy.dot(error, error))
+        else:
+            self.total += math.fsum((p - t) ** 2 for t, p in zip(truth, predicted))
+        self.count += len(truth)
+
+    def result(self):
+        return math.sqrt(self.total / self.count)
+
+
+class MAE(RMSE):
+    def add(self, truth, predicted):
+        if numpy is not None:
+            self.total += float(numpy.abs(predicted - truth).sum())
+        else:
+            self.total += math.fsum(abs(p - t) for t, p in zip(truth, predicted))
+        self.count += len(truth)
+
+    def result(self):
+        return self.total / self.count
+
+
+class Accuracy(Metric):
+    def __init__(self):
+        self.correct = 0
+        self.count = 0
+
+    def add(self, truth, predicted):
+        if numpy is not None:
+            self.correct += int(numpy.count_nonzero(truth == predicted))
+        else:
+            self.correct += sum(t == p for t, p in zip(truth, predicted))
+        self.count += len(truth)
+
+    def result(self):
+        return self.correct / self.count
+
+
+class F1(Metric):
+    """Binary F1 of the positive class (label 1)."""
+
+    def __init__(self):
+        self.true_positives = self.false_positives = self.false_negatives = 0
+
+    def add(self, truth, predicted):
+        if numpy is not None:
+            actual, guessed = truth == 1, predicted == 1
+            self.true_positives += int(numpy.count_nonzero(actual & guessed))
+            self.false_positives += int(numpy.count_nonzero(~actual & guessed))
+            self.false_negatives += int(numpy.count_nonzero(actual & ~guessed))
+            return
+        for t, p in zip(truth, predicted):
+            if p == 1:
+                if t == 1:
+                    self.true_positives += 1
+                else:
+                    self.false_positives += 1
+            elif t == 1:
+                self.false_negatives += 1
+
+    def result(self):
+        denominator = 2 * self.true_positives + self.false_positives + self.false_negatives
+        return 2 * self.true_positives / denominator if denominator else 0.0
+
+
+class AUC(Metric):
+    """ROC AUC of probabilities in [0, 1] against 0/1 labels, from per-class histograms."""
+
+    def __init__(self):
+        self.positives = [0] * AUC_BUCKETS
+        self.negatives = [0] * AUC_BUCKETS
+
+    def add(self, truth, predicted):
+        if numpy is not None:
+            if ((predicted < 0) | (predicted > 1)).any() or ((truth != 0) & (truth != 1)).any():
+                raise ScoringError("AUC needs 0/1 labels and predictions between 0 and 1.")
+            buckets = numpy.minimum((predicted * AUC_BUCKETS).astype(numpy.int64), AUC_BUCKETS - 1)
+            positive = truth == 1
+            for histogram, selected in ((self.positives, buckets[positive]), (self.negatives, buckets[~positive])):
+                counts = numpy.bincount(selected, minlength=AUC_BUCKETS)
+                for bucket in numpy.flatnonzero(counts).tolist():
+                    histogram[bucket] += int(counts[bucket])
+            return
+        for t, p in zip(truth, predicted):
+            if not 0 <= p <= 1 or t not in (0, 1):
+                raise ScoringError("AUC needs 0/1 labels and predictions between 0 and 1.")
+            histogram = self.positives if t == 1 else self.negatives
+            histogram[min(int(p * AUC_BUCKETS), AUC_BUCKETS - 1)] += 1
+
+    def result(self):
+        positives, negatives = sum(self.positives), sum(self.negatives)
+        if not positives or not negatives:
+            raise ScoringError("AUC needs both classes in the ground truth.")
+        # Pairs ranked correctly, with ties (same bucket) counting half
+        area, negatives_below = 0.0, 0
+        for pos, neg in zip(self.positives, self.negatives):
+            area += pos * (negatives_below + neg / 2)
+            negatives_below += neg
+        return area / (positives * negatives)
+
+
+METRICS = {
+    'rmse': RMSE,
+    'mae': MAE,
+    'accuracy': Accuracy,
+    'f1': F1,
+    'auc': AUC,
+}
+
+
+def build_truth(csv_path, id_column, target_column, out_path):
+    """Compile a ground truth CSV into a sorted binary file; returns its row count."""
+    keys, values = array('q'), array('d')
+    for ids, chunk in read_chunks(csv_path, id_column, target_column):
+        keys.extend(hash_id(value) for value in ids)
+        values.extend(chunk)
+    if not keys:
+        raise ScoringError("The ground truth has no rows.")
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    sorted_keys = array('q', (keys[i] for i in order))
+    if any(sorted_keys[i] == sorted_keys[i + 1] for i in range(len(sorted_keys) - 1)):
+        raise ScoringError("The ground truth has duplicate ids.")
+    sorted_values = array('d', (values[i] for i in order))
+    with open(out_path, 'wb') as output:
+        output.write(TRUTH_HEADER.pack(TRUTH_MAGIC, len(sorted_keys)))
+        sorted_keys.tofile(output)
+        sorted_values.tofile(output)
+    return len(sorted_keys)
+
+
+class Truth:
+    """A compiled ground truth, memory-mapped."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = TRUTH_HEADER.unpack_from(self._map)
+        if magic != TRUTH_MAGIC:
+            raise ScoringError("Not a compiled ground truth file.")
+        start = TRUTH_HEADER.size
+        middle = start + 8 * self.count
+        if numpy is not None:
+            self.keys = numpy.frombuffer(self._map, dtype='<i8', count=self.count, offset=start)
+            self.values = numpy.frombuffer(self._map, dtype='<f8', count=self.count, offset=middle)
+        else:
+            view = memoryview(self._map)
+            self.keys = view[start:middle].cast('q')
+            self.values = view[middle:middle + 8 * self.count].cast('d')
+
+    def positions(self, keys):
+        """Row of each key in the truth, -1 where it is unknown."""
+        if numpy is not None:
+            keys = numpy.asarray(keys, dtype='<i8')
+            found = numpy.minimum(numpy.searchsorted(self.keys, keys), self.count - 1)
+            return numpy.where(self.keys[found] == keys, found, -1)
+        result = []
+        for key in keys:
+            i = bisect_left(self.keys, key)
+            result.append(i if i < self.count and self.keys[i] == key else -1)
+        return result
+
+    def close(self):
+        self.keys = self.values = None
+        self._map.close()
+        self._file.close()
+
+
+def score_file(truth_path, submission_path, metric, id_column, target_column):
+    """Score a submission CSV against a compiled ground truth."""
+    truth = Truth(truth_path)
+    try:
+        scorer = METRICS[metric]()
+        seen = numpy.zeros(truth.count, dtype=bool) if numpy is not None else bytearray(truth.count)
+        rows = 0
+        for ids, predicted in read_chunks(submission_path, id_column, target_column):
+            positions = truth.positions([hash_id(value) for value in ids])
+            if numpy is not None:
+                unknown = numpy.flatnonzero(positions < 0)
+                if unknown.size:
+                    raise ScoringError(f"Unknown id '{ids[int(unknown[0])]}'.")
+                if seen[positions].any() or numpy.unique(positions).size != positions.size:
+                    raise ScoringError("The submission has duplicate ids.")
+                seen[positions] = True
+                scorer.add(truth.values[positions], numpy.asarray(predicted, dtype=float))
+            else:
+                for value, position in zip(ids, positions):
+                    if position < 0:
+                        raise ScoringError(f"Unknown id '{value}'.")
+                    if seen[position]:
+                        raise ScoringError("The submission has duplicate ids.")
+                    seen[position] = 1
+                scorer.add([truth.values[position] for position in positions], predicted)
+            rows += len(ids)
+        if rows < truth.count:
+            raise ScoringError(f"{truth.count - rows} id(s) of the ground truth are missing.")
+        return {'score': scorer.result(), 'rows': rows}
+    finally:
+        truth.close()
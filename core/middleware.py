@@ -0,0 +1,12 @@
+from .invalidation import bus
+
+
+class InvalidationMiddleware:
+    """Drop process-local caches invalidated by other workers."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        bus.check()
+        return self.get_response(request)
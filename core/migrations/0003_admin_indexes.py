@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 02:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_cacheversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='project',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['status', 'created_at'], name='application_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['created_at'], name='application_created'),
+        ),
+    ]
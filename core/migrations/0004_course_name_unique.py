@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 02:41
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_courses(apps, schema_editor):
+    # Keep the oldest course under each name and number the others, so the
+    # unique index can be built without losing anything linked to them
+    Course = apps.get_model('core', 'Course')
+    duplicated = Course.objects.values('name').annotate(n=Count('id')).filter(n__gt=1).values_list('name', flat=True)
+    taken = set(Course.objects.values_list('name', flat=True))
+    for name in list(duplicated):
+        for course in Course.objects.filter(name=name).order_by('id')[1:]:
+            number = 2
+            while True:
+                suffix = f" ({number})"
+                candidate = name[:255 - len(suffix)] + suffix
+                if candidate not in taken:
+                    break
+                number += 1
+            taken.add(candidate)
+            Course.objects.filter(pk=course.pk).update(name=candidate)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_courses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='course',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['project', 'status', 'created_at'], name='application_project_status'),
+        ),
+    ]
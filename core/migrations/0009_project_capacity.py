@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_inbox_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-19 03:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_project_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='decided_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(max_length=30)),
+                ('dimension', models.CharField(blank=True, max_length=20)),
+                ('key', models.IntegerField(default=0)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('day', 'metric', 'dimension', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 04:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_datasets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetProfile',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to='core.datasetblob')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-19 04:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_dataset_profiles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Challenge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('rmse', 'RMSE'), ('mae', 'Mean absolute error'), ('accuracy', 'Accuracy'), ('f1', 'F1'), ('auc', 'ROC AUC')], max_length=20)),
+                ('id_column', models.CharField(default='id', max_length=100)),
+                ('target_column', models.CharField(default='target', max_length=100)),
+                ('truth_rows', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('preparing', 'Preparing'), ('open', 'Open'), ('failed', 'Failed')], default='preparing', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('closes_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ground_truth', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='challenges', to='core.datasetblob')),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='challenge', to='core.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Scored'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('rows', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('scored_at', models.DateTimeField(blank=True, null=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='submissions', to='core.datasetblob')),
+                ('challenge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='core.challenge')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank_score', models.FloatField()),
+                ('submitted_at', models.DateTimeField()),
+                ('challenge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard', to='core.challenge')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='core.submission')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['challenge', 'user', 'created_at'], name='submission_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['challenge', 'rank_score', 'submitted_at'], name='leaderboard_rank'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('challenge', 'user'), name='leaderboard_challenge_user'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, Exists, ExpressionWrapper, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
 
@@ -24,12 +26,40 @@ class Category(models.Model):
         return self.name
 
 
+class ProjectQuerySet(models.QuerySet):
+    def visible(self):
+        """Projects that are not waiting for background deletion"""
+        return self.filter(deletion_pending=False)
+
+    @staticmethod
+    def flag_expressions():
+        """has_open_slots and has_mentors, the boolean project facets"""
+        assigned = Assignment.objects.filter(project=OuterRef('pk')).order_by().values('project')
+        assigned = Subquery(assigned.annotate(n=Count('pk')).values('n'))
+        return {
+            'has_open_slots': ExpressionWrapper(
+                Q(capacity__isnull=True) | Q(capacity__gt=Coalesce(assigned, 0)),
+                output_field=models.BooleanField(),
+            ),
+            'has_mentors': Exists(Project.mentors.through.objects.filter(project_id=OuterRef('pk'))),
+        }
+
+    def with_flags(self):
+        return self.annotate(**self.flag_expressions())
+
+
 class Project(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     categories = models.ManyToManyField(Category, blank=True, related_name='projects')
     mentors = models.ManyToManyField(User, blank=True, related_name='mentored_projects', limit_choices_to={'is_staff': True})
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Maximum number of participants; empty means no limit
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    # Set while a DeletionTask removes the project's dependents
+    deletion_pending = models.BooleanField(default=False, db_index=True)
+
+    objects = ProjectQuerySet.as_manager()
 
     def __str__(self):
         return self.name or "Unnamed Project"
@@ -57,9 +87,17 @@ class Application(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    # When the application was accepted or rejected
+    decided_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     class Meta:
         unique_together = ('user', 'project')
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='application_status_created'),
+            models.Index(fields=['created_at'], name='application_created'),
+            # Pending applications of a set of projects, newest first (mentor inbox)
+            models.Index(fields=['project', 'status', 'created_at'], name='application_project_status'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} → {self.project.name} ({self.status})"
@@ -83,14 +121,416 @@ class Course(models.Model):
         (4, 'Advanced'),
         (5, 'Expert'),
     ]
-    name = models.CharField(max_length=255)
+    # Natural key of the catalog import
+    name = models.CharField(max_length=255, unique=True)
     description = models.TextField()
     level = models.IntegerField(choices=LEVEL_CHOICES, default=1)
     programming_languages = models.ManyToManyField(ProgrammingLanguage, blank=True, related_name='courses')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maximum number of enrolled users; empty means no limit (see core/enrollments.py)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['level', 'name']
 
     def __str__(self):
         return f"{self.name} (Level {self.level})"
+
+
+class CacheVersion(models.Model):
+    """
+    Version token of a process-local cache namespace.
+    Workers compare it with the token they loaded to detect stale data.
+    """
+    namespace = models.CharField(max_length=100, unique=True)
+    version = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.namespace} @ {self.version}"
+
+
+class DeletionTask(models.Model):
+    """
+    Background deletion of one object and its dependents.
+    `step` and `rows_deleted` record the progress, so an interrupted task
+    resumes where it stopped.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    target = models.CharField(max_length=100)  # "app_label.model"
+    object_id = models.PositiveBigIntegerField()
+    object_repr = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    step = models.PositiveIntegerField(default=0)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('target', 'object_id')
+
+    def __str__(self):
+        return f"Delete {self.target} {self.object_repr} ({self.status})"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py run_workers`.
+    `name` selects the handler registered in core/jobs.py and `payload`
+    holds its keyword arguments.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The claim query: due jobs in order
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    @property
+    def error_summary(self):
+        """Last line of the traceback, i.e. the exception"""
+        lines = self.last_error.strip().splitlines()
+        return lines[-1] if lines else ''
+
+
+class OutboxMessage(models.Model):
+    """
+    A notification to a user, written in the same transaction as the event
+    that caused it and delivered later by core/notifications.py.
+    """
+    EVENT_CHOICES = [
+        ('application_accepted', 'Application accepted'),
+        ('application_rejected', 'Application rejected'),
+        ('course_seat_granted', 'Course seat granted'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='outbox_messages')
+    event = models.CharField(max_length=50, choices=EVENT_CHOICES)
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='outbox_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_display()} → {self.user.username} ({self.status})"
+
+
+class AnalyticsRollup(models.Model):
+    """
+    One daily counter maintained by core/analytics.py, e.g. the number of
+    applications accepted on a day in one category.
+    `key` is the category, mentor or bucket id, 0 for club-wide totals.
+    """
+    day = models.DateField()
+    metric = models.CharField(max_length=30)
+    dimension = models.CharField(max_length=20, blank=True)
+    key = models.IntegerField(default=0)
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'metric', 'dimension', 'key')
+
+    def __str__(self):
+        return f"{self.day} {self.metric} {self.dimension}:{self.key} = {self.value}"
+
+
+class AnalyticsWatermark(models.Model):
+    """Everything up to `value` has been added to the rollups."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
+
+class ProjectNeighbour(models.Model):
+    """
+    One of the K projects most similar to `project`, kept up to date by
+    core/recommendations.py.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('project', 'neighbour')
+
+    def __str__(self):
+        return f"{self.project} ~ {self.neighbour} ({self.score:.3f})"
+
+
+class NeighbourUpdate(models.Model):
+    """
+    A project whose neighbours must be recomputed, written in the same
+    transaction as the change. Not a foreign key, so marking a project that
+    is being deleted can't fail.
+    """
+    project_id = models.PositiveBigIntegerField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Project {self.project_id}"
+
+
+class ProjectSignature(models.Model):
+    """
+    MinHash signature of a project's name and description, kept up to date
+    by core/duplicates.py.
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField()
+
+    def __str__(self):
+        return f"Signature of {self.project_id}"
+
+
+class ProjectBand(models.Model):
+    """
+    One LSH band of a project's signature. Projects that share a (band,
+    bucket) pair are candidate duplicates.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='projectband_lookup'),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}: band {self.band} = {self.bucket}"
+
+
+class DatasetBlob(models.Model):
+    """
+    Stored file content, named by its SHA-256 and shared by every Dataset
+    with the same bytes (see core/datasets.py).
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
+class Dataset(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='datasets')
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='datasets')
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    content_type = models.CharField(max_length=100, default='application/octet-stream')
+    blob = models.ForeignKey(DatasetBlob, on_delete=models.PROTECT, related_name='datasets')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'created_at'], name='dataset_project_created'),
+            models.Index(fields=['created_at'], name='dataset_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.project})"
+
+
+class DatasetQuota(models.Model):
+    """
+    Bytes and files a user has uploaded, kept as counters that every upload
+    and delete adjusts, so checking the quota reads one row.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='dataset_quota')
+    used_bytes = models.PositiveBigIntegerField(default=0)
+    files = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user}: {self.used_bytes} bytes in {self.files} file(s)"
+
+
+class DatasetProfile(models.Model):
+    """
+    Preview rows and column statistics of a DatasetBlob, computed once per
+    content hash by a background job (see core/profiling.py).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('unsupported', 'Unsupported'),
+        ('failed', 'Failed'),
+    ]
+    blob = models.OneToOneField(DatasetBlob, on_delete=models.CASCADE, primary_key=True, related_name='profile')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    data = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Profile of {self.blob_id} ({self.status})"
+
+
+class Challenge(models.Model):
+    """
+    A prediction challenge on a project: participants upload CSVs of
+    predictions, scored against a hidden ground truth (see core/challenges.py).
+    """
+    METRIC_CHOICES = [
+        ('rmse', 'RMSE'),
+        ('mae', 'Mean absolute error'),
+        ('accuracy', 'Accuracy'),
+        ('f1', 'F1'),
+        ('auc', 'ROC AUC'),
+    ]
+    STATUS_CHOICES = [
+        ('preparing', 'Preparing'),
+        ('open', 'Open'),
+        ('failed', 'Failed'),
+    ]
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='challenge')
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    id_column = models.CharField(max_length=100, default='id')
+    target_column = models.CharField(max_length=100, default='target')
+    ground_truth = models.ForeignKey(DatasetBlob, on_delete=models.PROTECT, related_name='challenges')
+    truth_rows = models.PositiveBigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='preparing')
+    error = models.TextField(blank=True)
+    closes_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def higher_is_better(self):
+        return self.metric not in ('rmse', 'mae')
+
+    def __str__(self):
+        return f"Challenge of {self.project} ({self.metric})"
+
+
+class Submission(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Scored'),
+        ('failed', 'Failed'),
+    ]
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='submissions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submissions')
+    blob = models.ForeignKey(DatasetBlob, on_delete=models.PROTECT, related_name='submissions')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    score = models.FloatField(null=True, blank=True)
+    rows = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    scored_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # A participant's submissions, newest first, and the daily limit
+            models.Index(fields=['challenge', 'user', 'created_at'], name='submission_user_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} → {self.challenge_id} ({self.status})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A participant's best scored submission, kept up to date as submissions
+    are scored, so the leaderboard is one indexed range scan.
+    """
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='leaderboard')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    score = models.FloatField()
+    # The score negated for metrics where higher is better, so the best entry is always the lowest
+    rank_score = models.FloatField()
+    # Of the best submission; earlier wins ties
+    submitted_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['challenge', 'user'], name='leaderboard_challenge_user'),
+        ]
+        indexes = [
+            models.Index(fields=['challenge', 'rank_score', 'submitted_at'], name='leaderboard_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.challenge_id}: {self.score}"
+
+
+class CourseSeats(models.Model):
+    """
+    Free seats of a course with a capacity. Kept apart from Course so that
+    saving a course never writes a stale count over concurrent enrollments.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='seats')
+    seats_left = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.course_id}: {self.seats_left} seat(s) left"
+
+
+class CourseEnrollment(models.Model):
+    STATUS_CHOICES = [
+        ('enrolled', 'Enrolled'),
+        ('waitlisted', 'Waitlisted'),
+    ]
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_enrollments')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a waitlisted enrollment got its seat
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'user'], name='enrollment_course_user'),
+        ]
+        indexes = [
+            # Enrolled users of a course, and the head of its waitlist (lowest id first)
+            models.Index(fields=['course', 'status', 'id'], name='enrollment_course_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} → {self.course_id} ({self.status})"
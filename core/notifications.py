@@ -0,0 +1,149 @@
+"""
+Transactional outbox for user notifications.
+
+Events write an OutboxMessage row in the transaction that makes the change,
+so a notification exists exactly when the change was committed. Writing one
+also queues a dispatch job, delayed by CORE_NOTIFICATION_DELAY seconds so
+that decisions made in quick succession go out together. The dispatcher
+claims pending rows in batches, groups them by recipient into one email
+each, and sends them over a single backend connection.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import jobs
+from .models import Job, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_JOB = 'core.dispatch_notifications'
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+
+# A claim older than this belongs to a dispatcher that died. Messages whose
+# send failed keep their claim, so this is also the delay before a retry.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+DECISION_EVENTS = {
+    'accepted': 'application_accepted',
+    'rejected': 'application_rejected',
+}
+
+
+def schedule_dispatch(delay=None):
+    """Queue a dispatch job unless one is already waiting."""
+    if Job.objects.filter(name=DISPATCH_JOB, status='queued').exists():
+        return None
+    if delay is None:
+        delay = timedelta(seconds=getattr(settings, 'CORE_NOTIFICATION_DELAY', 30))
+    return jobs.enqueue(DISPATCH_JOB, delay=delay)
+
+
+def notify_many(rows):
+    """Write (user_id, event, context) rows to the outbox."""
+    messages = [OutboxMessage(user_id=user_id, event=event, context=context) for user_id, event, context in rows]
+    OutboxMessage.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+    if messages:
+        schedule_dispatch()
+    return messages
+
+
+def application_decided(application):
+    """Queue the applicant's notification; call inside the decision's transaction."""
+    return notify_many([(
+        application.user_id,
+        DECISION_EVENTS[application.status],
+        {'project_id': application.project_id, 'project_name': application.project.name},
+    )])
+
+
+def _claimable(now):
+    return Q(status='pending') & (Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Claim every pending message of the recipients of the oldest `batch_size`
+    messages, so each recipient's events end up in one email.
+    """
+    now = timezone.now()
+    user_ids = set(
+        OutboxMessage.objects.filter(_claimable(now)).order_by('id').values_list('user_id', flat=True)[:batch_size]
+    )
+    if not user_ids:
+        return []
+    candidates = OutboxMessage.objects.filter(_claimable(now), user_id__in=user_ids)
+    ids = list(candidates.values_list('id', flat=True))
+    # Only rows still unclaimed are taken, so concurrent dispatchers don't overlap
+    OutboxMessage.objects.filter(_claimable(now), id__in=ids).update(claimed_at=now)
+    return list(
+        OutboxMessage.objects.filter(id__in=ids, claimed_at=now).select_related('user').order_by('user_id', 'id')
+    )
+
+
+def render_email(user, messages):
+    context = {'user': user, 'messages': messages}
+    subject = render_to_string('core/emails/notifications_subject.txt', context).strip()
+    body = render_to_string('core/emails/notifications.txt', context)
+    return EmailMessage(subject, body, to=[user.email])
+
+
+def _group_by_user(messages):
+    groups = {}
+    for message in messages:
+        groups.setdefault(message.user_id, []).append(message)
+    return groups.values()
+
+
+def dispatch(batch_size=BATCH_SIZE):
+    """Send every pending notification; returns counts per outcome."""
+    counts = {'emails': 0, 'sent': 0, 'skipped': 0, 'failed': 0, 'retrying': 0}
+    connection = get_connection()
+    # Opened once here, so send_messages() reuses it for every recipient
+    connection.open()
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            for messages in _group_by_user(batch):
+                _deliver(connection, messages, counts)
+    finally:
+        connection.close()
+    if counts['retrying']:
+        # Not schedule_dispatch(): a dispatch queued earlier would run before
+        # the failed rows' claims expire and leave them pending
+        jobs.enqueue(DISPATCH_JOB, delay=CLAIM_TIMEOUT)
+    return counts
+
+
+def _deliver(connection, messages, counts):
+    ids = [message.id for message in messages]
+    user = messages[0].user
+    if not user.email:
+        OutboxMessage.objects.filter(id__in=ids).update(status='skipped', last_error="No email address")
+        counts['skipped'] += len(ids)
+        return
+    try:
+        connection.send_messages([render_email(user, messages)])
+    except Exception as exc:
+        logger.exception("Sending notifications to %s failed", user.username)
+        OutboxMessage.objects.filter(id__in=ids).update(
+            attempts=F('attempts') + 1, last_error=str(exc),
+        )
+        failed = OutboxMessage.objects.filter(id__in=ids, attempts__gte=MAX_ATTEMPTS).update(status='failed')
+        counts['failed'] += failed
+        counts['retrying'] += len(ids) - failed
+        return
+    OutboxMessage.objects.filter(id__in=ids).update(
+        status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1,
+    )
+    counts['emails'] += 1
+    counts['sent'] += len(ids)
@@ -0,0 +1,47 @@
+"""
+Keyset (cursor) pagination on a (timestamp, id) pair.
+
+Each page continues strictly after the last row of the previous one, so
+fetching page n costs the same as fetching the first page, unlike OFFSET.
+"""
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(moment, pk):
+    return base64.urlsafe_b64encode(f"{moment.isoformat()}|{pk}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        moment, pk = raw.rsplit('|', 1)
+        moment = parse_datetime(moment)
+        if moment is None:
+            raise ValueError(raw)
+        return moment, int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+
+def keyset_page(queryset, cursor=None, limit=50, field='created_at'):
+    """
+    Return (rows, next_cursor) for the newest-first page after `cursor`.
+    next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    if cursor:
+        moment, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': moment}) | Q(**{field: moment, 'pk__lt': pk}))
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,286 @@
+"""
+Dataset previews: the first rows, inferred column types and per-column
+statistics of CSV datasets.
+
+The stored file is memory-mapped, so the OS pages it in as it is read and
+nothing holds a copy. The delimiter is sniffed from the first SAMPLE_BYTES
+and the column types are inferred from the first SAMPLE_ROWS rows. The
+whole file is then read in CHUNK_ROWS chunks, twice: the first pass counts
+nulls and unparsable values and takes the count, sum, min and max of each
+numeric column, the second bins the values into HISTOGRAM_BINS equal-width
+buckets between that min and max. With NumPy installed every chunk of a
+column is reduced with vectorized calls; without it with builtins.
+
+A profile is computed once per content hash (DatasetProfile belongs to the
+DatasetBlob) by a `core.profile_dataset` job, queued on upload or by the
+first preview request, and served as stored afterwards.
+"""
+import csv
+import math
+import mmap
+from itertools import islice
+
+from . import jobs
+from .datasets import blob_path
+from .models import DatasetProfile
+
+try:
+    import numpy
+except ImportError:  # Optional; the chunks are reduced with builtins
+    numpy = None
+
+PROFILE_JOB = 'core.profile_dataset'
+
+SAMPLE_BYTES = 64 * 1024
+SAMPLE_ROWS = 1000
+PREVIEW_ROWS = 20
+CHUNK_ROWS = 50_000
+HISTOGRAM_BINS = 20
+MAX_COLUMNS = 200
+
+TABULAR_EXTENSIONS = ('.csv', '.tsv', '.txt')
+TABULAR_TYPES = ('text/csv', 'text/tab-separated-values', 'text/plain', 'application/csv')
+DELIMITERS = ',;\t|'
+
+
+class UnsupportedDataset(ValueError):
+    pass
+
+
+def is_tabular(name, content_type):
+    return name.lower().endswith(TABULAR_EXTENSIONS) or content_type in TABULAR_TYPES
+
+
+def number(value):
+    """The value as a finite float, or None."""
+    try:
+        parsed = float(value)
+    except ValueError:
+        return None
+    return parsed if math.isfinite(parsed) else None
+
+
+def infer_type(values):
+    """'integer', 'float' or 'string' from sample values; 'empty' if all are blank."""
+    present = [value for value in values if value.strip()]
+    if not present:
+        return 'empty'
+    for kind, parse in (('integer', int), ('float', number)):
+        try:
+            if all(parse(value) is not None for value in present):
+                return kind
+        except ValueError:
+            pass
+    return 'string'
+
+
+def reduce(values):
+    """(count, sum, min, max) of a chunk of floats; the sum is None if it overflows."""
+    if numpy is not None:
+        array = numpy.fromiter(values, dtype=float, count=len(values))
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            total = float(array.sum())
+        return array.size, total if math.isfinite(total) else None, float(array.min()), float(array.max())
+    try:
+        total = math.fsum(values)
+    except OverflowError:
+        total = None
+    return len(values), total, min(values), max(values)
+
+
+def finite(value):
+    """The float, or None if it overflowed (JSON has no Infinity)."""
+    return value if value is not None and math.isfinite(value) else None
+
+
+def bin_counts(values, low, high, bins=HISTOGRAM_BINS):
+    """Counts of a chunk of floats in `bins` equal-width buckets over [low, high]."""
+    if high == low:
+        return [len(values)] + [0] * (bins - 1)
+    if numpy is not None:
+        counts, _ = numpy.histogram(numpy.fromiter(values, dtype=float, count=len(values)), bins=bins, range=(low, high))
+        return counts.tolist()
+    width = (high - low) / bins
+    counts = [0] * bins
+    for value in values:
+        counts[min(int((value - low) / width), bins - 1)] += 1
+    return counts
+
+
+class ColumnStats:
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.numeric = kind in ('integer', 'float')
+        self.count = self.nulls = self.invalid = 0
+        self.total = 0.0
+        self.low = self.high = None
+        self.min_length = self.max_length = None
+        self.histogram = [0] * HISTOGRAM_BINS
+
+    def numbers(self, values):
+        """The parsable values of a chunk of a numeric column."""
+        parsed = []
+        for value in values:
+            if not value.strip():
+                continue
+            converted = number(value)
+            if converted is not None:
+                parsed.append(converted)
+        return parsed
+
+    def add(self, values):
+        """First pass: counts and ranges."""
+        present = [value for value in values if value.strip()]
+        self.nulls += len(values) - len(present)
+        if not present:
+            return
+        if not self.numeric:
+            lengths = [len(value) for value in present]
+            self.count += len(lengths)
+            self.min_length = min(lengths) if self.min_length is None else min(self.min_length, *lengths)
+            self.max_length = max(lengths) if self.max_length is None else max(self.max_length, *lengths)
+            return
+        parsed = self.numbers(present)
+        self.invalid += len(present) - len(parsed)
+        if parsed:
+            count, total, low, high = reduce(parsed)
+            self.count += count
+            self.total = finite(self.total + total) if self.total is not None and total is not None else None
+            self.low = low if self.low is None else min(self.low, low)
+            self.high = high if self.high is None else max(self.high, high)
+
+    def spread(self):
+        """max - min, or None if there is no range or it overflows."""
+        return finite(self.high - self.low) if self.count else None
+
+    def add_to_histogram(self, values):
+        """Second pass: bucket counts over the range found by the first."""
+        parsed = self.numbers(values)
+        if parsed:
+            self.histogram = [a + b for a, b in zip(self.histogram, bin_counts(parsed, self.low, self.high))]
+
+    def as_dict(self):
+        row = {'name': self.name, 'type': self.kind, 'count': self.count, 'nulls': self.nulls}
+        if self.numeric:
+            spread = self.spread()
+            step = spread / HISTOGRAM_BINS if spread is not None else 0
+            row.update({
+                'invalid': self.invalid,
+                'min': self.low,
+                'max': self.high,
+                'mean': self.total / self.count if self.count and self.total is not None else None,
+                'histogram': {
+                    'edges': [self.low + step * i for i in range(HISTOGRAM_BINS + 1)] if spread is not None else [],
+                    'counts': self.histogram if spread is not None else [],
+                },
+            })
+        else:
+            row.update({'min_length': self.min_length, 'max_length': self.max_length})
+        return row
+
+
+def _reader(mapped, dialect):
+    mapped.seek(0)
+    lines = (line.decode('utf-8', 'replace') for line in iter(mapped.readline, b''))
+    return csv.reader(lines, dialect)
+
+
+def _chunks(rows, width):
+    """Columns of successive chunks of rows, padded or cut to `width`."""
+    while True:
+        chunk = list(islice(rows, CHUNK_ROWS))
+        if not chunk:
+            return
+        padded = [row[:width] + [''] * (width - len(row)) for row in chunk if row]
+        if padded:
+            yield len(padded), list(zip(*padded))
+
+
+def profile_file(path):
+    """Preview and statistics of a CSV file, read through a memory map."""
+    with open(path, 'rb') as file:
+        if not file.seek(0, 2):
+            raise UnsupportedDataset("The file is empty.")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            sample = mapped[:SAMPLE_BYTES].decode('utf-8', 'replace')
+            if len(mapped) > SAMPLE_BYTES and '\n' in sample:
+                sample = sample[:sample.rindex('\n')]
+            if '\x00' in sample:
+                raise UnsupportedDataset("The file is not text.")
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=DELIMITERS)
+            except csv.Error:
+                dialect = csv.excel
+
+            rows = _reader(mapped, dialect)
+            header = next(rows, [])
+            if header:
+                header[0] = header[0].lstrip('\ufeff')
+            header = header[:MAX_COLUMNS]
+            width = len(header)
+            if not width:
+                raise UnsupportedDataset("The file has no header row.")
+            head = list(islice(rows, SAMPLE_ROWS))
+            columns = [
+                ColumnStats(name or f"column {i + 1}", infer_type([row[i] if i < len(row) else '' for row in head]))
+                for i, name in enumerate(header)
+            ]
+
+            total_rows = 0
+            rows = _reader(mapped, dialect)
+            next(rows, None)
+            for count, values in _chunks(rows, width):
+                total_rows += count
+                for column, column_values in zip(columns, values):
+                    column.add(column_values)
+
+            # A range too wide for a float has no histogram
+            numeric = [(i, column) for i, column in enumerate(columns) if column.numeric and column.spread() is not None]
+            if numeric:
+                rows = _reader(mapped, dialect)
+                next(rows, None)
+                for _, values in _chunks(rows, width):
+                    for i, column in numeric:
+                        column.add_to_histogram(values[i])
+
+    return {
+        'delimiter': dialect.delimiter,
+        'rows': total_rows,
+        'columns': [column.as_dict() for column in columns],
+        'preview': {'header': header, 'rows': [row[:width] for row in head[:PREVIEW_ROWS]]},
+        'engine': 'numpy' if numpy is not None else 'python',
+    }
+
+
+def schedule(dataset):
+    """The profile of the dataset's content, queuing its computation if needed."""
+    status = 'pending' if is_tabular(dataset.name, dataset.content_type) else 'unsupported'
+    profile, created = DatasetProfile.objects.get_or_create(blob_id=dataset.blob_id, defaults={'status': status})
+    # The same bytes may have been uploaded earlier under a name we didn't profile
+    if not created and profile.status == 'unsupported' and status == 'pending' and not profile.error:
+        profile.status = status
+        profile.save(update_fields=['status', 'updated_at'])
+        created = True
+    if created and status == 'pending':
+        jobs.enqueue(PROFILE_JOB, {'blob_id': dataset.blob_id})
+    return profile
+
+
+def run(blob_id):
+    """Compute and store the profile of a blob."""
+    profile = DatasetProfile.objects.select_related('blob').get(pk=blob_id)
+    try:
+        profile.data = profile_file(blob_path(profile.blob.sha256))
+        profile.status, profile.error = 'done', ''
+    except UnsupportedDataset as exc:
+        profile.status, profile.error = 'unsupported', str(exc)
+    except (OSError, csv.Error, UnicodeError) as exc:
+        # Retrying won't make the file readable
+        profile.status, profile.error = 'failed', str(exc)
+    except Exception as exc:
+        # Don't leave the preview pending; the job's retry may still succeed
+        DatasetProfile.objects.filter(pk=profile.pk).update(status='failed', error=str(exc) or type(exc).__name__)
+        raise
+    profile.save(update_fields=['data', 'status', 'error', 'updated_at'])
+    return {'status': profile.status, 'rows': (profile.data or {}).get('rows')}
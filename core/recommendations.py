@@ -0,0 +1,169 @@
+"""
+"Recommended for you" projects from item-item similarity.
+
+Every project is a sparse vector over the users who applied to it or are
+assigned to it (weight 1) and its categories (CATEGORY_WEIGHT). The cosine
+similarity of all pairs that share a feature is accumulated through an
+inverted index (a sparse A·Aᵀ), and the TOP_K best neighbours of each
+project are stored in ProjectNeighbour.
+
+Writes that change a vector record a NeighbourUpdate in their transaction
+and queue a `core.refresh_recommendations` job. The job rewrites only the
+lists of the marked projects and of those sharing a feature with them,
+whose lists may include a marked project; the marks are removed in the
+transaction that stores the new lists. The run is incremental in what it
+writes, not in what it reads: every vector is loaded, and since categories
+are features, every project in a marked project's categories is
+recomputed, so with a few broad categories a run costs close to a full
+one. A user's recommendations are the neighbours of the projects they
+interacted with, summed and ranked in one query.
+"""
+import heapq
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from . import jobs
+from .assignments import LOOKUP_CHUNK_SIZE, chunked
+from .models import Application, Assignment, Job, NeighbourUpdate, Project, ProjectNeighbour
+
+REFRESH_JOB = 'core.refresh_recommendations'
+
+TOP_K = 20
+CATEGORY_WEIGHT = 1.0
+DEFAULT_LIMIT = 10
+
+# Changes made in quick succession are handled by one run
+REFRESH_DELAY = timedelta(seconds=60)
+
+
+def mark(project_ids):
+    """Queue the neighbours of these projects for recomputation."""
+    project_ids = set(project_ids)
+    if not project_ids:
+        return
+    # A project marked again gets a new created_at, so a run that read the
+    # older mark knows not to clear it
+    NeighbourUpdate.objects.bulk_create(
+        [NeighbourUpdate(project_id=pk) for pk in project_ids],
+        update_conflicts=True, unique_fields=['project_id'], update_fields=['created_at'],
+    )
+    if not Job.objects.filter(name=REFRESH_JOB, status='queued').exists():
+        jobs.enqueue(REFRESH_JOB, delay=REFRESH_DELAY)
+
+
+def load_vectors():
+    """Feature weights of every visible project: {project_id: {feature: weight}}."""
+    visible = Project.objects.visible()
+    vectors = {pk: {} for pk in visible.values_list('id', flat=True)}
+    for model in (Application, Assignment):
+        rows = model.objects.filter(project__deletion_pending=False).values_list('project_id', 'user_id')
+        for project_id, user_id in rows.iterator(chunk_size=5000):
+            vectors[project_id][('user', user_id)] = 1.0
+    categories = Project.categories.through.objects.filter(project__deletion_pending=False)
+    for project_id, category_id in categories.values_list('project_id', 'category_id').iterator(chunk_size=5000):
+        vectors[project_id][('category', category_id)] = CATEGORY_WEIGHT
+    return vectors
+
+
+def neighbours(vectors, project_ids, k=TOP_K):
+    """Top-k (neighbour, cosine) of each of `project_ids`."""
+    postings = defaultdict(list)
+    for pk, vector in vectors.items():
+        for feature, weight in vector.items():
+            postings[feature].append((pk, weight))
+    norms = {pk: math.sqrt(sum(w * w for w in vector.values())) for pk, vector in vectors.items()}
+
+    result = {}
+    for pk in project_ids:
+        vector = vectors.get(pk)
+        if not vector:
+            result[pk] = []
+            continue
+        dots = defaultdict(float)
+        for feature, weight in vector.items():
+            for other, other_weight in postings[feature]:
+                if other != pk:
+                    dots[other] += weight * other_weight
+        scores = ((other, dot / (norms[pk] * norms[other])) for other, dot in dots.items())
+        result[pk] = heapq.nlargest(k, scores, key=lambda item: (item[1], -item[0]))
+    return result
+
+
+def affected(vectors, project_ids):
+    """The projects whose neighbour lists may change with these projects' vectors."""
+    features = set()
+    for pk in project_ids:
+        features.update(vectors.get(pk, ()))
+    related = {pk for pk, vector in vectors.items() if not features.isdisjoint(vector)}
+    return related | set(project_ids)
+
+
+def _clear_marks(marks):
+    """Delete the marks read by this run, unless a project was marked again since."""
+    for chunk in chunked(list(marks), LOOKUP_CHUNK_SIZE):
+        current = NeighbourUpdate.objects.select_for_update().filter(id__in=chunk).values_list('id', 'created_at')
+        unchanged = [mark_id for mark_id, created_at in current if created_at == marks[mark_id]]
+        NeighbourUpdate.objects.filter(id__in=unchanged).delete()
+
+
+def _store(results, marks, gone=()):
+    """Replace the lists in `results` and clear the marks they were computed for."""
+    with transaction.atomic():
+        for chunk in chunked(list(results) + list(gone), LOOKUP_CHUNK_SIZE):
+            ProjectNeighbour.objects.filter(project_id__in=chunk).delete()
+        ProjectNeighbour.objects.bulk_create([
+            ProjectNeighbour(project_id=pk, neighbour_id=other, score=score)
+            for pk, rows in results.items()
+            for other, score in rows
+        ], batch_size=1000)
+        _clear_marks(marks)
+
+
+def _read_marks():
+    """The current marks as {mark_id: created_at} and the projects they name."""
+    rows = list(NeighbourUpdate.objects.values_list('id', 'project_id', 'created_at'))
+    return {mark_id: created_at for mark_id, _, created_at in rows}, {project_id for _, project_id, _ in rows}
+
+
+def refresh(full=False):
+    """Recompute the marked projects' neighbourhoods, or all of them."""
+    marks, marked = _read_marks()
+    if not (marked or full):
+        return {'projects': 0, 'neighbours': 0}
+    vectors = load_vectors()
+    gone = []
+    if full:
+        targets = set(vectors)
+        # Drop lists of projects that are hidden or gone
+        ProjectNeighbour.objects.exclude(project_id__in=Project.objects.visible().values('id')).delete()
+    else:
+        targets = affected(vectors, marked)
+        # Lists holding a marked project, even if they no longer share a feature
+        for chunk in chunked(marked, LOOKUP_CHUNK_SIZE):
+            targets.update(ProjectNeighbour.objects.filter(neighbour_id__in=chunk).values_list('project_id', flat=True))
+        # Hidden or deleted projects have no list
+        gone = [pk for pk in marked if pk not in vectors]
+    results = neighbours(vectors, targets & set(vectors))
+    _store(results, marks, gone)
+    return {'projects': len(results), 'neighbours': sum(len(rows) for rows in results.values())}
+
+
+def for_user(user, limit=DEFAULT_LIMIT):
+    """Projects similar to the ones `user` applied to or joined, best first."""
+    applied = Application.objects.filter(user=user).values('project_id')
+    joined = Assignment.objects.filter(user=user).values('project_id')
+    rows = (
+        ProjectNeighbour.objects
+        .filter(Q(project_id__in=applied) | Q(project_id__in=joined))
+        .exclude(neighbour_id__in=applied)
+        .exclude(neighbour_id__in=joined)
+        .filter(neighbour__deletion_pending=False)
+        .values('neighbour_id', 'neighbour__name')
+        .annotate(score=Sum('score'))
+        .order_by('-score', 'neighbour_id')[:limit]
+    )
+    return [{'id': row['neighbour_id'], 'name': row['neighbour__name'], 'score': row['score']} for row in rows]
@@ -0,0 +1,54 @@
+"""
+Process-local cache of the Category and ProgrammingLanguage lookup tables.
+
+Both tables are loaded once per worker and dropped when the 'refdata'
+namespace is invalidated on the bus (see core/invalidation.py), which every
+request checks once, so forms and views no longer query them.
+"""
+import threading
+
+from .invalidation import bus
+from .models import Category, ProgrammingLanguage
+
+NAMESPACE = 'refdata'
+
+TABLES = (Category, ProgrammingLanguage)
+
+
+class ReferenceDataCache:
+    def __init__(self, models=TABLES):
+        self.models = models
+        self._lock = threading.Lock()
+        self._tables = None
+
+    def clear(self):
+        with self._lock:
+            self._tables = None
+
+    def _load(self):
+        tables = self._tables
+        if tables is None:
+            with self._lock:
+                if self._tables is None:
+                    self._tables = {model: list(model.objects.all()) for model in self.models}
+                tables = self._tables
+        return tables
+
+    def all(self, model):
+        """All rows of a cached model, in its default ordering."""
+        return self._load()[model]
+
+    def by_pk(self, model):
+        return {obj.pk: obj for obj in self.all(model)}
+
+
+refdata = ReferenceDataCache()
+bus.subscribe(NAMESPACE, refdata.clear)
+
+
+def categories():
+    return refdata.all(Category)
+
+
+def programming_languages():
+    return refdata.all(ProgrammingLanguage)
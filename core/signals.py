@@ -0,0 +1,109 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import autocomplete, duplicates, enrollments, recommendations, refdata, similar_courses
+from .caching import CATEGORIES_TAG, COURSES_TAG, LANGUAGES_TAG, PROJECTS_TAG
+from .invalidation import bus
+from .models import Application, Assignment, Category, Course, ProgrammingLanguage, Project
+
+# Bus namespaces (cache tags and process-local caches) to invalidate when a
+# row of the given model changes. Publishing bumps the generation on commit.
+MODEL_NAMESPACES = {
+    Project: (PROJECTS_TAG,),
+    Assignment: (PROJECTS_TAG,),
+    Application: (PROJECTS_TAG,),
+    Category: (CATEGORIES_TAG, PROJECTS_TAG, refdata.NAMESPACE),
+    Course: (COURSES_TAG,),
+    ProgrammingLanguage: (LANGUAGES_TAG, COURSES_TAG, refdata.NAMESPACE),
+    # Usernames are embedded in the project payloads
+    User: (PROJECTS_TAG,),
+}
+
+M2M_NAMESPACES = {
+    Project.categories.through: (PROJECTS_TAG,),
+    Project.mentors.through: (PROJECTS_TAG,),
+    Course.programming_languages.through: (COURSES_TAG,),
+}
+
+
+def _invalidate_for(sender):
+    namespaces = MODEL_NAMESPACES.get(sender)
+    if namespaces:
+        bus.publish(*namespaces)
+
+
+def _update_autocomplete(sender, instance, deleted=False):
+    index = autocomplete.index_for_model(sender)
+    if index is None:
+        return
+    if deleted or not index.is_listed(instance):
+        pk = instance.pk
+        transaction.on_commit(lambda: index.remove(pk))
+    else:
+        row = (instance.pk, *(getattr(instance, field) for field in index.fields))
+        transaction.on_commit(lambda: index.update(row))
+    # This worker's index is updated in place; the others drop theirs
+    bus.publish(autocomplete.NAMESPACE, local=False)
+
+
+def _update_similar_courses(sender, instance, deleted=False):
+    if sender is not Course:
+        return
+    pk = instance.pk
+    if deleted:
+        transaction.on_commit(lambda: similar_courses.index.remove(pk))
+    else:
+        row = (pk, instance.level, instance.name, instance.description)
+        transaction.on_commit(lambda: similar_courses.index.update(row))
+    bus.publish(similar_courses.NAMESPACE, local=False)
+
+
+def _update_signature(sender, instance, created, update_fields):
+    # Only the text goes into a project's signature
+    if sender is Project and (created or not update_fields or {'name', 'description'} & set(update_fields)):
+        duplicates.schedule(instance.pk, created)
+
+
+def _mark_neighbours(sender, instance, created=True, update_fields=None):
+    # New or removed interactions change a project's vector, status changes don't
+    if sender in (Application, Assignment) and created:
+        recommendations.mark([instance.project_id])
+    elif sender is Project and update_fields and 'deletion_pending' in update_fields:
+        recommendations.mark([instance.pk])
+
+
+@receiver(post_save)
+def invalidate_on_save(sender, instance, created=False, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which no cached payload shows
+    if sender is User and update_fields and set(update_fields) <= {'last_login'}:
+        return
+    _invalidate_for(sender)
+    _update_autocomplete(sender, instance)
+    _update_similar_courses(sender, instance)
+    _update_signature(sender, instance, created, update_fields)
+    _mark_neighbours(sender, instance, created, update_fields)
+
+
+@receiver(post_delete)
+def invalidate_on_delete(sender, instance, **kwargs):
+    _invalidate_for(sender)
+    _update_autocomplete(sender, instance, deleted=True)
+    _update_similar_courses(sender, instance, deleted=True)
+    _mark_neighbours(sender, instance)
+
+
+@receiver(pre_delete, sender=User)
+def withdraw_enrollments(sender, instance, **kwargs):
+    # The cascade would drop the enrollments without giving their seats back
+    enrollments.withdraw_user(instance.pk)
+
+
+@receiver(m2m_changed)
+def invalidate_on_m2m_change(sender, instance, action, reverse, pk_set=None, **kwargs):
+    namespaces = M2M_NAMESPACES.get(sender)
+    if namespaces and action in ('post_add', 'post_remove', 'post_clear'):
+        bus.publish(*namespaces)
+    if sender is Project.categories.through and action in ('post_add', 'post_remove', 'post_clear'):
+        recommendations.mark((pk_set or ()) if reverse else [instance.pk])
@@ -0,0 +1,248 @@
+"""
+Content-based course suggestions from TF-IDF over the course text.
+
+Every course is a sparse vector of sublinear term frequencies (1 + log tf)
+over the words of its name (counted NAME_WEIGHT times) and description,
+weighted by the smoothed idf of each term. The index keeps one inverted
+list per term as two flat arrays (course slots and frequencies), so a
+lookup walks the lists of the query's QUERY_TERMS heaviest terms (skipping
+terms found in over MAX_DF_RATIO of the courses) and never touches the rest
+of the catalog; only the query text is tokenized per
+request. Results are re-ranked by level: the same level and the next one
+up keep their score, every further step costs LEVEL_PENALTY.
+
+The index is built once per worker, updated in place by the writing worker
+after commit (a replaced course gets a fresh slot and its old one is left
+as a tombstone), and dropped in the other workers through the invalidation
+bus. Document norms are computed with the idf of the moment, so after
+REBUILD_RATIO of the catalog has changed the index is rebuilt on next use.
+"""
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from operator import itemgetter
+
+from .invalidation import bus
+from .models import Assignment, Course
+
+NAMESPACE = 'similar_courses'
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+NAME_WEIGHT = 2
+QUERY_TERMS = 32
+# Query terms found in more than this share of the courses (and in over
+# MAX_DF_FLOOR of them) barely move a score but have the longest lists
+MAX_DF_RATIO = 0.1
+MAX_DF_FLOOR = 100
+LEVEL_PENALTY = 0.2
+MIN_LEVEL_WEIGHT = 0.2
+
+# Rebuild once this share of the catalog (and at least REBUILD_MIN courses) has changed
+REBUILD_RATIO = 0.2
+REBUILD_MIN = 100
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+STOP_WORDS = frozenset("""
+    a about after all also an and any are as at be been but by can course courses
+    do does each for from has have how i in into is it its learn more most not of
+    on or our over so such than that the their them then there these they this to
+    up use used using was we what when which will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased words of `text`, stop words dropped."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def term_counts(name, description):
+    counts = Counter(tokenize(description))
+    for token in tokenize(name):
+        counts[token] += NAME_WEIGHT
+    return counts
+
+
+def level_weight(level, target):
+    """Re-ranking factor of a course at `level` for a reader at `target`."""
+    if target is None:
+        return 1.0
+    step = level - target
+    distance = step - 1 if step > 0 else -step
+    return max(1.0 - LEVEL_PENALTY * distance, MIN_LEVEL_WEIGHT)
+
+
+class CourseTextIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self._terms = {}
+        self._df = array('I')
+        self._postings = []
+        self._ids = array('q')
+        self._levels = array('b')
+        self._norms = array('f')
+        self._documents = []
+        self._slots = {}
+        self._changes = 0
+
+    def __len__(self):
+        with self._lock:
+            self._load_locked()
+            return len(self._slots)
+
+    def clear(self):
+        with self._lock:
+            self._loaded = False
+            self._reset()
+
+    def _idf(self, term):
+        return math.log((1 + len(self._slots)) / (1 + self._df[term])) + 1
+
+    def _vector(self, counts, add_terms=False):
+        """Term ids and sublinear frequencies; unknown terms are skipped unless added."""
+        terms, frequencies = array('I'), array('f')
+        for token, count in counts.items():
+            term = self._terms.get(token)
+            if term is None:
+                if not add_terms:
+                    continue
+                term = self._terms[token] = len(self._df)
+                self._df.append(0)
+                self._postings.append((array('I'), array('f')))
+            terms.append(term)
+            frequencies.append(1 + math.log(count))
+        return terms, frequencies
+
+    def _norm(self, terms, frequencies):
+        return math.sqrt(sum((f * self._idf(t)) ** 2 for t, f in zip(terms, frequencies))) or 1.0
+
+    def _append(self, course_id, level, counts):
+        """Give the course a new slot; its norm is left to the caller."""
+        terms, frequencies = self._vector(counts, add_terms=True)
+        slot = len(self._ids)
+        self._ids.append(course_id)
+        self._levels.append(level)
+        self._norms.append(1.0)
+        self._documents.append((terms, frequencies))
+        self._slots[course_id] = slot
+        for term, frequency in zip(terms, frequencies):
+            self._df[term] += 1
+            slots, weights = self._postings[term]
+            slots.append(slot)
+            weights.append(frequency)
+        return slot
+
+    def _load_locked(self):
+        """
+        Build the index unless it is loaded. Readers call this in the same
+        lock acquisition as their lookup, so a clear() can't empty the
+        index in between.
+        """
+        if self._loaded:
+            return
+        self._reset()
+        rows = Course.objects.order_by().values_list('id', 'level', 'name', 'description')
+        for course_id, level, name, description in rows.iterator(chunk_size=2000):
+            self._append(course_id, level, term_counts(name, description))
+        # The idf is only known once every course has been read
+        for slot, (terms, frequencies) in enumerate(self._documents):
+            self._norms[slot] = self._norm(terms, frequencies)
+        self._loaded = True
+
+    def _remove_locked(self, course_id):
+        slot = self._slots.pop(course_id, None)
+        if slot is None:
+            return
+        terms, _ = self._documents[slot]
+        for term in terms:
+            self._df[term] -= 1
+        # Its postings stay behind and are skipped until the next rebuild
+        self._ids[slot] = 0
+        self._documents[slot] = (array('I'), array('f'))
+
+    def _maybe_expire_locked(self):
+        if self._changes > REBUILD_RATIO * max(len(self._slots), REBUILD_MIN):
+            self._loaded = False
+
+    def update(self, row):
+        """Insert or replace one course, given as values_list('id', 'level', 'name', 'description')."""
+        course_id, level, name, description = row
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove_locked(course_id)
+            slot = self._append(course_id, level, term_counts(name, description))
+            self._norms[slot] = self._norm(*self._documents[slot])
+            self._changes += 1
+            self._maybe_expire_locked()
+
+    def remove(self, course_id):
+        with self._lock:
+            if self._loaded and course_id in self._slots:
+                self._remove_locked(course_id)
+                self._changes += 1
+                self._maybe_expire_locked()
+
+    def _rank(self, terms, frequencies, limit, target, exclude=None):
+        """Top `limit` (course id, score) by cosine similarity times the level weight."""
+        query = [(term, frequency * self._idf(term)) for term, frequency in zip(terms, frequencies)]
+        query_norm = math.sqrt(sum(weight * weight for _, weight in query))
+        if not query_norm:
+            return []
+        max_df = max(MAX_DF_RATIO * len(self._slots), MAX_DF_FLOOR)
+        selective = [(term, weight) for term, weight in query if self._df[term] <= max_df]
+        dots = {}
+        for term, weight in heapq.nlargest(QUERY_TERMS, selective, key=itemgetter(1)):
+            weight *= self._idf(term)
+            slots, frequencies = self._postings[term]
+            for slot, frequency in zip(slots, frequencies):
+                dots[slot] = dots.get(slot, 0.0) + weight * frequency
+        ids, levels, norms = self._ids, self._levels, self._norms
+        scores = (
+            (ids[slot], dot / (query_norm * norms[slot]) * level_weight(levels[slot], target))
+            for slot, dot in dots.items()
+            if ids[slot] and ids[slot] != exclude
+        )
+        return heapq.nlargest(limit, scores, key=lambda item: (item[1], -item[0]))
+
+    def similar(self, course_id, limit=DEFAULT_LIMIT):
+        """Courses related to `course_id`, or None if it isn't indexed."""
+        with self._lock:
+            self._load_locked()
+            slot = self._slots.get(course_id)
+            if slot is None:
+                return None
+            terms, frequencies = self._documents[slot]
+            return self._rank(terms, frequencies, limit, self._levels[slot], exclude=course_id)
+
+    def search(self, text, limit=DEFAULT_LIMIT, level=None):
+        """Courses related to a free text, e.g. project descriptions."""
+        with self._lock:
+            self._load_locked()
+            terms, frequencies = self._vector(Counter(tokenize(text)))
+            return self._rank(terms, frequencies, limit, level)
+
+
+index = CourseTextIndex()
+
+bus.subscribe(NAMESPACE, index.clear)
+
+
+def for_user(user, limit=DEFAULT_LIMIT, level=None):
+    """Courses related to the descriptions of the projects `user` is assigned to."""
+    projects = Assignment.objects.filter(user=user, project__deletion_pending=False)
+    text = "\n".join(
+        f"{name}\n{description}" for name, description in projects.values_list('project__name', 'project__description')
+    )
+    if not text:
+        return []
+    return index.search(text, limit, level)
@@ -1,15 +1,54 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.conf import global_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.core.cache import cache
 from core.models import (
     Project, Category, Assignment, Application, UserProfile,
-    Course, ProgrammingLanguage
+    Course, ProgrammingLanguage, CacheVersion, DeletionTask, Job, OutboxMessage, AnalyticsRollup,
+    NeighbourUpdate, ProjectBand, ProjectNeighbour, ProjectSignature, Dataset, DatasetBlob, DatasetProfile,
+    DatasetQuota, Challenge, LeaderboardEntry, Submission, CourseEnrollment, CourseSeats,
 )
 from core.forms import (
     UserRegisterForm, ProjectForm, CourseForm,
-    ChangePasswordForm, ChangeEmailForm, ChangeUsernameForm
+    ChangePasswordForm, ChangeEmailForm, ChangeUsernameForm,
+    ReferenceDataMultipleChoiceField
 )
+from core.invalidation import DatabaseGenerationStore, InvalidationBus, MmapGenerationStore, bus
+from core.refdata import refdata
+from core import (
+    analytics, assignments, autocomplete, bitmaps, caching, catalog, challenges, datasets, deletion, duplicates, enrollments, exports,
+    facets, jobs, metrics, notifications, profiling, recommendations, similar_courses, user_import, warmup,
+)
+from core.views import DESCRIPTION_EXCERPT_LENGTH, MANAGE_USERS_PAGE_SIZE
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from core.admin import EstimatedCountPaginator
+from core.assignments import bulk_assign
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from datetime import datetime, timedelta
+from django.contrib.auth.tokens import default_token_generator
+from unittest import mock, skipUnless
+from io import StringIO
+import contextlib
+import csv
+import hashlib
 import json
+import math
+import multiprocessing
+import os
+import smtplib
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
 
 
 # ========================
@@ -345,6 +384,167 @@ class ChangeUsernameFormTest(TestCase):
         self.assertFalse(form.is_valid())
 
 
+class ReferenceDataCacheTest(TestCase):
+    def setUp(self):
+        refdata.clear()
+        self.lang = ProgrammingLanguage.objects.create(name="Java")
+        self.category = Category.objects.create(name="Web Development")
+
+    def test_forms_validate_without_queries(self):
+        """Test cached choices replace the lookup-table queries"""
+        refdata.all(ProgrammingLanguage)
+        # Only the unique course name check reaches the database
+        with self.assertNumQueries(1):
+            form = CourseForm(data={
+                'name': 'Java Programming', 'description': 'Learn Java',
+                'level': 2, 'programming_languages': [self.lang.id],
+            })
+            self.assertTrue(form.is_valid())
+            form.as_p()
+        self.assertEqual(form.cleaned_data['programming_languages'], [self.lang])
+
+    def test_invalid_choice_rejected(self):
+        """Test unknown and malformed ids are rejected"""
+        for value in ([999], ['abc']):
+            form = ProjectForm(data={'name': 'P', 'description': 'D', 'categories': value})
+            self.assertFalse(form.is_valid())
+            self.assertIn('categories', form.errors)
+
+    def test_form_saves_m2m_from_cache(self):
+        """Test cached instances are saved as M2M relations"""
+        form = ProjectForm(data={'name': 'P', 'description': 'D', 'categories': [self.category.id]})
+        self.assertTrue(form.is_valid())
+        project = form.save()
+        self.assertEqual(list(project.categories.all()), [self.category])
+
+    def test_local_write_invalidates(self):
+        """Test saving a lookup row refreshes this process's copy"""
+        refdata.all(Category)
+        Category.objects.create(name="Robotics")
+        self.assertIn("Robotics", [c.name for c in refdata.all(Category)])
+
+    def test_other_worker_write_detected(self):
+        """Test a generation published by another worker drops the copy"""
+        bus.check()
+        refdata.all(Category)
+        # Simulate another worker: no signals here, only the generation moves
+        Category.objects.bulk_create([Category(name="Robotics")])
+        DatabaseGenerationStore().bump('refdata')
+        self.assertNotIn("Robotics", [c.name for c in refdata.all(Category)])
+        with self.assertNumQueries(1):
+            self.assertIn('refdata', bus.check())
+        self.assertIn("Robotics", [c.name for c in refdata.all(Category)])
+
+    def test_admin_uses_cached_field(self):
+        """Test the project admin renders categories from the cache"""
+        from django.contrib import admin
+        from django.test import RequestFactory
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser(username="root", password="test123")
+        form_class = admin.site._registry[Project].get_form(request)
+        self.assertIsInstance(form_class.base_fields['categories'], ReferenceDataMultipleChoiceField)
+
+
+def _bus_worker(path, ready, results):
+    """Worker process: wait until a published generation is observed."""
+    worker_bus = InvalidationBus(MmapGenerationStore(path))
+    dropped = []
+    worker_bus.subscribe('refdata', lambda: dropped.append(True))
+    worker_bus.check()
+    ready.put(os.getpid())
+    deadline = time.monotonic() + 10
+    while not dropped and time.monotonic() < deadline:
+        time.sleep(0.005)
+        worker_bus.check()
+    results.put(worker_bus.generation('refdata') if dropped else None)
+
+
+class InvalidationBusTest(TestCase):
+    def setUp(self):
+        self.worker_a = InvalidationBus(DatabaseGenerationStore())
+        self.worker_b = InvalidationBus(DatabaseGenerationStore())
+        self.dropped = {'a': 0, 'b': 0}
+        self.worker_a.subscribe('ns', lambda: self.dropped.__setitem__('a', self.dropped['a'] + 1))
+        self.worker_b.subscribe('ns', lambda: self.dropped.__setitem__('b', self.dropped['b'] + 1))
+        self.worker_a.check()
+        self.worker_b.check()
+
+    def test_publish_bumps_generation_on_commit(self):
+        """Test the generation row is written only once the transaction commits"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.worker_a.publish('ns')
+        self.assertFalse(CacheVersion.objects.filter(namespace='ns').exists())
+        self.assertEqual(self.dropped['a'], 1)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(CacheVersion.objects.filter(namespace='ns').exists())
+
+    def test_other_worker_converges(self):
+        """Test another worker drops its cache after the write commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.worker_a.publish('ns')
+        self.assertEqual(self.worker_b.check(), ['ns'])
+        self.assertEqual(self.dropped['b'], 1)
+        # Nothing moved since: the next check is a no-op on both workers
+        self.assertEqual(self.worker_a.check(), [])
+        self.assertEqual(self.worker_b.check(), [])
+
+    def test_in_place_publish_keeps_other_workers_change(self):
+        """Test a local=False publish still drops the cache when another worker published first"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.worker_a.publish('ns')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.worker_b.publish('ns', local=False)
+        self.assertEqual(self.dropped['b'], 1)
+        # Its own bump isn't reported again
+        self.assertEqual(self.worker_b.check(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.worker_b.publish('ns', local=False)
+        self.assertEqual(self.dropped['b'], 1)
+
+    def test_rolled_back_write_not_published(self):
+        """Test a rolled back write never reaches the other workers"""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.worker_a.publish('ns')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.worker_b.check(), [])
+
+    def test_mmap_store_counts_generations(self):
+        """Test the mmap store keeps a counter per namespace"""
+        with tempfile.TemporaryDirectory() as directory:
+            store = MmapGenerationStore(os.path.join(directory, 'generations'))
+            self.assertEqual(store.read(['ns']), {'ns': 0})
+            store.bump('ns')
+            self.assertEqual(MmapGenerationStore(store.path).read(['ns']), {'ns': 1})
+            store.close()
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), "requires fork")
+    def test_worker_processes_converge(self):
+        """Test several worker processes converge on a published generation"""
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'generations')
+            publisher = InvalidationBus(MmapGenerationStore(path))
+            ready, results = context.Queue(), context.Queue()
+            workers = [context.Process(target=_bus_worker, args=(path, ready, results)) for _ in range(3)]
+            for worker in workers:
+                worker.start()
+            for _ in workers:
+                ready.get(timeout=10)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                publisher.publish('refdata')
+
+            seen = [results.get(timeout=15) for _ in workers]
+            for worker in workers:
+                worker.join(timeout=5)
+            self.assertEqual(seen, [publisher.store.get('refdata')] * len(workers))
+
+
 # ========================
 # VIEW TESTS
 # ========================
@@ -451,6 +651,8 @@ class ProjectViewsTest(TestCase):
         """Test staff can delete project"""
         self.client.login(username='staff1', password='test123')
         response = self.client.post(reverse('core:delete_project', args=[self.project.id]))
+        self.assertEqual(Project.objects.visible().filter(id=self.project.id).count(), 0)
+        deletion.process_pending()
         self.assertEqual(Project.objects.filter(id=self.project.id).count(), 0)
 
 
@@ -553,6 +755,203 @@ class CourseViewsTest(TestCase):
         self.assertEqual(Course.objects.filter(id=self.course.id).count(), 0)
 
 
+class DescriptionExcerptTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="user1", password="test123")
+        self.long_description = "word " * 200
+        self.project = Project.objects.create(name="Long Project", description=self.long_description)
+        self.course = Course.objects.create(name="Long Course", description=self.long_description, level=2)
+        Course.objects.create(name="Short Course", description="Short", level=1)
+        self.client.login(username='user1', password='test123')
+
+    def test_project_list_returns_excerpt(self):
+        """Test project list ships a bounded excerpt"""
+        response = self.client.get(reverse('core:project_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        project = json.loads(response.content)['projects'][0]
+        self.assertTrue(project['description_truncated'])
+        self.assertLessEqual(len(project['description']), DESCRIPTION_EXCERPT_LENGTH + 1)
+
+    def test_courses_list_returns_excerpt(self):
+        """Test courses list only truncates long descriptions"""
+        response = self.client.get(reverse('core:courses_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        courses = {c['name']: c for c in json.loads(response.content)['courses']}
+        self.assertTrue(courses['Long Course']['description_truncated'])
+        self.assertFalse(courses['Short Course']['description_truncated'])
+        self.assertEqual(courses['Short Course']['description'], "Short")
+
+    def test_project_detail_returns_full_description(self):
+        """Test project detail endpoint returns the full record"""
+        response = self.client.get(reverse('core:project_detail', args=[self.project.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['description'], self.long_description)
+
+    def test_course_detail_returns_full_description(self):
+        """Test course detail endpoint returns the full record"""
+        response = self.client.get(reverse('core:course_detail', args=[self.course.id]))
+        data = json.loads(response.content)
+        self.assertEqual(data['description'], self.long_description)
+        self.assertEqual(data['level_display'], 'Elementary')
+
+    def test_detail_requires_login(self):
+        """Test detail endpoints require login"""
+        self.client.logout()
+        response = self.client.get(reverse('core:course_detail', args=[self.course.id]))
+        self.assertEqual(response.status_code, 302)
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.stats.reset()
+        self.client = Client()
+        self.user = User.objects.create_user(username="user1", password="test123")
+        self.staff = User.objects.create_user(username="staff1", password="test123", is_staff=True)
+        self.lang = ProgrammingLanguage.objects.create(name="Python")
+        self.course = Course.objects.create(name="Python Basics", description="Learn Python", level=1)
+        self.project = Project.objects.create(name="AI Project", description="Test AI")
+        self.client.login(username='user1', password='test123')
+
+    def get_courses(self, **params):
+        response = self.client.get(reverse('core:courses_list'), params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return json.loads(response.content)['courses']
+
+    def get_projects(self):
+        response = self.client.get(reverse('core:project_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return json.loads(response.content)['projects']
+
+    def test_courses_list_is_cached(self):
+        """Test repeated course list requests are served from cache"""
+        self.get_courses()
+        self.get_courses()
+        counts = caching.stats.snapshot()['namespaces']['courses_list']
+        self.assertEqual(counts, {'hits': 1, 'misses': 1})
+
+    def test_cache_keyed_by_filters(self):
+        """Test different filter sets are cached separately"""
+        self.get_courses()
+        self.assertEqual(self.get_courses(level=3), [])
+        self.assertEqual(len(self.get_courses(level=1)), 1)
+
+    def test_save_invalidates_courses(self):
+        """Test creating a course invalidates the cached list"""
+        self.get_courses()
+        Course.objects.create(name="Rust", description="Systems", level=5)
+        self.assertEqual(len(self.get_courses()), 2)
+
+    def test_m2m_change_invalidates_courses(self):
+        """Test changing course languages invalidates the cached list"""
+        self.get_courses()
+        self.course.programming_languages.add(self.lang)
+        self.assertEqual(self.get_courses()[0]['programming_languages'][0]['name'], "Python")
+
+    def test_user_state_not_shared_through_cache(self):
+        """Test per-user fields are computed outside the cached payload"""
+        self.assertTrue(self.get_projects()[0]['can_apply'])
+        Application.objects.create(user=self.user, project=self.project)
+        project = self.get_projects()[0]
+        self.assertFalse(project['can_apply'])
+        self.assertEqual(project['user_status'], 'pending')
+
+    def test_pending_applications_only_for_staff(self):
+        """Test staff and users get separately cached payloads"""
+        Application.objects.create(user=self.user, project=self.project)
+        self.assertEqual(self.get_projects()[0]['pending_applications'], [])
+        self.client.login(username='staff1', password='test123')
+        self.assertEqual(len(self.get_projects()[0]['pending_applications']), 1)
+
+    def test_login_does_not_invalidate_projects(self):
+        """Test updating last_login keeps cached project payloads"""
+        versions = caching.tag_versions([caching.PROJECTS_TAG])
+        self.client.login(username='staff1', password='test123')
+        self.assertEqual(caching.tag_versions([caching.PROJECTS_TAG]), versions)
+
+    def test_category_fragment_invalidated(self):
+        """Test the category filter fragment picks up new categories"""
+        self.client.get(reverse('core:project_list'))
+        Category.objects.create(name="Robotics")
+        response = self.client.get(reverse('core:project_list'))
+        self.assertContains(response, "Robotics")
+
+    def test_cache_stats_requires_staff(self):
+        """Test cache stats endpoint is staff only"""
+        response = self.client.get(reverse('core:cache_stats'))
+        self.assertEqual(response.status_code, 302)
+        self.client.login(username='staff1', password='test123')
+        response = self.client.get(reverse('core:cache_stats'))
+        self.assertIn('hit_rate', json.loads(response.content))
+
+    def test_file_based_backend(self):
+        """Test tag invalidation with the file-based cache backend"""
+        with tempfile.TemporaryDirectory() as location:
+            with self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                compute = lambda: ['value']
+                caching.get_or_set('test', ['a'], ['tag'], compute)
+                self.assertEqual(caching.get_or_set('test', ['a'], ['tag'], lambda: ['other']), ['value'])
+                caching.invalidate_tags('tag')
+                self.assertEqual(caching.get_or_set('test', ['a'], ['tag'], lambda: ['other']), ['other'])
+
+
+class WarmupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.stats.reset()
+        self.client = Client()
+        self.user = User.objects.create_user(username="user1", password="test123")
+        Course.objects.create(name="Python Basics", description="Learn Python", level=1)
+        self.addCleanup(warmup.state.finish)
+
+    def test_ready_without_startup_warmup(self):
+        """Test workers that don't warm up on startup are ready at once"""
+        response = self.client.get(reverse('core:ready'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CORE_WARMUP_ON_STARTUP=True)
+    def test_ready_gate(self):
+        """Test /ready answers 503 until warmup has finished"""
+        warmup.state.start()
+        self.assertEqual(self.client.get(reverse('core:ready')).status_code, 503)
+        warmup.warm_caches()
+        response = self.client.get(reverse('core:ready'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(json.loads(response.content)['steps']), {'templates', 'reference_data', 'lists', 'indexes'})
+
+    def test_warmup_primes_lists(self):
+        """Test the first list request after warmup is a cache hit"""
+        warmup.warm_caches()
+        caching.stats.reset()
+        self.client.login(username='user1', password='test123')
+        self.client.get(reverse('core:courses_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.client.get(reverse('core:project_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(caching.stats.snapshot()['misses'], 0)
+
+    def test_warm_caches_command(self):
+        """Test the warm_caches management command primes a shared cache"""
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+            }}):
+                call_command('warm_caches', stdout=out)
+        self.assertIn("Caches warmed.", out.getvalue())
+        self.assertNotIn("templates", out.getvalue())
+
+    def test_warm_caches_command_refuses_local_cache(self):
+        """Test the command won't pretend to warm a process-local cache"""
+        with self.assertRaisesMessage(CommandError, "local to each process"):
+            call_command('warm_caches', stdout=StringIO())
+
+    def test_index_columns_cover_composite_indexes(self):
+        """Test index warming walks Meta.indexes and unique constraints too"""
+        columns = warmup.index_columns(Application)
+        self.assertIn(('project_id', 'status', 'created_at'), columns)
+        self.assertIn(('user_id', 'project_id'), columns)
+        self.assertIn(('decided_at',), columns)
+
+
 class ProfileEditViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -648,10 +1047,31 @@ class AdminViewsTest(TestCase):
         response = self.client.get(reverse('core:admin_manage_users'))
         self.assertEqual(response.status_code, 200)
 
+    def test_manage_users_searches_and_pages_on_server(self):
+        """Test the user list is searched and paged by the server instead of shipping every user"""
+        for user in User.objects.all():
+            UserProfile.objects.get_or_create(user=user)
+        UserProfile.objects.bulk_create([
+            UserProfile(user=User.objects.create(username=f"bulk{i:02}", email=f"b{i}@example.com")) for i in range(60)
+        ])
+        self.client.login(username='admin', password='test123')
+        response = self.client.get(reverse('core:admin_manage_users'))
+        self.assertEqual(len(response.context['user_profiles']), MANAGE_USERS_PAGE_SIZE)
+        response = self.client.get(reverse('core:admin_manage_users'), {'after': response.context['next_after']})
+        self.assertEqual(len(response.context['user_profiles']), 62 - MANAGE_USERS_PAGE_SIZE)
+        self.assertIsNone(response.context['next_after'])
+
+        response = self.client.get(reverse('core:admin_manage_users'), {'q': "B1"})
+        self.assertEqual(len(response.context['user_profiles']), 11)
+        response = self.client.get(reverse('core:admin_manage_users'), {'user': self.user.id})
+        self.assertEqual([p.user.username for p in response.context['user_profiles']], ["user1"])
+
     def test_delete_user(self):
         """Test admin can delete user"""
         self.client.login(username='admin', password='test123')
         response = self.client.post(reverse('core:delete_user', args=[self.user.id]))
+        self.assertFalse(User.objects.get(id=self.user.id).is_active)
+        deletion.process_pending()
         self.assertEqual(User.objects.filter(id=self.user.id).count(), 0)
 
     def test_change_user_role(self):
@@ -667,6 +1087,2202 @@ class AdminViewsTest(TestCase):
 # URL TESTS
 # ========================
 
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_superuser(username="root", password="test123")
+        self.project = Project.objects.create(name="Project 1", description="Test")
+        self.client.login(username='root', password='test123')
+
+    def create_applications(self, count, start=0):
+        users = User.objects.bulk_create([User(username=f"applicant{i}") for i in range(start, start + count)])
+        return Application.objects.bulk_create([Application(user=u, project=self.project) for u in users])
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:core_application_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Test the application changelist doesn't query per row"""
+        self.create_applications(3)
+        few = self.changelist_queries()
+        self.create_applications(10, start=3)
+        self.assertEqual(self.changelist_queries(), few)
+
+    def test_accept_action(self):
+        """Test bulk accept updates statuses and creates assignments"""
+        applications = self.create_applications(3)
+        Application.objects.filter(id=applications[0].id).update(status='rejected')
+        NeighbourUpdate.objects.all().delete()
+        self.client.post(reverse('admin:core_application_changelist'), {
+            'action': 'accept_applications',
+            '_selected_action': [a.id for a in applications],
+        })
+        self.assertEqual(Application.objects.filter(status='accepted').count(), 2)
+        self.assertEqual(Assignment.objects.filter(project=self.project).count(), 2)
+        # The bulk-created assignments still reach the recommendations
+        self.assertTrue(NeighbourUpdate.objects.filter(project_id=self.project.id).exists())
+
+    def test_reject_action(self):
+        """Test bulk reject updates pending applications"""
+        applications = self.create_applications(2)
+        self.client.post(reverse('admin:core_application_changelist'), {
+            'action': 'reject_applications',
+            '_selected_action': [a.id for a in applications],
+        })
+        self.assertEqual(Application.objects.filter(status='rejected').count(), 2)
+        self.assertEqual(Assignment.objects.count(), 0)
+
+    def test_estimated_count_above_limit(self):
+        """Test large unfiltered changelists use the estimated count"""
+        applications = self.create_applications(5)
+        Application.objects.filter(id=applications[0].id).delete()
+        paginator = EstimatedCountPaginator(Application.objects.order_by('-id'), 50)
+        paginator.EXACT_COUNT_LIMIT = 2
+        self.assertEqual(paginator.count, applications[-1].id)
+        filtered = EstimatedCountPaginator(Application.objects.filter(status='pending').order_by('-id'), 50)
+        filtered.EXACT_COUNT_LIMIT = 2
+        self.assertEqual(filtered.count, 3)
+
+
+class BulkAssignTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user(username="staff1", password="test123", is_staff=True)
+        self.students = User.objects.bulk_create([User(username=f"student{i}") for i in range(5)])
+        self.project_a = Project.objects.create(name="Project A", description="Test")
+        self.project_b = Project.objects.create(name="Project B", description="Test")
+        self.client.login(username='staff1', password='test123')
+
+    def post(self, data):
+        return self.client.post(reverse('core:bulk_assign_users'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_users_times_projects(self):
+        """Test every listed user is assigned to every selected project"""
+        Assignment.objects.create(user=self.students[0], project=self.project_a)
+        response = self.post({
+            'usernames': "\n".join(u.username for u in self.students),
+            'projects': [self.project_a.id, self.project_b.id],
+        })
+        self.assertEqual(json.loads(response.content), {"success": True, "created": 9, "already_existing": 1})
+        self.assertEqual(Assignment.objects.count(), 10)
+
+    def test_csv_upload(self):
+        """Test CSV rows accept project ids and names"""
+        csv_file = SimpleUploadedFile("assign.csv", (
+            "username,project\n"
+            f"student0,{self.project_a.id}\n"
+            "student1,Project B\n"
+        ).encode())
+        response = self.post({'csv_file': csv_file})
+        self.assertEqual(json.loads(response.content)['created'], 2)
+        self.assertTrue(Assignment.objects.filter(user=self.students[1], project=self.project_b).exists())
+
+    def test_csv_short_row_and_bad_encoding_rejected(self):
+        """Test malformed CSV rows are reported with their line instead of failing"""
+        short = SimpleUploadedFile("assign.csv", b"username,project\nstudent0\n")
+        response = self.post({'csv_file': short})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Line 2", response.content.decode())
+
+        latin1 = SimpleUploadedFile("assign.csv", "username,project\nstudent0,Projekt \u0141\n".encode('cp1250'))
+        response = self.post({'csv_file': latin1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Line 2", response.content.decode())
+        self.assertEqual(Assignment.objects.count(), 0)
+
+    def test_unknown_user_rejected(self):
+        """Test unknown usernames reject the whole submission"""
+        response = self.post({'usernames': "student0\nghost", 'projects': [self.project_a.id]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ghost", response.content.decode())
+        self.assertEqual(Assignment.objects.count(), 0)
+
+    def test_inactive_and_pending_users_unknown(self):
+        """Test deactivated users and users waiting for deletion can't be bulk-assigned"""
+        User.objects.filter(pk=self.students[0].pk).update(is_active=False)
+        deletion.schedule_deletion(self.students[1])
+        User.objects.filter(pk=self.students[1].pk).update(is_active=True)
+        response = self.post({'usernames': "student0\nstudent1\nstudent2", 'projects': [self.project_a.id]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("student0, student1", response.content.decode())
+        self.assertEqual(Assignment.objects.count(), 0)
+
+    def test_created_counts_inserted_rows(self):
+        """Test rows assigned concurrently since the lookup aren't counted as created"""
+        Assignment.objects.create(user=self.students[0], project=self.project_a)
+        chunk = [Assignment(user=user, project=self.project_a) for user in self.students[:2]]
+        self.assertEqual(assignments._insert(chunk), 1)
+        self.assertEqual(Assignment.objects.count(), 2)
+
+    def test_queries_independent_of_pair_count(self):
+        """Test validation and writes don't query per pair"""
+        user_ids = [u.id for u in self.students]
+        # Both runs find the recommendations refresh already queued
+        recommendations.mark([self.project_a.id])
+        with CaptureQueriesContext(connection) as few:
+            bulk_assign({(user_ids[0], self.project_a.id)})
+        with CaptureQueriesContext(connection) as many:
+            bulk_assign({(u, p) for u in user_ids for p in (self.project_a.id, self.project_b.id)})
+        self.assertEqual(len(many), len(few))
+
+    def test_requires_staff(self):
+        """Test regular users cannot bulk assign"""
+        User.objects.create_user(username="user1", password="test123")
+        self.client.login(username='user1', password='test123')
+        response = self.client.get(reverse('core:bulk_assign_users'))
+        self.assertEqual(response.status_code, 302)
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        for index in autocomplete.indexes.values():
+            index.clear()
+        self.staff = User.objects.create_user(username="staffuser", email="staff@example.com", password="test123", is_staff=True)
+        self.alpha = Project.objects.create(name="Alpha Compiler", description="Test")
+        self.alps = Project.objects.create(name="alpine Tools", description="Test")
+        Project.objects.create(name="Beta", description="Test")
+
+    def tearDown(self):
+        for index in autocomplete.indexes.values():
+            index.clear()
+
+    def test_prefix_search_is_case_insensitive(self):
+        """Test project prefixes match regardless of case, in key order"""
+        results = autocomplete.indexes['projects'].search('AL')
+        self.assertEqual([r['id'] for r in results], [self.alpha.id, self.alps.id])
+        self.assertEqual(results[0]['label'], "Alpha Compiler")
+
+    def test_search_respects_limit(self):
+        """Test only the first K matches are returned"""
+        results = autocomplete.indexes['projects'].search('al', limit=1)
+        self.assertEqual(len(results), 1)
+
+    def test_user_matches_username_and_email(self):
+        """Test users are found by username or email prefix, once each"""
+        User.objects.create_user(username="zed", email="alice@example.com", password="test123")
+        index = autocomplete.indexes['users']
+        self.assertEqual([r['label'] for r in index.search('ali')], ["zed (alice@example.com)"])
+        self.assertEqual(len(index.search('staff')), 1)
+
+    def test_index_updates_after_commit(self):
+        """Test saves and deletes update a loaded index in place"""
+        index = autocomplete.indexes['projects']
+        index.search('al')
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(name="Alchemy", description="Test")
+        self.assertEqual([r['label'] for r in index.search('alc')], ["Alchemy"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alpha.name = "Omega"
+            self.alpha.save()
+        self.assertEqual([r['label'] for r in index.search('alp')], ["alpine Tools"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alps.delete()
+        self.assertEqual(index.search('alp'), [])
+
+    def test_overflow_uses_database(self):
+        """Test an index over its cap falls back to an istartswith query"""
+        index = autocomplete.ProjectIndex(Project, max_entries=1)
+        results = index.search('al')
+        self.assertTrue(index._overflow)
+        self.assertEqual([r['id'] for r in results], [self.alpha.id, self.alps.id])
+
+    def test_endpoint(self):
+        """Test the autocomplete endpoint returns JSON matches for staff"""
+        self.client.login(username='staffuser', password='test123')
+        response = self.client.get(reverse('core:autocomplete', args=['projects']), {'q': 'alp', 'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        response = self.client.get(reverse('core:autocomplete', args=['courses']), {'q': 'a'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_endpoint_requires_staff(self):
+        """Test regular users cannot query the autocomplete endpoint"""
+        User.objects.create_user(username="user1", password="test123")
+        self.client.login(username='user1', password='test123')
+        response = self.client.get(reverse('core:autocomplete', args=['users']), {'q': 'a'})
+        self.assertEqual(response.status_code, 302)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username="staffuser", password="test123", is_staff=True)
+        self.alice = User.objects.create_user(username="alice", password="test123")
+        self.bob = User.objects.create_user(username="bob", password="test123")
+        self.ml = Category.objects.create(name="ML")
+        self.web = Category.objects.create(name="Web")
+        self.project = Project.objects.create(name="Alpha", description="Test")
+        self.project.categories.add(self.ml, self.web)
+        self.other = Project.objects.create(name="Beta", description="Test")
+        Application.objects.create(user=self.alice, project=self.project, status='pending')
+        Application.objects.create(user=self.bob, project=self.other, status='accepted')
+        Assignment.objects.create(user=self.bob, project=self.other)
+
+    def read(self, kind, fmt='csv', **filters):
+        return ''.join(exports.export(kind, fmt, **filters))
+
+    def test_project_csv_joins_categories(self):
+        """Test the projects export lists category names in one column"""
+        rows = list(csv.reader(StringIO(self.read('projects'))))
+        self.assertEqual(rows[0], ['id', 'name', 'created_at', 'categories'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(sorted(rows[1][3].split('; ')), ['ML', 'Web'])
+        self.assertEqual(rows[2][3], '')
+
+    def test_application_ndjson_with_filters(self):
+        """Test applications stream as NDJSON and filter by status and project"""
+        lines = self.read('applications', 'ndjson', status='pending').splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record['user_username'], 'alice')
+        self.assertEqual(record['project_name'], 'Alpha')
+        self.assertEqual(self.read('applications', 'ndjson', project=str(self.other.id)).count('\n'), 1)
+
+    def test_pending_deletions_left_out(self):
+        """Test rows of projects or users waiting for deletion are exported by none of the exports"""
+        deletion.schedule_deletion(self.project)
+        deletion.schedule_deletion(self.bob)
+        self.assertEqual(self.read('projects', 'ndjson').count('\n'), 1)
+        self.assertEqual(self.read('applications', 'ndjson'), '')
+        self.assertEqual(self.read('assignments', 'ndjson'), '')
+
+    def test_date_range(self):
+        """Test since/until bound the creation date, until covering its whole day"""
+        today = timezone.localdate().isoformat()
+        self.assertEqual(self.read('applications', 'ndjson', since=today, until=today).count('\n'), 2)
+        self.assertEqual(self.read('applications', 'ndjson', until='2000-01-01'), '')
+
+    def test_invalid_filters(self):
+        """Test unsupported or malformed filters are rejected"""
+        for kwargs in ({'status': 'pending'}, {'since': '2024-01-01'}):
+            with self.assertRaises(exports.ExportError):
+                exports.export('assignments', **kwargs)
+        with self.assertRaises(exports.ExportError):
+            exports.export('applications', since='yesterday')
+
+    def test_single_query(self):
+        """Test the export runs one query whatever the number of rows"""
+        with CaptureQueriesContext(connection) as queries:
+            self.read('assignments', chunk_size=1)
+        self.assertEqual(len(queries), 1)
+
+    def test_endpoint_streams(self):
+        """Test staff download a streamed attachment"""
+        self.client.login(username='staffuser', password='test123')
+        response = self.client.get(reverse('core:export_data', args=['assignments']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="assignments.csv"', response['Content-Disposition'])
+        self.assertIn('bob', b''.join(response.streaming_content).decode())
+
+        response = self.client.get(reverse('core:export_data', args=['assignments']), {'status': 'pending'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_requires_staff(self):
+        """Test regular users cannot export"""
+        self.client.login(username='alice', password='test123')
+        response = self.client.get(reverse('core:export_data', args=['projects']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command(self):
+        """Test the export_data command writes the export to stdout"""
+        out = StringIO()
+        call_command('export_data', 'applications', '--format', 'ndjson', '--status', 'accepted', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['user_username'], 'bob')
+
+
+class CatalogImportTest(TestCase):
+    def setUp(self):
+        self.catalog = {
+            'categories': ["ML", "Web"],
+            'languages': ["Python", "Rust"],
+            'courses': [
+                {'name': "Python Basics", 'description': "Learn Python", 'level': 1, 'languages': ["Python"]},
+                {'name': "Systems", 'description': "Low level", 'level': 4, 'languages': ["Rust", "Python"]},
+            ],
+        }
+
+    def test_import_creates_rows_and_links(self):
+        """Test a first import creates every row and course language"""
+        result = catalog.import_catalog(self.catalog)
+        self.assertEqual(result.counts['courses'], {'created': 2, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(result.counts['categories']['created'], 2)
+        systems = Course.objects.get(name="Systems")
+        self.assertEqual(sorted(systems.programming_languages.values_list('name', flat=True)), ["Python", "Rust"])
+
+    def test_reimport_is_unchanged(self):
+        """Test importing the same catalog twice only reads"""
+        catalog.import_catalog(self.catalog)
+        with CaptureQueriesContext(connection) as queries:
+            result = catalog.import_catalog(self.catalog)
+        self.assertEqual(result.counts['courses'], {'created': 0, 'updated': 0, 'unchanged': 2})
+        self.assertTrue(all(q['sql'].startswith('SELECT') for q in queries.captured_queries))
+
+    def test_update_upserts_and_relinks(self):
+        """Test changed fields are upserted and language sets replaced"""
+        catalog.import_catalog(self.catalog)
+        self.catalog['courses'][0]['description'] = "Learn Python properly"
+        self.catalog['courses'][1]['languages'] = ["Rust"]
+        versions = caching.tag_versions([caching.COURSES_TAG])
+        result = catalog.import_catalog(self.catalog)
+        self.assertEqual(result.counts['courses'], {'created': 0, 'updated': 2, 'unchanged': 0})
+        self.assertEqual(Course.objects.get(name="Python Basics").description, "Learn Python properly")
+        self.assertEqual(list(Course.objects.get(name="Systems").programming_languages.values_list('name', flat=True)), ["Rust"])
+        self.assertNotEqual(caching.tag_versions([caching.COURSES_TAG]), versions)
+
+    def test_dry_run_writes_nothing(self):
+        """Test a dry run reports the diff without writing"""
+        result = catalog.import_catalog(self.catalog, dry_run=True)
+        self.assertEqual(result.counts['languages']['created'], 2)
+        self.assertFalse(Course.objects.exists())
+        self.assertFalse(ProgrammingLanguage.objects.exists())
+
+    def test_invalid_input(self):
+        """Test unknown languages and bad levels are rejected before any write"""
+        self.catalog['courses'][0]['languages'] = ["Cobol"]
+        with self.assertRaises(catalog.CatalogImportError):
+            catalog.import_catalog(self.catalog)
+        self.catalog['courses'][0]['languages'] = []
+        self.catalog['courses'][1]['level'] = 9
+        with self.assertRaises(catalog.CatalogImportError):
+            catalog.import_catalog(self.catalog)
+        self.assertFalse(Category.objects.exists())
+
+    def test_command_reads_csv_and_json(self):
+        """Test import_catalog reads JSON and CSV files and supports --dry-run"""
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, 'catalog.json')
+            with open(json_path, 'w') as f:
+                json.dump({'languages': ["Python", "Rust"]}, f)
+            csv_path = os.path.join(directory, 'courses.csv')
+            with open(csv_path, 'w', newline='') as f:
+                f.write("name,description,level,languages\nSystems,Low level,4,Rust;Python\n")
+
+            out = StringIO()
+            call_command('import_catalog', json_path, csv_path, '--dry-run', stdout=out)
+            self.assertIn("courses: 1 created", out.getvalue())
+            self.assertFalse(Course.objects.exists())
+
+            call_command('import_catalog', json_path, csv_path, stdout=StringIO())
+        self.assertEqual(Course.objects.get(name="Systems").programming_languages.count(), 2)
+
+    def test_create_courses_is_idempotent(self):
+        """Test the seeding commands can run repeatedly"""
+        call_command('create_categories', stdout=StringIO())
+        call_command('create_courses', stdout=StringIO())
+        courses = Course.objects.count()
+        call_command('create_courses', stdout=StringIO())
+        self.assertEqual(Course.objects.count(), courses)
+        self.assertTrue(Category.objects.exists())
+
+    def test_create_courses_keeps_edits(self):
+        """Test re-seeding leaves edited courses alone unless --update is given"""
+        call_command('create_courses', stdout=StringIO())
+        Course.objects.filter(name="Rust Systems Programming").update(description="Edited", level=3)
+        call_command('create_courses', stdout=StringIO())
+        self.assertEqual(Course.objects.get(name="Rust Systems Programming").description, "Edited")
+        call_command('create_courses', '--update', stdout=StringIO())
+        self.assertEqual(Course.objects.get(name="Rust Systems Programming").level, 5)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTest(TestCase):
+    CSV = (
+        "username,email,role,password\n"
+        "anna,anna@example.com,staff,secret123\n"
+        "boss,boss@example.com,admin,secret123\n"
+        "newbie,newbie@example.com,,\n"
+        "existing,other@example.com,user,secret123\n"
+        "dupemail,TAKEN@example.com,user,secret123\n"
+        "anna,anna2@example.com,user,secret123\n"
+        "bad name!,bad@example.com,user,secret123\n"
+        "someone,some@example.com,owner,secret123\n"
+    )
+
+    def setUp(self):
+        User.objects.create_user(username="existing", email="taken@example.com", password="test123")
+
+    def test_import_in_process(self):
+        """Test rows are created with roles, profiles and duplicates skipped"""
+        report = user_import.import_users(user_import.read_rows(StringIO(self.CSV)), workers=0)
+        self.assertEqual((report.created, report.duplicates, report.invalid), (3, 3, 2))
+        anna = User.objects.get(username="anna")
+        self.assertTrue(anna.is_staff and not anna.is_superuser)
+        self.assertTrue(anna.check_password("secret123"))
+        self.assertTrue(User.objects.get(username="boss").is_superuser)
+        self.assertEqual(UserProfile.objects.filter(user__username__in=["anna", "boss", "newbie"]).count(), 3)
+
+    def test_unusable_password_gets_reset_token(self):
+        """Test users without a password get a valid reset token"""
+        report = user_import.import_users(user_import.read_rows(StringIO(self.CSV)), workers=0)
+        newbie = User.objects.get(username="newbie")
+        self.assertFalse(newbie.has_usable_password())
+        [(username, uid, token)] = report.tokens
+        self.assertEqual(username, "newbie")
+        self.assertTrue(default_token_generator.check_token(newbie, token))
+
+    def test_import_with_process_pool(self):
+        """Test hashing in worker processes yields the same users"""
+        rows = [(n + 2, f"pool{n}", f"pool{n}@example.com", 'user', f"pw{n}") for n in range(45)]
+        report = user_import.import_users(iter(rows), workers=2, chunk_size=20)
+        self.assertEqual(report.created, 45)
+        # The workers start fresh and hash with the project's hashers, not this override
+        with self.settings(PASSWORD_HASHERS=global_settings.PASSWORD_HASHERS):
+            self.assertTrue(User.objects.get(username="pool44").check_password("pw44"))
+
+    def test_command_reports_throughput(self):
+        """Test import_users prints counts and writes reset tokens"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            tokens = os.path.join(directory, 'tokens.csv')
+            with open(path, 'w') as f:
+                f.write(self.CSV)
+            out = StringIO()
+            call_command('import_users', path, '--workers', '0', '--tokens-output', tokens, stdout=out)
+            with open(tokens) as f:
+                self.assertEqual(len(list(csv.reader(f))), 2)
+        self.assertIn("Created 3 user(s), skipped 3 duplicate(s) and 2 invalid row(s)", out.getvalue())
+        self.assertIn("users/s", out.getvalue())
+
+    def test_job_rejects_rows_without_password(self):
+        """Test the import job reports password-less rows instead of locking them out"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            with open(path, 'w') as f:
+                f.write(self.CSV)
+            jobs.enqueue('core.import_users', {'path': path, 'workers': 0})
+            [job] = jobs.run_pending()
+        self.assertEqual((job.result['created'], job.result['invalid']), (2, 3))
+        self.assertIn("no password", str(job.result['errors']))
+        self.assertFalse(User.objects.filter(username="newbie").exists())
+
+
+class BackgroundDeletionTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", password="test123", is_staff=True, is_superuser=True)
+        self.mentor = User.objects.create_user(username="mentor", password="test123", is_staff=True)
+        self.project = Project.objects.create(name="Big Project", description="Test")
+        self.project.categories.add(Category.objects.create(name="ML"))
+        self.project.mentors.add(self.mentor)
+        self.users = [User.objects.create_user(username=f"user{n}", password="test123") for n in range(7)]
+        for user in self.users:
+            Application.objects.create(user=user, project=self.project)
+            Assignment.objects.create(user=user, project=self.project)
+        self.other = Project.objects.create(name="Other", description="Test")
+        Assignment.objects.create(user=self.users[0], project=self.other)
+        # Computes the projects' signatures
+        jobs.run_pending()
+
+    def test_project_hidden_until_deleted(self):
+        """Test a scheduled project disappears from the views at once"""
+        self.client.login(username='admin', password='test123')
+        response = self.client.post(reverse('core:delete_project', args=[self.project.id]), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        task = DeletionTask.objects.get(pk=response.json()['task_id'])
+        self.assertEqual(task.status, 'pending')
+        self.assertTrue(Project.objects.filter(id=self.project.id).exists())
+        response = self.client.get(reverse('core:project_detail', args=[self.project.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_batches_delete_all_dependents(self):
+        """Test dependents are removed in batches of the given size"""
+        task = deletion.schedule_deletion(self.project)
+        self.assertTrue(deletion.claim(task.pk))
+        with CaptureQueriesContext(connection) as queries:
+            deletion.run_task(DeletionTask.objects.get(pk=task.pk), batch_size=3)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'done')
+        # 7 applications + 7 assignments + 1 category link + 1 mentor link + 1 signature + its bands
+        self.assertEqual(task.rows_deleted, 17 + duplicates.BANDS)
+        self.assertFalse(Project.objects.filter(id=self.project.id).exists())
+        self.assertFalse(Application.objects.exists())
+        self.assertEqual(Assignment.objects.count(), 1)
+        self.assertTrue(Category.objects.filter(name="ML").exists())
+        deletes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('DELETE') and 'LIMIT' in q['sql']]
+        self.assertGreaterEqual(len(deletes), 6)
+
+    def test_interrupted_task_resumes(self):
+        """Test a task resumes from its recorded step and skips claimed ones"""
+        task = deletion.schedule_deletion(self.users[0])
+        self.assertFalse(User.objects.get(pk=self.users[0].pk).is_active)
+        steps = deletion.deletion_steps(User)
+        # Pretend a worker died halfway through
+        DeletionTask.objects.filter(pk=task.pk).update(status='running', step=len(steps) - 1)
+        self.assertEqual(deletion.process_pending(), [])
+        DeletionTask.objects.filter(pk=task.pk).update(updated_at=timezone.now() - deletion.STALE_AFTER * 2)
+        [finished] = deletion.process_pending()
+        self.assertEqual(finished.status, 'done')
+        self.assertFalse(User.objects.filter(pk=self.users[0].pk).exists())
+        self.assertFalse(Assignment.objects.filter(user_id=self.users[0].pk).exists())
+
+    def test_pending_user_hidden_from_manage_users(self):
+        """Test users being deleted are left out of the user list"""
+        for user in self.users:
+            UserProfile.objects.create(user=user)
+        deletion.schedule_deletion(self.users[1])
+        self.client.login(username='admin', password='test123')
+        response = self.client.get(reverse('core:admin_manage_users'))
+        usernames = [profile.user.username for profile in response.context['user_profiles']]
+        self.assertNotIn("user1", usernames)
+        self.assertIn("user2", usernames)
+
+    def test_hidden_relations_deleted_in_batches(self):
+        """Test related_name='+' dependents are emptied by the batched steps"""
+        ProjectNeighbour.objects.create(project=self.other, neighbour=self.project, score=0.5)
+        tables = [str(step) for step in deletion.deletion_steps(Project)]
+        self.assertIn('core_projectneighbour.neighbour_id', tables)
+        self.assertIn('core_projectband.project_id', tables)
+        task = deletion.schedule_deletion(self.project)
+        self.assertTrue(deletion.claim(task.pk))
+        deletion.run_task(DeletionTask.objects.get(pk=task.pk))
+        self.assertFalse(ProjectNeighbour.objects.exists())
+
+    def test_pending_user_left_out_of_projects(self):
+        """Test users being deleted aren't listed, assignable or in the mentor inbox"""
+        deletion.schedule_deletion(self.users[1])
+        self.project.mentors.add(self.admin)
+        self.client.login(username='admin', password='test123')
+        response = self.client.get(reverse('core:project_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        [row] = [p for p in response.json()['projects'] if p['id'] == self.project.id]
+        self.assertNotIn("user1", [a['username'] for a in row['participants']])
+        self.assertNotIn("user1", [a['username'] for a in row['pending_applications']])
+        self.assertIn("user2", [a['username'] for a in row['participants']])
+        response = self.client.get(reverse('core:mentor_inbox'), {'format': 'json'})
+        self.assertNotIn("user1", [app['user']['username'] for app in response.json()['applications']])
+        response = self.client.post(reverse('core:assign_user_to_project', args=[self.users[1].id]), {'project_id': self.other.id})
+        self.assertEqual(response.status_code, 404)
+
+        deletion.schedule_deletion(self.mentor)
+        response = self.client.get(reverse('core:project_detail', args=[self.project.id]))
+        self.assertEqual([m['username'] for m in response.json()['mentors']], ["admin"])
+
+    def test_command(self):
+        """Test process_deletions runs the pending tasks"""
+        deletion.schedule_deletion(self.project)
+        out = StringIO()
+        call_command('process_deletions', stdout=out)
+        self.assertIn(f"Deleted core.project Big Project: {17 + duplicates.BANDS} dependent row(s)", out.getvalue())
+
+
+_flaky_calls = []
+
+
+@jobs.register('tests.flaky')
+def _flaky_job(fail_times=0):
+    _flaky_calls.append(fail_times)
+    if len(_flaky_calls) <= fail_times:
+        raise RuntimeError("flaky failure")
+    return {'calls': len(_flaky_calls)}
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        _flaky_calls.clear()
+        self.staff = User.objects.create_user(username="staffuser", password="test123", is_staff=True)
+
+    def test_enqueue_and_run(self):
+        """Test a queued job runs and stores its result"""
+        job = jobs.enqueue('tests.flaky')
+        [done] = jobs.run_pending()
+        self.assertEqual(done.pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), ('succeeded', 1, {'calls': 1}))
+
+    def test_unknown_job(self):
+        """Test enqueueing an unregistered job fails straight away"""
+        with self.assertRaises(jobs.UnknownJobError):
+            jobs.enqueue('tests.missing')
+
+    def test_retry_with_backoff(self):
+        """Test failures are retried later, then marked failed"""
+        job = jobs.enqueue('tests.flaky', {'fail_times': 5}, max_attempts=2)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_after, timezone.now() + jobs.retry_delay(1) - timedelta(seconds=5))
+        self.assertIn("flaky failure", job.error_summary)
+        # Not due yet
+        self.assertEqual(jobs.run_pending(), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(jobs.retry_delay(2), 2 * jobs.retry_delay(1))
+
+    def test_claim_is_exclusive(self):
+        """Test a job is claimed by one worker, and again once its lock is stale"""
+        jobs.enqueue('tests.flaky')
+        self.assertIsNotNone(jobs.claim('worker-a'))
+        self.assertIsNone(jobs.claim('worker-b'))
+        Job.objects.update(locked_at=timezone.now() - jobs.JOB_TIMEOUT * 2)
+        job = jobs.claim('worker-b')
+        self.assertEqual((job.locked_by, job.attempts), ('worker-b', 2))
+
+    def test_stale_job_without_attempts_left_fails(self):
+        """Test a job lost on its last attempt is marked failed instead of claimed again"""
+        job = jobs.enqueue('tests.flaky', max_attempts=2)
+        jobs.claim('worker-a')
+        Job.objects.update(locked_at=timezone.now() - jobs.JOB_TIMEOUT * 2)
+        jobs.claim('worker-b')
+        Job.objects.update(locked_at=timezone.now() - jobs.JOB_TIMEOUT * 2)
+        self.assertIsNone(jobs.claim('worker-c'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('failed', 2, ''))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_lost_job_outcome_discarded(self):
+        """Test a worker whose job was claimed again doesn't overwrite the new run"""
+        jobs.enqueue('tests.flaky')
+        job = jobs.claim('worker-a')
+        Job.objects.update(locked_at=timezone.now() - jobs.JOB_TIMEOUT * 2)
+        self.assertIsNotNone(jobs.claim('worker-b'))
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.result), ('running', 'worker-b', None))
+
+    def test_deletion_runs_as_job(self):
+        """Test scheduled deletions are carried out by the queue"""
+        project = Project.objects.create(name="Doomed", description="Test")
+        jobs.run_pending()
+        deletion.schedule_deletion(project)
+        [job] = jobs.run_pending()
+        self.assertEqual(job.name, 'core.delete')
+        self.assertEqual(job.status, 'succeeded')
+        self.assertFalse(Project.objects.filter(pk=project.pk).exists())
+
+    def test_send_email_job(self):
+        """Test the email job goes through the configured backend"""
+        jobs.enqueue('core.send_email', {'subject': "Hi", 'message': "Body", 'recipient_list': ["a@example.com"]})
+        call_command('run_workers', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Hi")
+
+    def test_status_page_and_retry(self):
+        """Test staff see job counts and can retry failed jobs"""
+        job = jobs.enqueue('tests.flaky', {'fail_times': 5}, max_attempts=1)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        self.client.login(username='staffuser', password='test123')
+        response = self.client.get(reverse('core:job_status'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['counts']['failed'], 1)
+        self.assertEqual(response.json()['jobs'][0]['error'], "RuntimeError: flaky failure")
+        response = self.client.get(reverse('core:job_status'))
+        self.assertContains(response, "Retry")
+
+        self.client.post(reverse('core:retry_job', args=[job.pk]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 0))
+
+    def test_status_page_requires_staff(self):
+        """Test regular users cannot see the job page"""
+        User.objects.create_user(username="user1", password="test123")
+        self.client.login(username='user1', password='test123')
+        response = self.client.get(reverse('core:job_status'))
+        self.assertEqual(response.status_code, 302)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPException("mail server down")
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages, counting connections"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost test SMTP")
+        lines, in_data = [], False
+        for line in self.rfile:
+            if in_data:
+                if line.rstrip(b"\r\n") == b".":
+                    self.server.messages.append(b"".join(lines).decode())
+                    lines, in_data = [], False
+                    self.reply("250 OK")
+                else:
+                    lines.append(line)
+                continue
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 localhost")
+            elif command == b"DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                break
+            else:
+                self.reply("250 OK")
+
+
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username="staff1", password="test123", is_staff=True)
+        self.user = User.objects.create_user(username="user1", email="user1@example.com", password="test123")
+        self.project_a = Project.objects.create(name="Alpha", description="Test")
+        self.project_b = Project.objects.create(name="Beta", description="Test")
+        self.app_a = Application.objects.create(user=self.user, project=self.project_a)
+        self.app_b = Application.objects.create(user=self.user, project=self.project_b)
+        self.client.login(username='staff1', password='test123')
+
+    def decide_both(self):
+        self.client.post(reverse('core:accept_application', args=[self.app_a.id]))
+        self.client.post(reverse('core:reject_application', args=[self.app_b.id]))
+
+    def test_decisions_write_outbox_rows(self):
+        """Test each decision writes an outbox row and one dispatch job is queued"""
+        self.decide_both()
+        events = list(OutboxMessage.objects.order_by('id').values_list('event', flat=True))
+        self.assertEqual(events, ['application_accepted', 'application_rejected'])
+        self.assertEqual(Job.objects.filter(name=notifications.DISPATCH_JOB, status='queued').count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_dispatch_coalesces_per_recipient(self):
+        """Test one email per recipient covers all of their events"""
+        self.decide_both()
+        other = User.objects.create_user(username="user2", email="user2@example.com", password="test123")
+        notifications.notify_many([(other.id, 'application_accepted', {'project_name': "Gamma"})])
+        Job.objects.update(run_after=timezone.now())
+        jobs.run_pending()
+
+        self.assertEqual(len(mail.outbox), 2)
+        email = next(m for m in mail.outbox if m.to == ["user1@example.com"])
+        self.assertEqual(email.subject, "Updates on 2 of your project applications")
+        self.assertIn('"Alpha" was accepted', email.body)
+        self.assertIn('"Beta" was not accepted', email.body)
+        self.assertFalse(OutboxMessage.objects.exclude(status='sent').exists())
+
+    def test_missing_email_is_skipped(self):
+        """Test users without an email address are skipped, not retried"""
+        User.objects.filter(pk=self.user.pk).update(email='')
+        self.decide_both()
+        counts = notifications.dispatch()
+        self.assertEqual((counts['skipped'], counts['emails']), (2, 0))
+
+    @override_settings(EMAIL_BACKEND='core.tests.FailingEmailBackend')
+    def test_failures_are_retried_then_failed(self):
+        """Test failed sends keep their rows for a later retry, up to MAX_ATTEMPTS"""
+        self.decide_both()
+        with self.assertLogs('core.notifications', 'ERROR'):
+            counts = notifications.dispatch()
+        self.assertEqual(counts['retrying'], 2)
+        self.assertEqual(notifications.claim_batch(), [])
+        # Queued even though the decisions' own dispatch is still waiting
+        retry = Job.objects.filter(name=notifications.DISPATCH_JOB).latest('run_after')
+        self.assertGreater(retry.run_after, timezone.now() + notifications.CLAIM_TIMEOUT - timedelta(seconds=5))
+
+        OutboxMessage.objects.update(claimed_at=timezone.now() - notifications.CLAIM_TIMEOUT * 2)
+        OutboxMessage.objects.update(attempts=notifications.MAX_ATTEMPTS - 1)
+        with self.assertLogs('core.notifications', 'ERROR'):
+            counts = notifications.dispatch()
+        self.assertEqual(counts['failed'], 2)
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.console.EmailBackend')
+    def test_console_backend(self):
+        """Test delivery through the console backend"""
+        self.decide_both()
+        out = StringIO()
+        with contextlib.redirect_stdout(out):
+            call_command('send_notifications', stdout=StringIO())
+        self.assertIn("Subject: Updates on 2 of your project applications", out.getvalue())
+
+    def test_smtp_server_single_connection(self):
+        """Test a batch goes to a local SMTP server over one connection"""
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPSinkHandler)
+        server.connections, server.messages = 0, []
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        for n in range(3):
+            user = User.objects.create_user(username=f"smtp{n}", email=f"smtp{n}@example.com", password="test123")
+            notifications.notify_many([(user.id, 'application_accepted', {'project_name': "Alpha"})])
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1],
+        ):
+            counts = notifications.dispatch()
+        self.assertEqual(counts['emails'], 3)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 3)
+        self.assertIn("Your application to Alpha was accepted", server.messages[0])
+
+
+class RecommendationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.users = [User.objects.create_user(username=f"user{i}", password="test123") for i in range(5)]
+        ml, web = Category.objects.create(name="ML"), Category.objects.create(name="Web")
+        self.alpha, self.beta, self.gamma, self.delta = [
+            Project.objects.create(name=name, description="Test") for name in ("Alpha", "Beta", "Gamma", "Delta")
+        ]
+        self.alpha.categories.add(ml)
+        self.beta.categories.add(ml)
+        self.gamma.categories.add(ml)
+        self.delta.categories.add(web)
+        for user, project in [(0, self.alpha), (0, self.beta), (1, self.alpha), (1, self.beta), (2, self.alpha)]:
+            Application.objects.create(user=self.users[user], project=project)
+        Assignment.objects.create(user=self.users[2], project=self.gamma)
+        recommendations.refresh(full=True)
+
+    def test_cosine_top_k(self):
+        """Test neighbours are ranked by cosine similarity of the sparse vectors"""
+        vectors = {1: {'a': 1.0, 'b': 1.0}, 2: {'a': 1.0, 'b': 1.0}, 3: {'a': 1.0}, 4: {'c': 1.0}}
+        result = recommendations.neighbours(vectors, [1, 4], k=2)
+        self.assertEqual([pk for pk, _ in result[1]], [2, 3])
+        self.assertAlmostEqual(result[1][0][1], 1.0)
+        self.assertAlmostEqual(result[1][1][1], 1 / math.sqrt(2))
+        self.assertEqual(result[4], [])
+
+    def test_stored_neighbours(self):
+        """Test the job stores each project's most similar projects"""
+        neighbours = list(
+            ProjectNeighbour.objects.filter(project=self.alpha).order_by('-score').values_list('neighbour__name', flat=True)
+        )
+        self.assertEqual(neighbours, ["Beta", "Gamma"])
+        self.assertFalse(ProjectNeighbour.objects.filter(project=self.delta).exists())
+
+    def test_for_user_in_one_query(self):
+        """Test a user's recommendations come from one query and skip their own projects"""
+        Application.objects.create(user=self.users[3], project=self.alpha)
+        with self.assertNumQueries(1):
+            result = recommendations.for_user(self.users[3])
+        self.assertEqual([row['name'] for row in result], ["Beta", "Gamma"])
+        self.assertEqual(recommendations.for_user(self.users[4]), [])
+
+    def test_incremental_refresh(self):
+        """Test changes are marked and only the related projects are recomputed"""
+        self.assertFalse(NeighbourUpdate.objects.exists())
+        Application.objects.create(user=self.users[3], project=self.gamma)
+        Application.objects.create(user=self.users[3], project=self.beta)
+        self.assertEqual(set(NeighbourUpdate.objects.values_list('project_id', flat=True)), {self.gamma.pk, self.beta.pk})
+        self.assertEqual(Job.objects.filter(name=recommendations.REFRESH_JOB, status='queued').count(), 1)
+
+        result = recommendations.refresh()
+        # Delta shares nothing with them
+        self.assertEqual(result['projects'], 3)
+        self.assertFalse(NeighbourUpdate.objects.exists())
+        scores = dict(ProjectNeighbour.objects.filter(project=self.gamma).values_list('neighbour__name', 'score'))
+        # Gamma now shares user3 with Beta, as it shares user2 with Alpha
+        self.assertAlmostEqual(scores["Beta"], scores["Alpha"])
+
+    def test_mark_during_refresh_kept(self):
+        """Test a project marked again while a refresh computes stays marked for the next run"""
+        Application.objects.create(user=self.users[3], project=self.gamma)
+        load_vectors = recommendations.load_vectors
+
+        def load_and_change():
+            vectors = load_vectors()
+            # Another write lands after the vectors were read
+            recommendations.mark([self.gamma.pk, self.delta.pk])
+            return vectors
+
+        with mock.patch.object(recommendations, 'load_vectors', load_and_change):
+            recommendations.refresh()
+        self.assertEqual(set(NeighbourUpdate.objects.values_list('project_id', flat=True)), {self.gamma.pk, self.delta.pk})
+        recommendations.refresh()
+        self.assertFalse(NeighbourUpdate.objects.exists())
+
+    def test_failed_refresh_keeps_marks(self):
+        """Test marks survive a refresh that fails before storing its results"""
+        Application.objects.create(user=self.users[3], project=self.gamma)
+        with mock.patch.object(recommendations, 'neighbours', side_effect=MemoryError):
+            with self.assertRaises(MemoryError):
+                recommendations.refresh()
+        self.assertEqual(list(NeighbourUpdate.objects.values_list('project_id', flat=True)), [self.gamma.pk])
+
+    def test_hidden_projects_dropped(self):
+        """Test a project waiting for deletion leaves every list"""
+        deletion.schedule_deletion(self.beta)
+        recommendations.refresh()
+        self.assertFalse(ProjectNeighbour.objects.filter(Q(project=self.beta) | Q(neighbour=self.beta)).exists())
+
+    def test_view(self):
+        """Test the endpoint returns the current user's recommendations"""
+        self.client.login(username="user2", password="test123")
+        response = self.client.get(reverse('core:recommended_projects'))
+        self.assertEqual([row['name'] for row in response.json()['projects']], ["Beta"])
+
+
+class AnalyticsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user(username="mentor", password="test123", is_staff=True)
+        self.ml = Category.objects.create(name="ML")
+        self.web = Category.objects.create(name="Web")
+        self.vision = Project.objects.create(name="Vision", description="Test", capacity=2)
+        self.vision.categories.add(self.ml)
+        self.vision.mentors.add(self.staff)
+        self.shop = Project.objects.create(name="Shop", description="Test")
+        self.shop.categories.add(self.web)
+        self.users = [User.objects.create_user(username=f"applicant{i}", password="test123") for i in range(4)]
+        # Noon local time, well away from day boundaries
+        self.base = timezone.make_aware(datetime(2026, 3, 10, 12, 0))
+        refdata.clear()
+
+    def apply(self, user, project, created_at, status='pending', decided_at=None):
+        application = Application.objects.create(user=user, project=project)
+        Application.objects.filter(pk=application.pk).update(
+            created_at=created_at, status=status, decided_at=decided_at,
+        )
+        return application
+
+    def test_decision_buckets(self):
+        """Test decision times are binned by upper bound"""
+        self.assertEqual(analytics.decision_buckets([0.5, 1, 1.5, 30, 1000]), [0, 0, 1, 6, 12])
+
+    def test_refresh_and_summary(self):
+        """Test the rollups give daily counts, acceptance rates, percentiles and fill"""
+        day = timedelta(days=1)
+        self.apply(self.users[0], self.vision, self.base, 'accepted', self.base + timedelta(hours=3))
+        self.apply(self.users[1], self.vision, self.base, 'rejected', self.base + timedelta(hours=30))
+        self.apply(self.users[2], self.shop, self.base + day, 'accepted', self.base + day + timedelta(minutes=30))
+        self.apply(self.users[3], self.shop, self.base + day)
+        Assignment.objects.create(user=self.users[0], project=self.vision)
+
+        analytics.refresh(now=self.base + 2 * day)
+        data = analytics.summary(days=3, today=(self.base + 2 * day).date())
+
+        self.assertEqual(
+            [(row['date'], row['applications'], row['accepted'], row['rejected']) for row in data['per_day']],
+            [('2026-03-10', 2, 1, 0), ('2026-03-11', 2, 1, 1), ('2026-03-12', 0, 0, 0)],
+        )
+        self.assertEqual(data['totals']['rate'], 2 / 3)
+        self.assertEqual(
+            [(row['name'], row['accepted'], row['rejected']) for row in data['by_category']],
+            [("ML", 1, 1), ("Web", 1, 0)],
+        )
+        self.assertEqual([(row['name'], row['rate']) for row in data['by_mentor']], [("mentor", 0.5)])
+        self.assertEqual(data['decision_time']['p50'], "≤ 4 h")
+        self.assertEqual(data['decision_time']['p99'], "≤ 48 h")
+        self.assertEqual({row['label']: row['count'] for row in data['fill']}['50–75%'], 1)
+        self.assertEqual({row['label']: row['count'] for row in data['fill']}['No limit'], 1)
+
+    def test_refresh_is_incremental(self):
+        """Test each run only adds rows newer than the watermark, once they have settled"""
+        self.apply(self.users[0], self.vision, self.base)
+        analytics.refresh(now=self.base + timedelta(hours=1))
+        # Too recent for this run, counted by the next one
+        self.apply(self.users[1], self.vision, self.base + timedelta(hours=1, seconds=-10))
+        analytics.refresh(now=self.base + timedelta(hours=1))
+        today = self.base.date()
+        self.assertEqual(analytics.summary(days=1, today=today)['totals']['applications'], 1)
+
+        analytics.refresh(now=self.base + timedelta(hours=2))
+        # The first application wasn't counted again
+        self.assertEqual(analytics.summary(days=1, today=today)['totals']['applications'], 2)
+        self.assertEqual(AnalyticsRollup.objects.get(metric='applications', dimension='').value, 2)
+
+    def test_summary_cost_independent_of_applications(self):
+        """Test reading the analytics costs the same however many applications there are"""
+        self.apply(self.users[0], self.vision, self.base)
+        analytics.refresh(now=self.base + timedelta(days=1))
+        refdata.all(Category)
+        with CaptureQueriesContext(connection) as few:
+            analytics.summary(today=self.base.date())
+        more = [User.objects.create_user(username=f"extra{i}", password="x") for i in range(20)]
+        for user in more:
+            self.apply(user, self.shop, self.base + timedelta(hours=25))
+        analytics.refresh(now=self.base + timedelta(days=2))
+        with CaptureQueriesContext(connection) as many:
+            data = analytics.summary(today=self.base.date() + timedelta(days=1))
+        self.assertEqual(data['totals']['applications'], 21)
+        self.assertEqual(len(many), len(few))
+
+    def test_decisions_record_time(self):
+        """Test accepting through the view records when it was decided"""
+        application = Application.objects.create(user=self.users[0], project=self.vision)
+        self.client.login(username="mentor", password="test123")
+        self.client.post(reverse('core:accept_application', args=[application.id]))
+        application.refresh_from_db()
+        self.assertIsNotNone(application.decided_at)
+
+    def test_api_and_page(self):
+        """Test staff get the JSON and the page, and a stale read queues one refresh"""
+        self.client.login(username="mentor", password="test123")
+        response = self.client.get(reverse('core:analytics_data'), {'days': 7})
+        self.assertEqual(len(response.json()['per_day']), 7)
+        response = self.client.get(reverse('core:datasciencepage'))
+        self.assertContains(response, "Club Analytics")
+        self.assertEqual(Job.objects.filter(name=analytics.REFRESH_JOB).count(), 1)
+
+        jobs.run_pending()
+        self.assertIsNone(analytics.schedule_refresh())
+
+    def test_api_staff_only(self):
+        """Test regular users get neither the API nor the analytics section"""
+        self.client.login(username="applicant0", password="test123")
+        self.assertEqual(self.client.get(reverse('core:analytics_data')).status_code, 302)
+        self.assertNotContains(self.client.get(reverse('core:datasciencepage')), "Club Analytics")
+
+
+class MentorInboxTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user(username="mentor", password="test123", is_staff=True)
+        self.mentored = [Project.objects.create(name=f"Mentored {i}", description="Test") for i in range(3)]
+        for project in self.mentored:
+            project.mentors.add(self.staff)
+        self.other = Project.objects.create(name="Other", description="Test")
+        self.applicants = [User.objects.create_user(username=f"applicant{i}", password="test123") for i in range(6)]
+        self.client.login(username="mentor", password="test123")
+
+    def _apply(self, projects, status='pending'):
+        return Application.objects.bulk_create([
+            Application(user=user, project=project, status=status)
+            for project in projects for user in self.applicants
+        ])
+
+    def _get(self, **params):
+        return self.client.get(reverse('core:mentor_inbox'), params, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+
+    def test_lists_only_mentored_pending(self):
+        """Test only pending applications to mentored, visible projects are listed"""
+        self._apply(self.mentored[:2])
+        self._apply([self.other])
+        Application.objects.filter(project=self.mentored[1], user=self.applicants[0]).update(status='accepted')
+        hidden = Project.objects.create(name="Hidden", description="Test", deletion_pending=True)
+        hidden.mentors.add(self.staff)
+        self._apply([hidden])
+
+        data = self._get()
+        self.assertEqual(data['total'], 11)
+        self.assertEqual(len(data['applications']), 11)
+        self.assertEqual(
+            {row['name']: row['pending'] for row in data['projects']},
+            {"Mentored 0": 6, "Mentored 1": 5},
+        )
+        self.assertTrue(all(app['project']['name'].startswith("Mentored") for app in data['applications']))
+        self.assertIsNone(data['next_cursor'])
+
+    def test_keyset_pagination(self):
+        """Test pages follow on from the cursor without gaps or repeats, even on timestamp ties"""
+        self._apply(self.mentored)
+        # Half of them share a timestamp, so the id breaks the tie
+        Application.objects.filter(project=self.mentored[0]).update(created_at=timezone.now())
+        seen, cursor = [], None
+        while True:
+            data = self._get(limit=4, **({'cursor': cursor} if cursor else {}))
+            seen.extend(app['id'] for app in data['applications'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        expected = list(
+            Application.objects.filter(project__in=self.mentored).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_project_filter(self):
+        """Test the list can be narrowed to one project while the counts stay complete"""
+        self._apply(self.mentored)
+        data = self._get(project=self.mentored[2].pk)
+        self.assertEqual({app['project']['id'] for app in data['applications']}, {self.mentored[2].pk})
+        self.assertEqual(data['total'], 18)
+
+    def test_query_count_is_constant(self):
+        """Test the inbox costs the same number of queries however many projects there are"""
+        self._apply(self.mentored[:1])
+        with CaptureQueriesContext(connection) as few:
+            self._get()
+        more = [Project.objects.create(name=f"Extra {i}", description="Test") for i in range(20)]
+        for project in more:
+            project.mentors.add(self.staff)
+        self._apply(more)
+        with CaptureQueriesContext(connection) as many:
+            data = self._get()
+        self.assertEqual(data['total'], 126)
+        self.assertEqual(len(many), len(few))
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get(reverse('core:mentor_inbox'), {'cursor': 'nonsense'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_renders(self):
+        """Test the HTML inbox shows the applications and a link to older ones"""
+        self._apply(self.mentored)
+        response = self.client.get(reverse('core:mentor_inbox'), {'limit': 5})
+        self.assertContains(response, "applicant5")
+        self.assertContains(response, "Older applications")
+
+    def test_staff_only(self):
+        """Test regular users can't open the inbox"""
+        User.objects.create_user(username="regular", password="test123")
+        self.client.login(username="regular", password="test123")
+        response = self.client.get(reverse('core:mentor_inbox'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CourseEnrollmentTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user(username="staff", password="test123", is_staff=True)
+        self.users = [User.objects.create_user(username=f"student{i}", password="test123") for i in range(4)]
+        self.course = Course.objects.create(name="Pandas", description="Data frames", level=2, capacity=2)
+        enrollments.sync_capacity(self.course)
+
+    def seats_left(self):
+        return CourseSeats.objects.get(course=self.course).seats_left
+
+    def test_full_course_waitlists_in_order(self):
+        """Test the first users get seats and the rest queue in arrival order"""
+        results = [enrollments.enroll(self.course, user) for user in self.users]
+        self.assertEqual([e.status for e in results], ['enrolled', 'enrolled', 'waitlisted', 'waitlisted'])
+        self.assertEqual([enrollments.waitlist_position(e) for e in results], [None, None, 1, 2])
+        self.assertEqual(self.seats_left(), 0)
+
+    def test_enrolling_twice_keeps_one_seat(self):
+        """Test a repeated enrollment returns the existing row without taking another seat"""
+        first = enrollments.enroll(self.course, self.users[0])
+        self.assertEqual(enrollments.enroll(self.course, self.users[0]).pk, first.pk)
+        self.assertEqual(self.seats_left(), 1)
+        self.assertEqual(CourseEnrollment.objects.count(), 1)
+
+    def test_deleted_user_seat_goes_to_waitlist(self):
+        """Test deleting an enrolled user, directly or in the background, frees their seat"""
+        for user in self.users:
+            enrollments.enroll(self.course, user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].delete()
+        self.assertEqual(CourseEnrollment.objects.get(user=self.users[2]).status, 'enrolled')
+
+        task = deletion.schedule_deletion(self.users[1])
+        self.assertTrue(deletion.claim(task.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.run_task(DeletionTask.objects.get(pk=task.pk), batch_size=1)
+        self.assertEqual(
+            list(CourseEnrollment.objects.order_by('id').values_list('user__username', 'status')),
+            [('student2', 'enrolled'), ('student3', 'enrolled')],
+        )
+        self.assertEqual(self.seats_left(), 0)
+
+    def test_cancel_promotes_head_of_waitlist(self):
+        """Test a freed seat goes to the oldest waitlisted user, who is notified"""
+        for user in self.users:
+            enrollments.enroll(self.course, user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(enrollments.cancel(self.course, self.users[0]))
+        statuses = dict(CourseEnrollment.objects.values_list('user__username', 'status'))
+        self.assertEqual(statuses, {'student1': 'enrolled', 'student2': 'enrolled', 'student3': 'waitlisted'})
+        self.assertEqual(self.seats_left(), 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.user, message.event), (self.users[2], 'course_seat_granted'))
+
+        # Leaving the waitlist frees nothing
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(enrollments.cancel(self.course, self.users[3]))
+        self.assertEqual(self.seats_left(), 0)
+        self.assertFalse(enrollments.cancel(self.course, self.users[3]))
+
+    def test_cancel_without_waitlist_frees_seat(self):
+        """Test cancelling with nobody waiting gives the seat back"""
+        enrollments.enroll(self.course, self.users[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollments.cancel(self.course, self.users[0])
+        self.assertEqual(self.seats_left(), 2)
+
+    def test_unlimited_course(self):
+        """Test a course without capacity enrolls everyone and keeps no seat counter"""
+        course = Course.objects.create(name="Open", description="Anyone")
+        self.assertTrue(all(enrollments.enroll(course, user).status == 'enrolled' for user in self.users))
+        self.assertFalse(CourseSeats.objects.filter(course=course).exists())
+
+    def test_capacity_without_seat_counter(self):
+        """Test a capacity set outside the course form is counted on first enrollment"""
+        course = Course.objects.create(name="Imported", description="Bulk", capacity=1)
+        self.assertEqual(enrollments.enroll(course, self.users[0]).status, 'enrolled')
+        self.assertEqual(enrollments.enroll(course, self.users[1]).status, 'waitlisted')
+
+    def test_raising_capacity_promotes_waitlist(self):
+        """Test editing the capacity recounts seats and promotes waiting users"""
+        for user in self.users:
+            enrollments.enroll(self.course, user)
+        self.client.login(username="staff", password="test123")
+        data = {"name": "Pandas", "description": "Data frames", "level": 2, "capacity": 3}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:edit_course', args=[self.course.id]), data)
+        self.assertEqual(CourseEnrollment.objects.filter(status='enrolled').count(), 3)
+        self.assertEqual(self.seats_left(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:edit_course', args=[self.course.id]), {**data, "capacity": ""})
+        self.assertEqual(CourseEnrollment.objects.filter(status='enrolled').count(), 4)
+        self.assertFalse(CourseSeats.objects.filter(course=self.course).exists())
+
+    def test_enroll_and_cancel_views(self):
+        """Test the enrollment endpoints and the course detail report the user's state"""
+        enrollments.enroll(self.course, self.users[1])
+        enrollments.enroll(self.course, self.users[2])
+        self.client.login(username="student0", password="test123")
+        ajax = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+        response = self.client.post(reverse('core:enroll_course', args=[self.course.id]), **ajax)
+        self.assertEqual(response.json()['enrollment']['status'], 'waitlisted')
+        self.assertEqual(response.json()['enrollment']['position'], 1)
+
+        detail = self.client.get(reverse('core:course_detail', args=[self.course.id])).json()
+        self.assertEqual((detail['capacity'], detail['seats_left']), (2, 0))
+        self.assertEqual(detail['enrollment']['status'], 'waitlisted')
+
+        self.assertEqual(self.client.post(reverse('core:cancel_enrollment', args=[self.course.id]), **ajax).status_code, 200)
+        self.assertEqual(self.client.post(reverse('core:cancel_enrollment', args=[self.course.id]), **ajax).status_code, 404)
+        self.assertEqual(self.client.get(reverse('core:enroll_course', args=[self.course.id])).status_code, 405)
+
+
+def _enrollment_worker(database, course_id, user_ids, threads, results):
+    """Worker process: enroll its users from several threads at once."""
+    if database:
+        # The inherited connection points at the parent's in-memory database
+        connections['default'].settings_dict['NAME'] = database
+        connections['default'] = connections.create_connection('default')
+    course = Course.objects.get(pk=course_id)
+    counts = {'enrolled': 0, 'waitlisted': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def enroll(ids):
+        for user_id in ids:
+            try:
+                status = enrollments.enroll(course, User(pk=user_id)).status
+            except Exception:
+                status = 'errors'
+            with lock:
+                counts[status] += 1
+        connections['default'].close()
+
+    pool = [threading.Thread(target=enroll, args=(user_ids[i::threads],)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    counts['seats_left'] = CourseSeats.objects.get(course_id=course_id).seats_left
+    counts['enrolled_rows'] = CourseEnrollment.objects.filter(course_id=course_id, status='enrolled').count()
+    counts['rows'] = CourseEnrollment.objects.filter(course_id=course_id).count()
+    results.put(counts)
+
+
+@skipUnless('fork' in multiprocessing.get_all_start_methods(), "requires fork")
+class CourseEnrollmentConcurrencyTest(TransactionTestCase):
+    PROCESSES = 4
+    THREADS = 8
+    USERS = 400
+    CAPACITY = 150
+
+    def shared_database(self, directory):
+        """
+        A file copy of an in-memory SQLite test database that forked workers
+        can open; other databases are shared as they are.
+        """
+        if connection.vendor != 'sqlite' or not connection.is_in_memory_db():
+            return None
+        path = os.path.join(directory, 'enrollment.sqlite3')
+        copy = sqlite3.connect(path)
+        connection.ensure_connection()
+        connection.connection.backup(copy)
+        copy.close()
+        return path
+
+    def test_no_overbooking_under_contention(self):
+        """Test many processes and threads enrolling at once fill exactly the capacity"""
+        course = Course.objects.create(name="Popular", description="Everyone wants in", capacity=self.CAPACITY)
+        enrollments.sync_capacity(course)
+        User.objects.bulk_create([User(username=f"rush{i}") for i in range(self.USERS)])
+        user_ids = list(User.objects.values_list('id', flat=True))
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        with tempfile.TemporaryDirectory() as directory:
+            database = self.shared_database(directory)
+            connections.close_all()
+            workers = [
+                context.Process(
+                    target=_enrollment_worker,
+                    args=(database, course.id, user_ids[i::self.PROCESSES], self.THREADS, results),
+                )
+                for i in range(self.PROCESSES)
+            ]
+            for worker in workers:
+                worker.start()
+            counts = [results.get(timeout=120) for _ in workers]
+            for worker in workers:
+                worker.join(timeout=10)
+
+        self.assertEqual(sum(c['errors'] for c in counts), 0)
+        self.assertEqual(sum(c['enrolled'] for c in counts), self.CAPACITY)
+        self.assertEqual(sum(c['waitlisted'] for c in counts), self.USERS - self.CAPACITY)
+        # The last worker to finish sees every row
+        final = max(counts, key=lambda c: c['rows'])
+        self.assertEqual((final['rows'], final['enrolled_rows'], final['seats_left']), (self.USERS, self.CAPACITY, 0))
+
+    def test_benchmark_refuses_in_memory_database(self):
+        """Test the throughput benchmark won't run where its processes can't share the database"""
+        if connection.vendor != 'sqlite' or not connection.is_in_memory_db():
+            self.skipTest("needs the in-memory SQLite test database")
+        with self.assertRaisesMessage(CommandError, "in-memory"):
+            call_command('benchmark_enrollments', stdout=StringIO())
+        self.assertFalse(Course.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ChallengeScoringTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(CORE_DATASET_DIR=self.tmp.name, CORE_SCORING_WORKERS=0)
+        self.settings_override.enable()
+        self.client = Client()
+        self.staff = User.objects.create_user(username="host", password="test123", is_staff=True)
+        self.alice = User.objects.create_user(username="alice", password="test123")
+        self.bob = User.objects.create_user(username="bob", password="test123")
+        self.project = Project.objects.create(name="House prices", description="Predict them")
+        for user in (self.alice, self.bob):
+            Assignment.objects.create(user=user, project=self.project)
+        self.truth = {f"h{i}": float(i % 7) for i in range(40)}
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def csv(self, rows, header="id,target"):
+        return "\n".join([header] + [f"{key},{value}" for key, value in rows]).encode()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as output:
+            output.write(content)
+        return path
+
+    def set_up_challenge(self, metric='rmse', truth=None):
+        self.client.login(username="host", password="test123")
+        response = self.client.post(reverse('core:setup_challenge', args=[self.project.id]), {
+            "metric": metric, "id_column": "id", "target_column": "target",
+            "ground_truth": SimpleUploadedFile("truth.csv", self.csv((truth or self.truth).items())),
+        })
+        self.assertEqual(response.status_code, 302)
+        jobs.run_pending()
+        self.client.logout()
+        return Challenge.objects.get(project=self.project)
+
+    def submit(self, username, predictions, **headers):
+        self.client.login(username=username, password="test123")
+        response = self.client.post(reverse('core:submit_predictions', args=[self.project.id]), {
+            "file": SimpleUploadedFile("predictions.csv", self.csv(predictions.items())),
+        }, **headers)
+        self.client.logout()
+        return response
+
+    def test_metrics_accumulate_across_chunks(self):
+        """Test every metric gives the same result fed in pieces as computed directly"""
+        truth, predicted = [1.0, 0.0, 1.0, 1.0, 0.0], [1.0, 1.0, 0.0, 1.0, 0.0]
+        expected = {
+            'rmse': math.sqrt(2 / 5),
+            'mae': 2 / 5,
+            'accuracy': 3 / 5,
+            'f1': 2 * 2 / (2 * 2 + 1 + 1),
+        }
+        for name, value in expected.items():
+            metric = metrics.METRICS[name]()
+            for start in (0, 2):
+                chunk = slice(start, 2 if start == 0 else None)
+                metric.add(*(
+                    metrics.numpy.array(values[chunk]) if metrics.numpy is not None else values[chunk]
+                    for values in (truth, predicted)
+                ))
+            self.assertAlmostEqual(metric.result(), value, msg=name)
+
+    def test_auc(self):
+        """Test AUC counts correctly ranked pairs, with ties counting half"""
+        def auc(truth, predicted):
+            metric = metrics.AUC()
+            metric.add(truth, predicted)
+            return metric.result()
+
+        with mock.patch.object(metrics, 'numpy', None):
+            self.assertEqual(auc([0, 0, 1, 1], [0.1, 0.2, 0.8, 0.9]), 1.0)
+            self.assertEqual(auc([0, 1], [0.5, 0.5]), 0.5)
+            self.assertEqual(auc([0, 1, 0, 1], [0.1, 0.4, 0.5, 0.8]), 0.75)
+            with self.assertRaises(metrics.ScoringError):
+                auc([1, 1], [0.2, 0.3])
+
+    def test_score_file_streams_in_chunks(self):
+        """Test a shuffled submission read a few rows at a time is matched by id"""
+        truth_path = os.path.join(self.tmp.name, 'truth.bin')
+        self.assertEqual(metrics.build_truth(self.write('truth.csv', self.csv(self.truth.items())), 'id', 'target', truth_path), 40)
+        predictions = [(key, value + 1) for key, value in reversed(self.truth.items())]
+        submission = self.write('sub.csv', "\n".join(["target,id"] + [f"{v},{k}" for k, v in predictions]).encode())
+        for engine in ([metrics.numpy] if metrics.numpy is not None else []) + [None]:
+            with mock.patch.object(metrics, 'CHUNK_ROWS', 3), mock.patch.object(metrics, 'numpy', engine):
+                result = metrics.score_file(truth_path, submission, 'mae', 'id', 'target')
+            self.assertEqual(result, {'score': 1.0, 'rows': 40})
+
+    def test_score_file_rejects_bad_submissions(self):
+        """Test unknown, duplicate and missing ids and unreadable values are reported"""
+        truth_path = os.path.join(self.tmp.name, 'truth.bin')
+        metrics.build_truth(self.write('truth.csv', self.csv([("a", 1), ("b", 0)])), 'id', 'target', truth_path)
+        cases = {
+            b"id,target\na,1\nc,0": "Unknown id 'c'",
+            b"id,target\na,1\na,1\nb,0": "duplicate",
+            b"id,target\na,1": "1 id(s)",
+            b"id,prediction\na,1\nb,0": "Missing column",
+            b"id,target\na,yes\nb,0": "Line 2",
+            b"id,target\na,nan\nb,0": "finite",
+        }
+        for content, message in cases.items():
+            with self.assertRaisesMessage(metrics.ScoringError, message):
+                metrics.score_file(truth_path, self.write('sub.csv', content), 'rmse', 'id', 'target')
+
+    def test_leaderboard_keeps_each_participants_best(self):
+        """Test scored submissions update the leaderboard only when they improve"""
+        challenge = self.set_up_challenge()
+        self.assertEqual((challenge.status, challenge.truth_rows), ('open', 40))
+
+        off_by_two = {key: value + 2 for key, value in self.truth.items()}
+        off_by_one = {key: value + 1 for key, value in self.truth.items()}
+        self.assertEqual(self.submit("alice", off_by_two).status_code, 302)
+        self.assertEqual(self.submit("bob", off_by_one).status_code, 302)
+        self.assertEqual(self.submit("alice", self.truth).status_code, 302)
+        self.assertEqual(self.submit("alice", off_by_two).status_code, 302)
+        jobs.run_pending()
+
+        scores = list(Submission.objects.filter(user=self.alice).order_by('id').values_list('score', flat=True))
+        self.assertEqual(scores, [2.0, 0.0, 2.0])
+        board = challenges.leaderboard(challenge)
+        self.assertEqual([(row['rank'], row['user'], row['score']) for row in board], [(1, 'alice', 0.0), (2, 'bob', 1.0)])
+        self.assertEqual(challenges.standing(challenge, self.bob)[0], 2)
+
+        self.client.login(username="bob", password="test123")
+        data = self.client.get(
+            reverse('core:challenge_detail', args=[self.project.id]), HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        ).json()
+        self.assertEqual(data['rank'], 2)
+        self.assertEqual([row['user'] for row in data['leaderboard']], ['alice', 'bob'])
+        self.assertEqual(data['submissions'][0]['score'], 1.0)
+        self.assertContains(self.client.get(reverse('core:challenge_detail', args=[self.project.id])), "ranked <strong>#2</strong>")
+
+    def test_higher_is_better_metrics_rank_descending(self):
+        """Test accuracy ranks the highest score first and keeps it"""
+        labels = {key: float(i % 2) for i, key in enumerate(self.truth)}
+        challenge = self.set_up_challenge('accuracy', labels)
+        half_wrong = {key: 1.0 for key in labels}
+        self.submit("alice", labels)
+        self.submit("bob", half_wrong)
+        self.submit("alice", half_wrong)
+        jobs.run_pending()
+        board = challenges.leaderboard(challenge)
+        self.assertEqual([(row['user'], row['score']) for row in board], [('alice', 1.0), ('bob', 0.5)])
+
+    def test_failed_submission_is_reported(self):
+        """Test a submission with unknown ids fails without touching the leaderboard"""
+        self.set_up_challenge()
+        self.submit("alice", {"nope": 1.0})
+        jobs.run_pending()
+        submission = Submission.objects.get(user=self.alice)
+        self.assertEqual(submission.status, 'failed')
+        self.assertIn("Unknown id 'nope'", submission.error)
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+    def test_only_participants_submit_within_the_daily_limit(self):
+        """Test outsiders and participants over the daily limit are turned away"""
+        self.set_up_challenge()
+        User.objects.create_user(username="outsider", password="test123")
+        ajax = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+        self.assertEqual(self.submit("outsider", self.truth, **ajax).status_code, 403)
+        with override_settings(CORE_DAILY_SUBMISSIONS=2):
+            self.assertEqual(self.submit("alice", self.truth, **ajax).status_code, 202)
+            self.assertEqual(self.submit("alice", self.truth, **ajax).status_code, 202)
+            response = self.submit("alice", self.truth, **ajax)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("2 times a day", response.json()['errors']['file'][0])
+        self.assertEqual(Submission.objects.count(), 2)
+        # Rejected uploads leave no temporary files behind
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'tmp')), [])
+
+    def test_oversized_submission_is_dropped(self):
+        """Test a submission over CORE_SUBMISSION_MAX_SIZE is refused while streaming"""
+        self.set_up_challenge()
+        with override_settings(CORE_SUBMISSION_MAX_SIZE=10):
+            response = self.submit("alice", self.truth, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_new_ground_truth_rescores_submissions(self):
+        """Test replacing the ground truth scores every submission again"""
+        challenge = self.set_up_challenge()
+        self.submit("alice", self.truth)
+        jobs.run_pending()
+        self.assertEqual(challenges.leaderboard(challenge)[0]['score'], 0.0)
+
+        self.set_up_challenge(truth={key: value + 3 for key, value in self.truth.items()})
+        self.assertEqual(Submission.objects.get().score, 3.0)
+        self.assertEqual([row['score'] for row in challenges.leaderboard(challenge)], [3.0])
+
+    def test_replaced_ground_truth_removed(self):
+        """Test a replaced ground truth is deleted unless a submission has the same content"""
+        old_truth = self.set_up_challenge().ground_truth
+        with self.captureOnCommitCallbacks(execute=True):
+            shared_truth = self.set_up_challenge(truth={"a": 1.0}).ground_truth
+        self.assertFalse(DatasetBlob.objects.filter(pk=old_truth.pk).exists())
+        self.assertFalse(datasets.blob_path(old_truth.sha256).exists())
+
+        self.submit("alice", {"a": 1.0})
+        self.set_up_challenge()
+        self.assertTrue(DatasetBlob.objects.filter(pk=shared_truth.pk).exists())
+
+    def test_unreadable_ground_truth_fails_the_challenge(self):
+        """Test a ground truth with duplicate ids leaves the challenge failed"""
+        challenge = self.set_up_challenge(truth={"a": 1.0})
+        self.assertEqual(challenge.status, 'open')
+        self.client.login(username="host", password="test123")
+        self.client.post(reverse('core:setup_challenge', args=[self.project.id]), {
+            "metric": "rmse", "id_column": "id", "target_column": "target",
+            "ground_truth": SimpleUploadedFile("truth.csv", b"id,target\na,1\na,2"),
+        })
+        jobs.run_pending()
+        challenge.refresh_from_db()
+        self.assertEqual(challenge.status, 'failed')
+        self.assertIn("duplicate", challenge.error)
+        self.assertEqual(self.submit("alice", {"a": 1.0}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').status_code, 403)
+
+    def test_challenge_setup_is_staff_only(self):
+        """Test regular users can't create a challenge or see a missing one"""
+        self.client.login(username="alice", password="test123")
+        response = self.client.post(reverse('core:setup_challenge', args=[self.project.id]), {
+            "metric": "rmse", "ground_truth": SimpleUploadedFile("truth.csv", b"id,target\na,1"),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Challenge.objects.exists())
+        self.assertEqual(self.client.get(reverse('core:challenge_detail', args=[self.project.id])).status_code, 404)
+
+    def test_scoring_in_worker_process(self):
+        """Test scoring through the process pool gives the in-process result"""
+        truth_path = os.path.join(self.tmp.name, 'truth.bin')
+        metrics.build_truth(self.write('truth.csv', self.csv(self.truth.items())), 'id', 'target', truth_path)
+        submission = self.write('sub.csv', self.csv((key, value + 0.5) for key, value in self.truth.items()))
+        with override_settings(CORE_SCORING_WORKERS=1):
+            self.addCleanup(lambda: challenges._pool and challenges._pool.shutdown())
+            self.addCleanup(setattr, challenges, '_pool', None)
+            result = challenges.run_scoring(metrics.score_file, truth_path, submission, 'rmse', 'id', 'target')
+        self.assertEqual(result, {'score': 0.5, 'rows': 40})
+
+    def test_cleanup_keeps_challenge_files(self):
+        """Test dataset cleanup leaves ground truths and submissions alone"""
+        self.set_up_challenge()
+        self.submit("alice", {key: value + 1 for key, value in self.truth.items()})
+        self.assertEqual(datasets.cleanup()['blobs'], 0)
+        self.assertEqual(DatasetBlob.objects.count(), 2)
+
+
+class DatasetProfileTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(CORE_DATASET_DIR=self.tmp.name)
+        self.settings_override.enable()
+        self.client = Client()
+        self.member = User.objects.create_user(username="member", password="test123")
+        self.project = Project.objects.create(name="Datasets", description="Test")
+        Assignment.objects.create(user=self.member, project=self.project)
+        self.client.login(username='member', password='test123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def upload(self, content, name="data.csv", content_type="text/csv"):
+        self.client.post(reverse('core:upload_dataset'), {
+            "project": self.project.id, "file": SimpleUploadedFile(name, content, content_type=content_type),
+        })
+        return Dataset.objects.latest('id')
+
+    def write(self, content):
+        path = os.path.join(self.tmp.name, 'sample.csv')
+        with open(path, 'wb') as output:
+            output.write(content)
+        return path
+
+    def test_type_inference(self):
+        """Test column types are inferred from the non-blank sample values"""
+        self.assertEqual(profiling.infer_type(["1", " 2", ""]), 'integer')
+        self.assertEqual(profiling.infer_type(["1", "2.5"]), 'float')
+        self.assertEqual(profiling.infer_type(["1", "x"]), 'string')
+        self.assertEqual(profiling.infer_type(["", " "]), 'empty')
+        self.assertEqual(profiling.infer_type(["nan", "1"]), 'string')
+
+    def test_statistics_over_chunks(self):
+        """Test counts, ranges, means and histograms add up across chunks"""
+        lines = ["id;score;label"] + [f"{i};{i / 10};{'x' * (i % 3 + 1)}" for i in range(100)] + ["100;;", "101;oops;y"]
+        # Types come from the first 50 rows; later junk is counted as invalid
+        with mock.patch.object(profiling, 'CHUNK_ROWS', 7), mock.patch.object(profiling, 'SAMPLE_ROWS', 50):
+            data = profiling.profile_file(self.write("\n".join(lines).encode()))
+        self.assertEqual(data['delimiter'], ';')
+        self.assertEqual(data['rows'], 102)
+        ident, score, label = data['columns']
+        self.assertEqual((ident['type'], ident['count'], ident['min'], ident['max']), ('integer', 102, 0, 101))
+        self.assertEqual((score['type'], score['nulls'], score['invalid']), ('float', 1, 1))
+        self.assertAlmostEqual(score['mean'], 4.95)
+        self.assertEqual(sum(score['histogram']['counts']), 100)
+        self.assertEqual(score['histogram']['counts'][0], 5)
+        self.assertEqual((label['type'], label['min_length'], label['max_length'], label['nulls']), ('string', 1, 3, 1))
+        self.assertEqual(data['preview']['header'], ["id", "score", "label"])
+        self.assertEqual(len(data['preview']['rows']), profiling.PREVIEW_ROWS)
+
+    def test_pure_python_matches_numpy_path(self):
+        """Test the builtin reductions give the same numbers as the vectorized ones"""
+        values = [3.0, -1.5, 8.25, 0.0]
+        with mock.patch.object(profiling, 'numpy', None):
+            self.assertEqual(profiling.reduce(values), (4, 9.75, -1.5, 8.25))
+            self.assertEqual(sum(profiling.bin_counts(values, -1.5, 8.25, bins=4)), 4)
+            self.assertEqual(profiling.bin_counts(values, -1.5, 8.25, bins=4), [2, 1, 0, 1])
+
+    def test_overflowing_sums_stored_as_null(self):
+        """Test sums and ranges too large for a float give None instead of Infinity"""
+        with mock.patch.object(profiling, 'numpy', None):
+            self.assertIsNone(profiling.reduce([1e308, 1e308])[1])
+        data = profiling.profile_file(self.write(b"big,wide\n1e308,-1e308\n1e308,1e308\n"))
+        big, wide = data['columns']
+        self.assertEqual((big['mean'], big['max'], sum(big['histogram']['counts'])), (None, 1e308, 2))
+        self.assertEqual((wide['mean'], wide['histogram']), (0.0, {'edges': [], 'counts': []}))
+        json.loads(json.dumps(data, allow_nan=False))
+
+    def test_unexpected_error_marks_profile_failed(self):
+        """Test a profile whose computation crashes isn't left pending"""
+        dataset = self.upload(b"a,b\n1,2\n")
+        with mock.patch.object(profiling, 'profile_file', side_effect=MemoryError("out of memory")):
+            with self.assertRaises(MemoryError):
+                profiling.run(dataset.blob_id)
+        profile = DatasetProfile.objects.get(pk=dataset.blob_id)
+        self.assertEqual((profile.status, profile.error), ('failed', "out of memory"))
+
+    def test_rejects_binary_and_empty_files(self):
+        """Test files that aren't CSV text are reported as unsupported"""
+        with self.assertRaises(profiling.UnsupportedDataset):
+            profiling.profile_file(self.write(b""))
+        with self.assertRaises(profiling.UnsupportedDataset):
+            profiling.profile_file(self.write(b"PK\x03\x04\x00\x00binary"))
+
+    def test_profile_computed_once_per_content(self):
+        """Test the upload queues one profiling job per content hash and the preview is served from it"""
+        dataset = self.upload(b"a,b\n1,2\n3,4\n")
+        self.upload(b"a,b\n1,2\n3,4\n", name="copy.csv")
+        self.assertEqual(Job.objects.filter(name=profiling.PROFILE_JOB).count(), 1)
+        url = reverse('core:dataset_preview', args=[dataset.id])
+        self.assertEqual(self.client.get(url).status_code, 202)
+
+        jobs.run_pending()
+        # Generations, session, user, then the dataset with its profile
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'done')
+        self.assertEqual(body['profile']['rows'], 2)
+        self.assertEqual(body['profile']['columns'][1]['max'], 4)
+
+    def test_non_tabular_upload_not_profiled(self):
+        """Test files that don't look like CSV get no profiling job"""
+        dataset = self.upload(b"\x89PNG", name="plot.png", content_type="image/png")
+        self.assertFalse(Job.objects.filter(name=profiling.PROFILE_JOB).exists())
+        response = self.client.get(reverse('core:dataset_preview', args=[dataset.id]))
+        self.assertEqual(response.json()['status'], 'unsupported')
+
+
+class DatasetLibraryTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(CORE_DATASET_DIR=self.tmp.name, CORE_DATASET_QUOTA=100)
+        self.settings_override.enable()
+        self.client = Client()
+        self.member = User.objects.create_user(username="member", password="test123")
+        self.other = User.objects.create_user(username="other", password="test123")
+        self.project = Project.objects.create(name="Datasets", description="Test")
+        Assignment.objects.create(user=self.member, project=self.project)
+        self.client.login(username='member', password='test123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def upload(self, content, name="data.csv", **extra):
+        upload = SimpleUploadedFile(name, content, content_type="text/csv")
+        return self.client.post(
+            reverse('core:upload_dataset'), {"project": self.project.id, "file": upload, "description": "Rows"}, **extra,
+        )
+
+    def test_upload_is_hashed_and_deduplicated(self):
+        """Test uploads are stored by SHA-256 and identical content is kept once"""
+        response = self.upload(b"a,b\n1,2\n", HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        digest = hashlib.sha256(b"a,b\n1,2\n").hexdigest()
+        self.assertEqual(response.json()["dataset"]["sha256"], digest)
+        self.upload(b"a,b\n1,2\n", name="copy.csv")
+        self.assertEqual(Dataset.objects.count(), 2)
+        self.assertEqual(DatasetBlob.objects.count(), 1)
+        self.assertTrue(datasets.blob_path(digest).exists())
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'tmp')), [])
+
+    def test_quota_counters(self):
+        """Test quota counters grow with uploads, block overruns and shrink on delete"""
+        self.upload(b"x" * 60)
+        quota = DatasetQuota.objects.get(user=self.member)
+        self.assertEqual((quota.used_bytes, quota.files), (60, 1))
+        response = self.upload(b"y" * 50, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Dataset.objects.count(), 1)
+
+        dataset = Dataset.objects.get()
+        response = self.client.post(reverse('core:delete_dataset', args=[dataset.id]))
+        self.assertRedirects(response, reverse('core:datasciencepage'))
+        quota.refresh_from_db()
+        self.assertEqual((quota.used_bytes, quota.files), (0, 0))
+        self.assertFalse(DatasetBlob.objects.exists())
+
+    def test_project_deletion_refunds_quota(self):
+        """Test deleting a project in the background refunds uploaders and removes the content"""
+        self.upload(b"a,b\n1,2\n")
+        self.upload(b"3,4\n")
+        path = datasets.blob_path(hashlib.sha256(b"3,4\n").hexdigest())
+        self.assertTrue(path.exists())
+        task = deletion.schedule_deletion(self.project)
+        self.assertTrue(deletion.claim(task.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.run_task(DeletionTask.objects.get(pk=task.pk), batch_size=1)
+        quota = DatasetQuota.objects.get(user=self.member)
+        self.assertEqual((quota.used_bytes, quota.files), (0, 0))
+        self.assertFalse(DatasetBlob.objects.exists())
+        self.assertFalse(path.exists())
+
+    def test_only_members_upload_and_owners_delete(self):
+        """Test users outside the project can't upload to it or delete others' datasets"""
+        self.upload(b"1,2\n")
+        self.client.login(username='other', password='test123')
+        response = self.upload(b"3,4\n", HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('core:delete_dataset', args=[Dataset.objects.get().id]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_upload_checks_csrf(self):
+        """Test the upload view still enforces CSRF after installing its handler"""
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='member', password='test123')
+        upload = SimpleUploadedFile("data.csv", b"1,2\n")
+        response = client.post(reverse('core:upload_dataset'), {"project": self.project.id, "file": upload})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Dataset.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'tmp')), [])
+
+    def test_repeated_file_field_cleaned_up(self):
+        """Test every file sent under one field is removed, not only the last"""
+        uploads = [SimpleUploadedFile(f"part{n}.csv", b"1,2\n", content_type="text/csv") for n in range(3)]
+        self.client.post(reverse('core:upload_dataset'), {"project": self.project.id, "file": uploads})
+        self.assertEqual(Dataset.objects.count(), 1)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'tmp')), [])
+
+    def test_range_download(self):
+        """Test downloads honour single byte ranges and reject unsatisfiable ones"""
+        self.upload(b"0123456789")
+        url = reverse('core:download_dataset', args=[Dataset.objects.get().id])
+        response = self.client.get(url)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response['Content-Range'], "bytes 2-5/10")
+        self.assertEqual(response['Content-Length'], "4")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+        response = self.client.get(url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], "bytes */10")
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CORE_DATASET_SENDFILE='X-Accel-Redirect', CORE_DATASET_ACCEL_PREFIX='/protected/')
+    def test_sendfile_header(self):
+        """Test the front server is asked to send the file when configured"""
+        self.upload(b"abc")
+        dataset = Dataset.objects.get()
+        response = self.client.get(reverse('core:download_dataset', args=[dataset.id]))
+        sha = dataset.blob.sha256
+        self.assertEqual(response['X-Accel-Redirect'], f"/protected/{sha[:2]}/{sha}")
+        self.assertEqual(response.content, b"")
+
+    def test_cleanup_recounts_quotas(self):
+        """Test the cleanup command settles counters after rows vanish without delete()"""
+        self.upload(b"abc")
+        Dataset.objects.all().delete()
+        out = StringIO()
+        call_command('cleanup_datasets', stdout=out)
+        self.assertIn("removed 1 unused blob(s)", out.getvalue())
+        self.assertEqual(DatasetQuota.objects.get(user=self.member).used_bytes, 0)
+
+    def test_page_lists_datasets(self):
+        """Test the data science page lists datasets and the upload form"""
+        self.upload(b"abc", name="survey.csv")
+        response = self.client.get(reverse('core:datasciencepage'))
+        self.assertContains(response, "survey.csv")
+        self.assertContains(response, "Upload a dataset")
+
+
+class DuplicateProjectTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        User.objects.create_user(username="staffuser", password="test123", is_staff=True)
+        self.original = Project.objects.create(
+            name="Sentiment Analysis Tool", description="Classify the sentiment of product reviews.",
+        )
+        Project.objects.create(name="Weather Dashboard", description="Charts of local weather stations.")
+        jobs.run_pending()
+        self.client.login(username='staffuser', password='test123')
+
+    def test_similar_texts_agree_on_most_hashes(self):
+        """Test signature agreement tracks the Jaccard similarity of the shingles"""
+        first = duplicates.signature("Sentiment Analysis Tool", "Classify reviews")
+        self.assertEqual(duplicates.similarity(first, duplicates.signature("sentiment analysis tool!", "Classify reviews")), 1.0)
+        self.assertGreater(duplicates.similarity(first, duplicates.signature("Sentiment analysis tool v2", "Classify reviews")), 0.6)
+        self.assertLess(duplicates.similarity(first, duplicates.signature("Weather Dashboard", "Charts")), 0.2)
+
+    def test_long_descriptions_hash_their_start(self):
+        """Test only the first TEXT_LIMIT characters go into a signature"""
+        start = "Classify the sentiment of product reviews. " * 100
+        self.assertEqual(
+            duplicates.signature("Tool", start + "Something else entirely. " * 1000),
+            duplicates.signature("Tool", start + "Nothing alike at all. " * 1000),
+        )
+
+    def test_saves_store_signature_and_bands(self):
+        """Test every project gets a signature and one bucket per band from the queue"""
+        self.assertEqual(ProjectSignature.objects.count(), 2)
+        self.assertEqual(ProjectBand.objects.filter(project=self.original).count(), duplicates.BANDS)
+
+        self.original.description = "Something else entirely."
+        self.original.save()
+        self.assertFalse(ProjectBand.objects.filter(project=self.original).exists())
+        [job] = jobs.run_pending()
+        self.assertEqual(job.result, {'computed': 1})
+        self.assertEqual(ProjectBand.objects.filter(project=self.original).count(), duplicates.BANDS)
+        self.assertEqual(duplicates.find("Sentiment Analysis Tool", "Classify the sentiment of product reviews."), [])
+
+    def test_find_reads_only_shared_buckets(self):
+        """Test a lookup is one query and only returns likely duplicates"""
+        with self.assertNumQueries(1):
+            found = duplicates.find("Sentiment analysis tool v2", "Classify the sentiment of product reviews.")
+        self.assertEqual([match['id'] for match in found], [self.original.id])
+        self.assertEqual(duplicates.find("Sentiment Analysis Tool", "", exclude=self.original.id), [])
+
+    def test_add_project_warns_about_duplicates(self):
+        """Test adding a near duplicate asks for confirmation before saving"""
+        data = {"name": "Sentiment analysis tool v2", "description": "Classify the sentiment of product reviews."}
+        response = self.client.post(reverse('core:add_project'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Sentiment Analysis Tool")
+        self.assertFalse(Project.objects.filter(name=data["name"]).exists())
+
+        response = self.client.post(reverse('core:add_project'), {**data, "confirm_duplicate": "on"})
+        self.assertRedirects(response, reverse('core:project_list'))
+        self.assertTrue(Project.objects.filter(name=data["name"]).exists())
+
+    def test_editing_other_fields_skips_check(self):
+        """Test a project isn't its own duplicate and unchanged text isn't checked"""
+        copy = Project.objects.create(name="Sentiment Analysis Tool 2", description=self.original.description)
+        data = {"name": copy.name, "description": copy.description, "capacity": 3}
+        response = self.client.post(reverse('core:edit_project', args=[copy.id]), data)
+        self.assertRedirects(response, reverse('core:project_list'))
+
+    def test_command_computes_missing_signatures(self):
+        """Test the command fills in signatures of rows that have none"""
+        ProjectSignature.objects.all().delete()
+        ProjectBand.objects.all().delete()
+        out = StringIO()
+        call_command('compute_project_signatures', '--missing', stdout=out)
+        self.assertIn("2 project(s)", out.getvalue())
+        self.assertEqual(ProjectBand.objects.count(), 2 * duplicates.BANDS)
+        call_command('compute_project_signatures', '--missing', stdout=out)
+        self.assertIn("0 project(s)", out.getvalue())
+
+
+class SimilarCoursesTest(TestCase):
+    def setUp(self):
+        similar_courses.index.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username="user1", password="test123")
+        self.intro = Course.objects.create(
+            name="Intro to Machine Learning", description="Regression, classification and neural networks.", level=1,
+        )
+        self.deep = Course.objects.create(
+            name="Deep Learning", description="Neural networks, backpropagation and convolutional networks.", level=2,
+        )
+        self.expert = Course.objects.create(
+            name="Neural Network Research", description="Neural networks at research scale.", level=5,
+        )
+        self.web = Course.objects.create(name="Web Development", description="HTML, CSS and Django views.", level=1)
+        self.client.login(username='user1', password='test123')
+
+    def tearDown(self):
+        similar_courses.index.clear()
+
+    def test_tokenize_keeps_language_names(self):
+        """Test tokens are lower-cased, stop words dropped and C++/C# kept whole"""
+        self.assertEqual(similar_courses.tokenize("The C++ and C# course"), ["c++", "c#"])
+
+    def test_level_weight_prefers_next_step(self):
+        """Test the same level and the next one up keep their score"""
+        self.assertEqual(similar_courses.level_weight(3, 3), 1.0)
+        self.assertEqual(similar_courses.level_weight(4, 3), 1.0)
+        self.assertAlmostEqual(similar_courses.level_weight(2, 3), 1 - similar_courses.LEVEL_PENALTY)
+        self.assertAlmostEqual(similar_courses.level_weight(5, 1), 1 - 3 * similar_courses.LEVEL_PENALTY)
+        self.assertEqual(similar_courses.level_weight(1, None), 1.0)
+
+    def test_related_courses_ranked_by_text_and_level(self):
+        """Test related courses share words, closer levels first, the course itself excluded"""
+        response = self.client.get(reverse('core:related_courses', args=[self.intro.id]))
+        self.assertEqual(response.status_code, 200)
+        names = [row['name'] for row in response.json()['courses']]
+        self.assertEqual(names, ["Deep Learning", "Neural Network Research"])
+
+    def test_unknown_course_is_404(self):
+        """Test asking for a course that doesn't exist returns 404"""
+        response = self.client.get(reverse('core:related_courses', args=[self.web.id + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_lookup_reads_no_corpus(self):
+        """Test a loaded index answers without touching the database"""
+        self.assertEqual(len(similar_courses.index), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(similar_courses.index.similar(self.web.id), [])
+
+    def test_clear_waits_for_lookup(self):
+        """Test a clear() arriving right after the load can't empty the index under a lookup"""
+        index = similar_courses.index
+        load = index._load_locked
+        clearing = []
+
+        def load_then_clear():
+            load()
+            clearing.append(threading.Thread(target=index.clear))
+            clearing[0].start()
+            clearing[0].join(0.2)
+
+        with mock.patch.object(index, '_load_locked', load_then_clear):
+            self.assertIsNotNone(index.similar(self.intro.id))
+        clearing[0].join()
+        self.assertEqual(len(index), 4)
+
+    def test_saves_update_index_in_place(self):
+        """Test course saves and deletes update a loaded index after commit"""
+        similar_courses.index.similar(self.web.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            advanced = Course.objects.create(name="Advanced Django", description="Django views and ORM.", level=2)
+        with self.assertNumQueries(0):
+            ranked = similar_courses.index.similar(self.web.id)
+        self.assertEqual([course_id for course_id, _ in ranked], [advanced.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            advanced.description = "Neural networks."
+            advanced.name = "Advanced Networks"
+            advanced.save()
+        self.assertEqual(similar_courses.index.similar(self.web.id), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deep.delete()
+        ranked = similar_courses.index.similar(self.intro.id, limit=10)
+        self.assertNotIn(self.deep.id, [course_id for course_id, _ in ranked])
+        self.assertEqual(len(similar_courses.index), 4)
+
+    def test_recommended_for_assigned_projects(self):
+        """Test a user's suggestions come from their assigned projects' descriptions"""
+        url = reverse('core:recommended_courses')
+        self.assertEqual(self.client.get(url).json()['courses'], [])
+        project = Project.objects.create(name="Shop", description="A Django web shop with HTML templates.")
+        Assignment.objects.create(user=self.user, project=project)
+        names = [row['name'] for row in self.client.get(url).json()['courses']]
+        self.assertEqual(names, ["Web Development"])
+
+
+class CourseBitmapIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        User.objects.create_user(username="user1", password="test123")
+        self.python = ProgrammingLanguage.objects.create(name="Python")
+        self.rust = ProgrammingLanguage.objects.create(name="Rust")
+        self.sql = ProgrammingLanguage.objects.create(name="SQL")
+        self.courses = []
+        for i, (level, languages) in enumerate([
+            (1, [self.python]), (1, [self.python, self.sql]), (3, [self.rust]),
+            (3, [self.python, self.rust]), (5, []), (5, [self.sql]),
+        ]):
+            course = Course.objects.create(name=f"Course {i}", description="Data" if i % 2 else "Systems", level=level)
+            course.programming_languages.set(languages)
+            self.courses.append(course)
+        bitmaps.clear()
+        self.client.login(username='user1', password='test123')
+
+    def orm_ids(self, language_ids=(), level=None, query=''):
+        courses = Course.objects.all()
+        if query:
+            courses = courses.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        if language_ids:
+            courses = courses.filter(programming_languages__id__in=language_ids).distinct()
+        if level is not None:
+            courses = courses.filter(level=level)
+        return list(courses.values_list('id', flat=True))
+
+    def test_bitset_helpers(self):
+        """Test bitsets round-trip through their positions"""
+        mask = bitmaps.bitset([0, 3, 64, 65], 70)
+        self.assertEqual(mask, 1 | 1 << 3 | 1 << 64 | 1 << 65)
+        self.assertEqual(list(bitmaps.positions_of(mask)), [0, 3, 64, 65])
+        self.assertEqual(list(bitmaps.positions_of(0)), [])
+
+    def test_matches_orm(self):
+        """Test every filter combination returns the ORM's courses, in list order"""
+        index = bitmaps.course_index()
+        python, rust, sql = self.python.pk, self.rust.pk, self.sql.pk
+        for language_ids in ([], [python], [rust, sql], [python, rust, sql]):
+            for level in (None, 1, 3, 5):
+                for query in ('', 'data'):
+                    within = index.search(query) if query else None
+                    self.assertEqual(
+                        index.ids_of(index.match(language_ids, level, within)),
+                        self.orm_ids(language_ids, level, query),
+                    )
+
+    def test_facets(self):
+        """Test language counts ignore the language selection and level counts the level"""
+        index = bitmaps.course_index()
+        counts = index.facets([self.rust.pk], 3)
+        self.assertEqual(counts['total'], 2)
+        self.assertEqual(counts['levels'], {1: 0, 3: 2, 5: 0})
+        self.assertEqual(counts['languages'], {self.python.pk: 1, self.rust.pk: 2, self.sql.pk: 0})
+
+    def test_rebuilt_after_writes(self):
+        """Test course and course-language changes drop the index"""
+        index = bitmaps.course_index()
+        self.assertIs(bitmaps.course_index(), index)
+        self.courses[4].programming_languages.add(self.rust)
+        self.assertEqual(len(bitmaps.course_index().ids_of(bitmaps.course_index().languages[self.rust.pk])), 3)
+        Course.objects.create(name="Course 6", description="New", level=2)
+        self.assertEqual(len(bitmaps.course_index()), 7)
+
+    def test_view_filters_without_join(self):
+        """Test the course list is filtered by the index, with no join over the M2M table"""
+        bitmaps.course_index()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('core:courses_list'), {'language': [self.python.pk, self.sql.pk], 'level': 1},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+        data = json.loads(response.content)
+        self.assertEqual([c['name'] for c in data['courses']], ["Course 0", "Course 1"])
+        self.assertEqual(data['facets']['levels'], {'1': 2, '2': 0, '3': 1, '4': 0, '5': 1})
+        self.assertFalse(any('DISTINCT' in q['sql'] for q in queries.captured_queries))
+
+    def test_benchmark_command(self):
+        """Test the benchmark runs, agrees with the ORM and leaves no rows behind"""
+        out = StringIO()
+        call_command('benchmark_course_filters', courses=300, languages=5, repeat=1, stdout=out)
+        self.assertIn("Benchmark finished", out.getvalue())
+        self.assertEqual(Course.objects.count(), 6)
+
+
+class ProjectFacetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username="user1", password="test123")
+        self.staff = User.objects.create_user(username="staff1", password="test123", is_staff=True)
+        self.ml = Category.objects.create(name="ML")
+        self.web = Category.objects.create(name="Web")
+        self.empty = Category.objects.create(name="Empty")
+        # ML: both; Web: both, plus one more; one project without categories
+        self.alpha = Project.objects.create(name="Alpha", description="Vision", capacity=1)
+        self.alpha.categories.add(self.ml, self.web)
+        self.alpha.mentors.add(self.staff)
+        Assignment.objects.create(user=self.user, project=self.alpha)
+        self.beta = Project.objects.create(name="Beta", description="Vision")
+        self.beta.categories.add(self.ml, self.web)
+        self.gamma = Project.objects.create(name="Gamma", description="Shop", capacity=5)
+        self.gamma.categories.add(self.web)
+        self.gamma.mentors.add(self.staff)
+        self.delta = Project.objects.create(name="Delta", description="Misc")
+        self.client.login(username='user1', password='test123')
+
+    def get(self, **params):
+        response = self.client.get(reverse('core:project_list'), params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return json.loads(response.content)
+
+    def test_counts_without_filters(self):
+        """Test every category and flag gets a count, including empty categories"""
+        facets = self.get()['facets']
+        self.assertEqual(facets['total'], 4)
+        self.assertEqual(facets['categories'], {str(self.ml.pk): 2, str(self.web.pk): 3, str(self.empty.pk): 0})
+        # Alpha is full; Beta and Delta have no limit
+        self.assertEqual(facets['flags'], {'has_open_slots': 3, 'has_mentors': 2})
+
+    def test_counts_respect_search(self):
+        """Test the counts only cover projects matching the search"""
+        facets = self.get(q='vision')['facets']
+        self.assertEqual(facets['categories'][str(self.web.pk)], 2)
+        self.assertEqual(facets['flags'], {'has_open_slots': 1, 'has_mentors': 1})
+
+    def test_category_facets_are_disjunctive(self):
+        """Test checking a category leaves the category counts alone but narrows the flags"""
+        data = self.get(category=self.ml.pk)
+        self.assertEqual({p['name'] for p in data['projects']}, {"Alpha", "Beta"})
+        self.assertEqual(data['facets']['categories'][str(self.web.pk)], 3)
+        self.assertEqual(data['facets']['flags'], {'has_open_slots': 1, 'has_mentors': 1})
+        self.assertEqual(data['facets']['total'], 2)
+
+    def test_flag_filters(self):
+        """Test flag filters narrow the list and the other facets, but not their own count"""
+        data = self.get(flag='has_mentors')
+        self.assertEqual({p['name'] for p in data['projects']}, {"Alpha", "Gamma"})
+        self.assertEqual(data['facets']['flags'], {'has_open_slots': 1, 'has_mentors': 2})
+        self.assertEqual(data['facets']['categories'][str(self.ml.pk)], 1)
+
+        data = self.get(flag=['has_mentors', 'has_open_slots'])
+        self.assertEqual([p['name'] for p in data['projects']], ["Gamma"])
+        self.assertEqual(data['facets']['total'], 1)
+
+    def test_projects_in_several_categories_listed_once(self):
+        """Test a project matching several checked categories appears once"""
+        data = self.get(category=[self.ml.pk, self.web.pk])
+        self.assertEqual(sorted(p['name'] for p in data['projects']), ["Alpha", "Beta", "Gamma"])
+
+    def test_query_count_independent_of_categories(self):
+        """Test the facets cost the same number of queries however many categories exist"""
+        refdata.all(Category)
+        with CaptureQueriesContext(connection) as few:
+            facets.facet_counts()
+        for i in range(10):
+            self.gamma.categories.add(Category.objects.create(name=f"Extra {i}"))
+        refdata.clear()
+        refdata.all(Category)
+        with CaptureQueriesContext(connection) as many:
+            counts = facets.facet_counts()
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(counts['categories']), 13)
+
+    def test_counts_cached_until_change(self):
+        """Test facet counts are cached and refreshed when projects change"""
+        self.get()
+        with CaptureQueriesContext(connection) as queries:
+            facets.cached_facet_counts()
+        self.assertFalse(any('GROUP BY' in q['sql'] for q in queries.captured_queries))
+        Project.objects.create(name="Epsilon", description="New")
+        self.assertEqual(self.get()['facets']['total'], 5)
+
+
 class URLTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", password="test123", is_staff=True)
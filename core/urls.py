@@ -8,7 +8,13 @@ app_name = 'core'
 urlpatterns = [
     path('', views.home_view, name='home'),
     path('datasciencepage/', views.datasciencepage, name='datasciencepage'),
+    path('datasets/', views.dataset_list, name='dataset_list'),
+    path('datasets/upload/', views.upload_dataset, name='upload_dataset'),
+    path('datasets/<int:dataset_id>/download/', views.download_dataset, name='download_dataset'),
+    path('datasets/<int:dataset_id>/preview/', views.dataset_preview, name='dataset_preview'),
+    path('datasets/<int:dataset_id>/delete/', views.delete_dataset, name='delete_dataset'),
     path('profile/edit/', views.profile_edit, name='profile_edit'),
+    path('ready/', views.ready, name='ready'),
 
     # Auth routes
     path('login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
@@ -20,10 +26,20 @@ urlpatterns = [
 
     # Project routes
     path("projects/", views.project_list, name="project_list"),
+    path("projects/<int:project_id>/", views.project_detail, name="project_detail"),
+    path("projects/recommended/", views.recommended_projects, name="recommended_projects"),
+    path("projects/<int:project_id>/challenge/", views.challenge_detail, name="challenge_detail"),
+    path("projects/<int:project_id>/challenge/submit/", views.submit_predictions, name="submit_predictions"),
+    path("projects/<int:project_id>/challenge/setup/", views.setup_challenge, name="setup_challenge"),
     path("projects/apply/<int:project_id>/", views.apply_to_project, name="apply_to_project"),
 
     # Course routes
     path("courses/", views.courses_list, name="courses_list"),
+    path("courses/recommended/", views.recommended_courses, name="recommended_courses"),
+    path("courses/<int:course_id>/", views.course_detail, name="course_detail"),
+    path("courses/<int:course_id>/related/", views.related_courses, name="related_courses"),
+    path("courses/<int:course_id>/enroll/", views.enroll_course, name="enroll_course"),
+    path("courses/<int:course_id>/cancel/", views.cancel_enrollment, name="cancel_enrollment"),
     path("staff/courses/add/", views.add_course, name="add_course"),
     path("staff/courses/edit/<int:course_id>/", views.edit_course, name="edit_course"),
     path("staff/courses/delete/<int:course_id>/", views.delete_course, name="delete_course"),
@@ -36,6 +52,12 @@ urlpatterns = [
     # Staff routes
     path('projects/mentor/<int:project_id>/', views.mentor_project, name='mentor_project'),
     path('projects/unmentor/<int:project_id>/', views.unmentor_project, name='unmentor_project'),
+    path('staff/cache/stats/', views.cache_stats, name='cache_stats'),
+    path('staff/export/<str:kind>/', views.export_data, name='export_data'),
+    path('staff/inbox/', views.mentor_inbox, name='mentor_inbox'),
+    path('staff/analytics/', views.analytics_data, name='analytics_data'),
+    path('staff/jobs/', views.job_status, name='job_status'),
+    path('staff/jobs/<int:job_id>/retry/', views.retry_job, name='retry_job'),
 
     # Admin routes
     path('admin/projects/add/', views.add_project, name='add_project'),
@@ -43,6 +65,8 @@ urlpatterns = [
     path('admin/projects/delete/<int:project_id>/', views.delete_project, name='delete_project'),
     path('admin/users/', views.admin_manage_users, name='admin_manage_users'),
     path('admin/users/assign/<int:user_id>/', views.assign_user_to_project, name='assign_user_to_project'),
+    path('admin/users/assign/bulk/', views.bulk_assign_users, name='bulk_assign_users'),
+    path('autocomplete/<str:kind>/', views.autocomplete_search, name='autocomplete'),
     path('admin/users/delete/<int:user_id>/', views.delete_user, name='delete_user'),
     path('admin/users/change-role/<int:user_id>/', views.change_user_role, name='change_user_role'),
 ]
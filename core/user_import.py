@@ -0,0 +1,194 @@
+"""
+Bulk user import from a CSV of username, email, role and optional password.
+
+Rows are read in chunks and checked against the usernames and emails loaded
+once up front. Password hashing, the expensive part, is spread over a
+ProcessPoolExecutor with a few chunks in flight while the previous ones are
+inserted; rows without a password get an unusable one and a password-reset
+token instead. Users and their profiles are written with bulk_create().
+"""
+import csv
+import time
+from collections import deque
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import autocomplete, jobs
+from .invalidation import bus
+from .models import UserProfile
+from .signals import MODEL_NAMESPACES
+
+CHUNK_SIZE = 500
+
+# Passwords per task sent to a hashing process
+HASH_BATCH_SIZE = 20
+
+# Chunks being hashed while an earlier one is inserted
+CHUNKS_IN_FLIGHT = 2
+
+# (is_staff, is_superuser) for each role, as in change_user_role
+ROLE_FLAGS = {
+    'user': (False, False),
+    'staff': (True, False),
+    'admin': (True, True),
+}
+
+MAX_ERRORS = 20
+
+
+class UserImportError(ValueError):
+    pass
+
+
+def hash_passwords(passwords):
+    """Hash a list of passwords; None gives an unusable password."""
+    return [make_password(password) for password in passwords]
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+        self.tokens = []
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        return self.created / self.seconds if self.seconds else 0.0
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"Line {line}: {message}")
+
+
+def read_rows(stream, default_role='user'):
+    """Yield (line, username, email, role, password) from a CSV stream."""
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames or not {'username', 'email'} <= set(reader.fieldnames):
+        raise UserImportError("CSV must have 'username' and 'email' columns.")
+    for line, row in enumerate(reader, start=2):
+        yield (
+            line,
+            (row.get('username') or '').strip(),
+            (row.get('email') or '').strip(),
+            (row.get('role') or default_role).strip().lower(),
+            row.get('password') or None,
+        )
+
+
+def _known_identities():
+    usernames, emails = set(), set()
+    for username, email in User.objects.values_list('username', 'email').iterator(chunk_size=5000):
+        usernames.add(username.casefold())
+        if email:
+            emails.add(email.casefold())
+    return usernames, emails
+
+
+def _accepted_chunks(rows, report, chunk_size, require_password=False):
+    """Validate and deduplicate rows, yielding lists of at most chunk_size."""
+    usernames, emails = _known_identities()
+    chunk = []
+    for line, username, email, role, password in rows:
+        try:
+            User.username_validator(username)
+            if email:
+                validate_email(email)
+        except ValidationError as exc:
+            report.error(line, exc.messages[0])
+            continue
+        if role not in ROLE_FLAGS:
+            report.error(line, f"unknown role '{role}'.")
+            continue
+        if require_password and password is None:
+            report.error(line, "no password.")
+            continue
+        if username.casefold() in usernames or (email and email.casefold() in emails):
+            report.duplicates += 1
+            continue
+        usernames.add(username.casefold())
+        if email:
+            emails.add(email.casefold())
+        chunk.append((username, email, role, password))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(chunk, hashes, report):
+    users = []
+    for (username, email, role, password), hashed in zip(chunk, hashes):
+        is_staff, is_superuser = ROLE_FLAGS[role]
+        users.append(User(
+            username=username, email=email, password=hashed,
+            is_staff=is_staff, is_superuser=is_superuser,
+        ))
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # Backends that can't return ids from a bulk insert
+            ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        UserProfile.objects.bulk_create([UserProfile(user_id=user.pk) for user in users])
+
+    report.created += len(users)
+    for user, (_, _, _, password) in zip(users, chunk):
+        if password is None:
+            report.tokens.append((
+                user.username,
+                urlsafe_base64_encode(force_bytes(user.pk)),
+                default_token_generator.make_token(user),
+            ))
+
+
+def _insert_hashed(chunk, futures, report):
+    _insert(chunk, [hashed for future in futures for hashed in future.result()], report)
+
+
+def import_users(rows, workers=None, chunk_size=CHUNK_SIZE, require_password=False):
+    """
+    Create the users from read_rows() output and return an ImportReport.
+    With workers=0 passwords are hashed in this process. With
+    require_password, rows without a password are rejected instead of
+    getting a reset token.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    chunks = _accepted_chunks(rows, report, chunk_size, require_password)
+
+    if workers == 0:
+        for chunk in chunks:
+            _insert(chunk, hash_passwords([row[3] for row in chunk]), report)
+    else:
+        with jobs.process_pool(workers) as executor:
+            in_flight = deque()
+            for chunk in chunks:
+                passwords = [row[3] for row in chunk]
+                futures = [
+                    executor.submit(hash_passwords, passwords[start:start + HASH_BATCH_SIZE])
+                    for start in range(0, len(passwords), HASH_BATCH_SIZE)
+                ]
+                in_flight.append((chunk, futures))
+                if len(in_flight) >= CHUNKS_IN_FLIGHT:
+                    _insert_hashed(*in_flight.popleft(), report)
+            while in_flight:
+                _insert_hashed(*in_flight.popleft(), report)
+
+    if report.created:
+        # bulk_create() sends no signals
+        bus.publish(*MODEL_NAMESPACES[User], autocomplete.NAMESPACE)
+    report.seconds = time.perf_counter() - started
+    return report
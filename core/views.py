@@ -5,17 +5,31 @@ from django.contrib import messages
 from django.contrib.messages import get_messages
 from django.contrib.auth.forms import AuthenticationForm, PasswordResetForm
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_POST
-from django.db.models import Q
-from core.models import Project, Assignment, UserProfile, Application, Category, Course, ProgrammingLanguage
+from django.urls import reverse
+from django.utils import timezone
+from django.template.defaultfilters import filesizeformat
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.db.models.functions import Length, Substr
+from pathlib import Path
+from core.models import (
+    Project, Assignment, UserProfile, Application, Category, Challenge, Course, CourseEnrollment, ProgrammingLanguage,
+    Job, Dataset, DatasetProfile, DatasetQuota,
+)
 from django.contrib.admin.views.decorators import staff_member_required, user_passes_test
-from .forms import AssignUserForm, UserRegisterForm, ProjectForm, CourseForm, ChangePasswordForm, ChangeEmailForm, ChangeUsernameForm
+from . import (
+    analytics, autocomplete, bitmaps, caching, challenges, datasets, deletion, enrollments, exports, facets, jobs, notifications, profiling,
+    recommendations, refdata, similar_courses, warmup,
+)
+from .pagination import InvalidCursor, keyset_page
+from .assignments import LOOKUP_CHUNK_SIZE, bulk_assign, chunked
+from .forms import AssignUserForm, BulkAssignForm, ChallengeForm, DatasetForm, SubmissionForm, UserRegisterForm, ProjectForm, CourseForm, ChangePasswordForm, ChangeEmailForm, ChangeUsernameForm
 
 
 def password_reset_request(request):
@@ -39,8 +53,170 @@ def register_view(request):
     return render(request, 'core/register.html', {'form': form})
 
 
-def datasciencepage(request):
-    return render(request, 'core/data_science.html')
+def datasciencepage(request, dataset_form=None):
+    context = {}
+    if request.user.is_authenticated:
+        quota = DatasetQuota.objects.filter(user=request.user).first()
+        recent, next_cursor = keyset_page(
+            Dataset.objects.filter(project__deletion_pending=False).select_related('project', 'blob', 'uploaded_by'),
+            limit=DATASET_PAGE_SIZE,
+        )
+        context.update({
+            "datasets": recent,
+            "datasets_next_cursor": next_cursor,
+            "dataset_form": dataset_form or DatasetForm(projects=uploadable_projects(request.user)),
+            "challenges": Challenge.objects.filter(project__deletion_pending=False).select_related('project')
+            .order_by('-created_at')[:CHALLENGE_LIST_SIZE],
+            "quota": {
+                "used": quota.used_bytes if quota else 0,
+                "files": quota.files if quota else 0,
+                "limit": datasets.quota_bytes(),
+            },
+        })
+    if request.user.is_authenticated and is_staff_user(request.user):
+        analytics.schedule_refresh()
+        summary = analytics.summary()
+        context.update({
+            "analytics": summary,
+            "busiest_day": max(row['applications'] for row in summary['per_day']) or 1,
+        })
+    return render(request, 'core/data_science.html', context)
+
+
+DATASET_PAGE_SIZE = 20
+CHALLENGE_LIST_SIZE = 20
+DATASET_MAX_PAGE_SIZE = 100
+
+
+def uploadable_projects(user):
+    """Projects the user may add datasets to: all for staff, else the ones they mentor or joined"""
+    projects = Project.objects.visible()
+    if is_staff_user(user):
+        return projects
+    return projects.filter(Q(mentors=user) | Q(assignment__user=user)).distinct()
+
+
+def dataset_row(dataset):
+    return {
+        "id": dataset.id,
+        "name": dataset.name,
+        "description": dataset.description,
+        "size": dataset.blob.size,
+        "sha256": dataset.blob.sha256,
+        "content_type": dataset.content_type,
+        "project": {"id": dataset.project_id, "name": dataset.project.name},
+        "uploaded_by": dataset.uploaded_by.username if dataset.uploaded_by else None,
+        "created_at": dataset.created_at.isoformat(),
+        "download_url": reverse("core:download_dataset", args=[dataset.id]),
+    }
+
+
+@login_required
+def dataset_list(request):
+    """Datasets of every visible project (or of ?project=), newest first, by cursor"""
+    rows = Dataset.objects.filter(project__deletion_pending=False).select_related('project', 'blob', 'uploaded_by')
+    project_filter = request.GET.get('project', '')
+    if project_filter.isdigit():
+        rows = rows.filter(project_id=int(project_filter))
+    try:
+        limit = min(max(int(request.GET.get('limit', DATASET_PAGE_SIZE)), 1), DATASET_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = DATASET_PAGE_SIZE
+    try:
+        page, next_cursor = keyset_page(rows, request.GET.get('cursor') or None, limit)
+    except InvalidCursor as exc:
+        return JsonResponse({"success": False, "message": str(exc)}, status=400)
+    return JsonResponse({"datasets": [dataset_row(dataset) for dataset in page], "next_cursor": next_cursor})
+
+
+@csrf_exempt
+@login_required
+def upload_dataset(request):
+    """
+    Stream an uploaded dataset to disk. The hashing upload handler has to be
+    installed before anything reads the body, so CSRF is checked after it.
+    """
+    return _with_streamed_upload(request, datasets.remaining(request.user), _upload_dataset)
+
+
+def _with_streamed_upload(request, limit, view, *args):
+    """Call `view(request, handler, *args)` with the hashing upload handler installed"""
+    handler = datasets.HashingUploadHandler(request, limit=limit)
+    request.upload_handlers = [handler]
+    try:
+        return view(request, handler, *args)
+    finally:
+        # Files nothing moved into storage (rejected form, failed CSRF check)
+        # are dropped; lists(), as values() gives only a field's last file
+        for _, uploads in request.FILES.lists():
+            for upload in uploads:
+                upload.close()
+                Path(upload.temporary_file_path()).unlink(missing_ok=True)
+
+
+@csrf_protect
+@require_POST
+def _upload_dataset(request, handler):
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    form = DatasetForm(request.POST, request.FILES, projects=uploadable_projects(request.user))
+    over_quota = handler.exceeded
+    if over_quota:
+        form.add_error('file', "This file would exceed your upload quota.")
+    elif form.is_valid():
+        try:
+            dataset = datasets.store(
+                form.cleaned_data['file'], form.cleaned_data['project'], request.user, form.cleaned_data['description'],
+            )
+        except datasets.QuotaExceeded as exc:
+            over_quota = True
+            form.add_error('file', str(exc))
+        else:
+            profiling.schedule(dataset)
+            if is_ajax:
+                return JsonResponse({"success": True, "dataset": dataset_row(dataset)})
+            return redirect("core:datasciencepage")
+    if is_ajax:
+        return JsonResponse({"success": False, "errors": form.errors}, status=413 if over_quota else 400)
+    return datasciencepage(request, dataset_form=form)
+
+
+@login_required
+def download_dataset(request, dataset_id):
+    """The dataset's file; a Range header gets 206 Partial Content"""
+    dataset = get_object_or_404(
+        Dataset.objects.select_related('blob').filter(project__deletion_pending=False), id=dataset_id,
+    )
+    return datasets.download_response(request, dataset)
+
+
+@login_required
+def dataset_preview(request, dataset_id):
+    """First rows, column types and statistics of a dataset, once its profile job has run"""
+    dataset = get_object_or_404(
+        Dataset.objects.filter(project__deletion_pending=False).select_related('blob__profile'), id=dataset_id,
+    )
+    try:
+        profile = dataset.blob.profile
+    except DatasetProfile.DoesNotExist:
+        profile = profiling.schedule(dataset)
+    return JsonResponse(
+        {"status": profile.status, "profile": profile.data, "error": profile.error},
+        status=202 if profile.status == 'pending' else 200,
+    )
+
+
+@login_required
+@require_POST
+def delete_dataset(request, dataset_id):
+    """Uploaders and staff remove a dataset; its bytes are refunded to the uploader"""
+    dataset = get_object_or_404(Dataset.objects.select_related('blob'), id=dataset_id)
+    if dataset.uploaded_by_id != request.user.id and not is_staff_user(request.user):
+        return JsonResponse({"success": False, "message": "Not allowed"}, status=403)
+    name = dataset.name
+    datasets.delete(dataset)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({"success": True, "message": f"Dataset '{name}' deleted."})
+    return redirect("core:datasciencepage")
 
 
 @require_POST
@@ -63,7 +239,7 @@ def home_view(request):
     # Get mentor statistics for staff
     mentor_projects_count = 0
     if request.user.is_staff:
-        mentor_projects_count = Project.objects.filter(mentors=request.user).count()
+        mentor_projects_count = Project.objects.visible().filter(mentors=request.user).count()
 
     context = {
         'user_projects_count': user_projects_count,
@@ -112,6 +288,29 @@ def profile_edit(request):
     return render(request, 'core/profile_edit.html', context)
 
 
+# List endpoints only ship this many characters of a description; the full
+# text is served by the per-item detail endpoints.
+DESCRIPTION_EXCERPT_LENGTH = 200
+
+
+def with_description_excerpt(queryset):
+    """Replace the full description with an excerpt computed in SQL."""
+    return queryset.defer('description').annotate(
+        description_excerpt=Substr('description', 1, DESCRIPTION_EXCERPT_LENGTH),
+        description_length=Length('description'),
+    )
+
+
+def description_excerpt_payload(obj):
+    """JSON fields for an object annotated by with_description_excerpt()."""
+    truncated = (obj.description_length or 0) > DESCRIPTION_EXCERPT_LENGTH
+    excerpt = obj.description_excerpt or ''
+    return {
+        "description": excerpt.rstrip() + '…' if truncated else excerpt,
+        "description_truncated": truncated,
+    }
+
+
 def is_staff_user(user):
     return user.is_staff or user.is_superuser
 
@@ -120,139 +319,468 @@ def is_admin_user(user):
     return user.is_superuser
 
 
-@login_required
-def project_list(request):
-    projects = Project.objects.all().prefetch_related('categories')
+def user_role(user):
+    """Role name used to key cached payloads"""
+    if user.is_superuser:
+        return 'admin'
+    if user.is_staff:
+        return 'staff'
+    return 'user'
+
+
+def build_project_list_payload(search_query, category_filters, include_pending, flags=()):
+    """Project rows shared by every user of the same role (cached)"""
+    # Deactivated users, including those waiting for deletion, aren't listed
+    projects = with_description_excerpt(Project.objects.visible().with_flags()).prefetch_related(
+        'categories',
+        Prefetch('mentors', queryset=User.objects.filter(is_active=True)),
+        Prefetch('assignment_set', queryset=Assignment.objects.filter(user__is_active=True).select_related('user')),
+    )
+    if include_pending:
+        projects = projects.prefetch_related(Prefetch(
+            'application_set',
+            queryset=Application.objects.filter(status='pending', user__is_active=True).select_related('user'),
+            to_attr='pending_applications',
+        ))
+
+    # Search, categories (any of the selected ones) and flags
+    projects = facets.filter_projects(projects, search_query, category_filters, flags)
+
+    data = []
+    for p in projects:
+        # Pending applications are only shown to staff
+        pending_applications = [
+            {'username': app.user.username, 'application_id': app.id}
+            for app in getattr(p, 'pending_applications', [])
+        ]
+        data.append({
+            "id": p.id,
+            "name": p.name,
+            **description_excerpt_payload(p),
+            "categories": [{"id": c.id, "name": c.name} for c in p.categories.all()],
+            "participants": [
+                {'username': a.user.username, 'assignment_id': a.id} for a in p.assignment_set.all()
+            ],
+            "mentors": [{"username": m.username, "id": m.id} for m in p.mentors.all()],
+            "capacity": p.capacity,
+            "has_open_slots": p.has_open_slots,
+            "pending_applications": pending_applications,
+        })
+    return data
+
+
+def cached_project_list(search_query, category_filters, role, flags=()):
+    return caching.get_or_set(
+        'project_list',
+        [search_query, sorted(category_filters), role, sorted(flags)],
+        [caching.PROJECTS_TAG],
+        lambda: build_project_list_payload(search_query, category_filters, include_pending=role != 'user', flags=flags),
+    )
+
+
+def category_filter_fragment():
+    return caching.cached_fragment(
+        'category_filter', [], [caching.CATEGORIES_TAG],
+        'core/_category_filter.html', lambda: {"all_categories": refdata.categories()},
+    )
 
-    # Get all categories for the filter dropdown
-    all_categories = Category.objects.all()
 
-    # Filter by search query
+@login_required
+def project_list(request):
     search_query = request.GET.get('q', '')
-    if search_query:
-        projects = projects.filter(
-            Q(name__icontains=search_query) | Q(description__icontains=search_query)
-        )
-
-    # Filter by multiple categories if provided
     category_filters = request.GET.getlist('category')
-    if category_filters:
-        # Show projects that have at least one of the selected categories
-        projects = projects.filter(categories__id__in=category_filters).distinct()
+    flags = facets.parse_flags(request.GET.getlist('flag'))
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        user = request.user
+        projects = cached_project_list(search_query, category_filters, user_role(user), flags)
+
+        # Per-user state is looked up once for all rows
+        user_statuses = dict(Application.objects.filter(user=user).values_list('project_id', 'status'))
+        assigned_project_ids = set(Assignment.objects.filter(user=user).values_list('project_id', flat=True))
+
         data = []
         for p in projects:
-            # Get accepted users (assignments) with assignment IDs
-            accepted_users = []
-            for a in p.assignment_set.all():
-                accepted_users.append({
-                    'username': a.user.username,
-                    'assignment_id': a.id
-                })
-
-            # Get pending applications with application IDs
-            pending_applications = []
-            if request.user.is_staff:
-                pending_apps = Application.objects.filter(project=p, status='pending')
-                for app in pending_apps:
-                    pending_applications.append({
-                        'username': app.user.username,
-                        'application_id': app.id
-                    })
-
-            # Check if current user has already applied or is accepted
-            user_application = Application.objects.filter(user=request.user, project=p).first()
-            user_is_assigned = Assignment.objects.filter(user=request.user, project=p).exists()
-
-            can_apply = not request.user.is_staff and not user_application and not user_is_assigned
-
-            # Get categories for this project
-            categories = [{"id": c.id, "name": c.name} for c in p.categories.all()]
-
-            # Get mentors for this project
-            mentors = [{"username": m.username, "id": m.id} for m in p.mentors.all()]
-
-            # Check if current user is mentoring this project
-            is_mentoring = request.user.is_staff and p.mentors.filter(id=request.user.id).exists()
-
+            user_status = user_statuses.get(p['id'])
             data.append({
-                "id": p.id,
-                "name": p.name,
-                "description": p.description,
-                "categories": categories,
-                "participants": accepted_users,
-                "mentors": mentors,
-                "is_mentoring": is_mentoring,
-                "pending_applications": pending_applications,
-                "can_apply": can_apply,
-                "is_staff": request.user.is_staff,
-                "is_admin": request.user.is_superuser,
-                "user_status": user_application.status if user_application else None,
+                **p,
+                "is_mentoring": user.is_staff and any(m['id'] == user.id for m in p['mentors']),
+                "can_apply": not user.is_staff and not user_status and p['id'] not in assigned_project_ids,
+                "is_staff": user.is_staff,
+                "is_admin": user.is_superuser,
+                "user_status": user_status,
             })
-        return JsonResponse({"projects": data})
+        return JsonResponse({
+            "projects": data,
+            "facets": facets.cached_facet_counts(search_query, category_filters, flags),
+        })
 
     return render(request, "core/project_list.html", {
-        "projects": projects,
-        "all_categories": all_categories,
+        "category_filter_html": category_filter_fragment(),
     })
 
 
 @login_required
-def courses_list(request):
-    courses = Course.objects.all().prefetch_related('programming_languages')
+def recommended_projects(request):
+    """Projects similar to the ones the user applied to or joined"""
+    try:
+        limit = min(int(request.GET.get('limit', recommendations.DEFAULT_LIMIT)), recommendations.TOP_K)
+    except ValueError:
+        limit = recommendations.DEFAULT_LIMIT
+    return JsonResponse({"projects": recommendations.for_user(request.user, limit)})
 
-    # Get all programming languages for the filter
-    all_languages = ProgrammingLanguage.objects.all()
 
-    # Filter by search query
-    search_query = request.GET.get('q', '')
-    if search_query:
-        courses = courses.filter(
-            Q(name__icontains=search_query) | Q(description__icontains=search_query)
+@login_required
+def project_detail(request, project_id):
+    """Full project record, fetched lazily when a row is expanded"""
+    project = get_object_or_404(
+        Project.objects.visible().prefetch_related(
+            'categories', Prefetch('mentors', queryset=User.objects.filter(is_active=True)),
+        ),
+        id=project_id,
+    )
+    return JsonResponse({
+        "id": project.id,
+        "name": project.name,
+        "description": project.description,
+        "categories": [{"id": c.id, "name": c.name} for c in project.categories.all()],
+        "mentors": [{"username": m.username, "id": m.id} for m in project.mentors.all()],
+        "created_at": project.created_at.isoformat(),
+    })
+
+
+SUBMISSION_HISTORY = 10
+
+
+def submission_row(submission):
+    return {
+        "id": submission.id,
+        "status": submission.status,
+        "score": submission.score,
+        "rows": submission.rows,
+        "error": submission.error,
+        "created_at": submission.created_at.isoformat(),
+        "scored_at": submission.scored_at.isoformat() if submission.scored_at else None,
+    }
+
+
+@login_required
+def challenge_detail(request, project_id, submission_form=None, challenge_form=None):
+    """A project's challenge: leaderboard, the user's submissions and, for staff, its setup"""
+    project = get_object_or_404(Project.objects.visible(), id=project_id)
+    challenge = Challenge.objects.filter(project=project).first()
+    is_staff = is_staff_user(request.user)
+    if challenge is None and not is_staff:
+        raise Http404("This project has no challenge.")
+    context = {"project": project, "challenge": challenge}
+    if challenge is not None:
+        rank, entry = challenges.standing(challenge, request.user)
+        context.update({
+            "leaderboard": challenges.leaderboard(challenge),
+            "rank": rank,
+            "best": entry,
+            "submissions": challenge.submissions.filter(user=request.user).order_by('-created_at')[:SUBMISSION_HISTORY],
+            "can_submit": challenges.is_participant(challenge, request.user),
+            "submission_form": submission_form or SubmissionForm(),
+        })
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        if challenge is None:
+            return JsonResponse({"challenge": None})
+        return JsonResponse({
+            "challenge": {
+                "id": challenge.id,
+                "metric": challenge.metric,
+                "higher_is_better": challenge.higher_is_better,
+                "status": challenge.status,
+                "rows": challenge.truth_rows,
+                "closes_at": challenge.closes_at.isoformat() if challenge.closes_at else None,
+            },
+            "leaderboard": context["leaderboard"],
+            "rank": context["rank"],
+            "submissions": [submission_row(submission) for submission in context["submissions"]],
+        })
+    if is_staff:
+        context["challenge_form"] = challenge_form or ChallengeForm(instance=challenge)
+    return render(request, 'core/challenge.html', context)
+
+
+@csrf_exempt
+@login_required
+def submit_predictions(request, project_id):
+    """Stream a participant's predictions to disk and queue their scoring"""
+    return _with_streamed_upload(request, challenges.max_submission_size(), _submit_predictions, project_id)
+
+
+@csrf_protect
+@require_POST
+def _submit_predictions(request, handler, project_id):
+    challenge = get_object_or_404(Challenge.objects.filter(project__deletion_pending=False), project_id=project_id)
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    form = SubmissionForm(request.POST, request.FILES)
+    status = 400
+    if handler.exceeded:
+        status = 413
+        form.add_error('file', f"Submissions are limited to {filesizeformat(challenges.max_submission_size())}.")
+    elif form.is_valid():
+        try:
+            submission = challenges.submit(challenge, request.user, form.cleaned_data['file'])
+        except challenges.SubmissionRejected as exc:
+            status = 403
+            form.add_error('file', str(exc))
+        else:
+            if is_ajax:
+                return JsonResponse({"success": True, "submission": submission_row(submission)}, status=202)
+            messages.success(request, "Submission received; it will be scored shortly.")
+            return redirect("core:challenge_detail", project_id=project_id)
+    if is_ajax:
+        return JsonResponse({"success": False, "errors": form.errors}, status=status)
+    return challenge_detail(request, project_id, submission_form=form)
+
+
+@csrf_exempt
+@login_required
+@user_passes_test(is_staff_user)
+def setup_challenge(request, project_id):
+    """Create or replace a project's challenge from an uploaded ground truth"""
+    return _with_streamed_upload(request, challenges.max_submission_size(), _setup_challenge, project_id)
+
+
+@csrf_protect
+@require_POST
+def _setup_challenge(request, handler, project_id):
+    project = get_object_or_404(Project.objects.visible(), id=project_id)
+    form = ChallengeForm(request.POST, request.FILES, instance=Challenge.objects.filter(project=project).first())
+    if handler.exceeded:
+        form.add_error('ground_truth', f"Files are limited to {filesizeformat(challenges.max_submission_size())}.")
+    elif form.is_valid():
+        data = form.cleaned_data
+        challenges.setup(
+            project, data['ground_truth'], data['metric'], data['id_column'], data['target_column'], data['closes_at'],
         )
+        messages.success(request, "Challenge saved; the ground truth is being prepared.")
+        return redirect("core:challenge_detail", project_id=project.id)
+    return challenge_detail(request, project_id, challenge_form=form)
 
-    # Filter by multiple programming languages if provided
-    language_filters = request.GET.getlist('language')
-    if language_filters:
-        # Show courses that have at least one of the selected languages
-        courses = courses.filter(programming_languages__id__in=language_filters).distinct()
 
-    # Filter by level if provided
+def parse_course_filters(language_filters, level_filter):
+    """Language ids and level as ints; values that aren't numbers are ignored."""
+    language_ids = [int(value) for value in language_filters if str(value).isdigit()]
+    level = int(level_filter) if str(level_filter).isdigit() else None
+    return language_ids, level
+
+
+def build_courses_list_payload(search_query, language_filters, level_filter):
+    """Course rows for a filter set (cached)"""
+    language_ids, level = parse_course_filters(language_filters, level_filter)
+    index = bitmaps.course_index()
+    within = index.search(search_query) if search_query else None
+    mask = index.match(language_ids, level, within)
+
+    courses = with_description_excerpt(Course.objects.all()).prefetch_related('programming_languages')
+    if mask == index.all:
+        rows = list(courses)
+    else:
+        # Only the matching rows are read, in chunks small enough for IN (...)
+        ids, found = index.ids_of(mask), {}
+        for chunk in chunked(ids, LOOKUP_CHUNK_SIZE):
+            found.update((c.id, c) for c in courses.filter(id__in=chunk))
+        rows = [found[pk] for pk in ids if pk in found]
+
+    data = []
+    for c in rows:
+        # Get programming languages for this course
+        languages = [{"id": lang.id, "name": lang.name} for lang in c.programming_languages.all()]
+
+        data.append({
+            "id": c.id,
+            "name": c.name,
+            **description_excerpt_payload(c),
+            "level": c.level,
+            "level_display": c.get_level_display(),
+            "programming_languages": languages,
+        })
+    return data
+
+
+def build_course_facets(search_query, language_filters, level_filter):
+    language_ids, level = parse_course_filters(language_filters, level_filter)
+    index = bitmaps.course_index()
+    within = index.search(search_query) if search_query else None
+    counts = index.facets(language_ids, level, within)
+    # Every level and language gets a count, including empty ones
+    counts["levels"] = {lvl: counts["levels"].get(lvl, 0) for lvl, _ in Course.LEVEL_CHOICES}
+    counts["languages"] = {
+        lang.pk: counts["languages"].get(lang.pk, 0) for lang in refdata.programming_languages()
+    }
+    return counts
+
+
+def cached_courses_list(search_query, language_filters, level_filter, role):
+    return caching.get_or_set(
+        'courses_list',
+        [search_query, sorted(language_filters), level_filter, role],
+        [caching.COURSES_TAG],
+        lambda: build_courses_list_payload(search_query, language_filters, level_filter),
+    )
+
+
+def cached_course_facets(search_query, language_filters, level_filter):
+    return caching.get_or_set(
+        'course_facets',
+        [search_query, sorted(language_filters), level_filter],
+        [caching.COURSES_TAG],
+        lambda: build_course_facets(search_query, language_filters, level_filter),
+        timeout=facets.FACET_TIMEOUT,
+    )
+
+
+def language_filter_fragment():
+    return caching.cached_fragment(
+        'language_filter', [], [caching.LANGUAGES_TAG],
+        'core/_language_filter.html', lambda: {"all_languages": refdata.programming_languages()},
+    )
+
+
+@login_required
+def courses_list(request):
+    search_query = request.GET.get('q', '')
+    language_filters = request.GET.getlist('language')
     level_filter = request.GET.get('level', '')
-    if level_filter:
-        courses = courses.filter(level=level_filter)
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        data = []
-        for c in courses:
-            # Get programming languages for this course
-            languages = [{"id": lang.id, "name": lang.name} for lang in c.programming_languages.all()]
-
-            data.append({
-                "id": c.id,
-                "name": c.name,
-                "description": c.description,
-                "level": c.level,
-                "level_display": c.get_level_display(),
-                "programming_languages": languages,
-                "is_staff": request.user.is_staff,
-            })
-        return JsonResponse({"courses": data})
+        courses = cached_courses_list(search_query, language_filters, level_filter, user_role(request.user))
+        data = [{**c, "is_staff": request.user.is_staff} for c in courses]
+        return JsonResponse({
+            "courses": data,
+            "facets": cached_course_facets(search_query, language_filters, level_filter),
+        })
 
     return render(request, "core/courses_list.html", {
-        "courses": courses,
-        "all_languages": all_languages,
+        "language_filter_html": language_filter_fragment(),
     })
 
 
+def ready(request):
+    """Readiness probe: 503 until this worker has finished warming up"""
+    status = warmup.state.snapshot()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def cache_stats(request):
+    """Hit/miss counters of this worker's catalog cache"""
+    return JsonResponse(caching.stats.snapshot())
+
+
+@login_required
+def course_detail(request, course_id):
+    """Full course record, fetched lazily when a row is expanded"""
+    course = get_object_or_404(
+        Course.objects.select_related('seats').prefetch_related('programming_languages'), id=course_id,
+    )
+    enrollment = CourseEnrollment.objects.filter(course=course, user=request.user).first()
+    return JsonResponse({
+        "id": course.id,
+        "name": course.name,
+        "description": course.description,
+        "level": course.level,
+        "level_display": course.get_level_display(),
+        "programming_languages": [{"id": lang.id, "name": lang.name} for lang in course.programming_languages.all()],
+        "created_at": course.created_at.isoformat(),
+        "capacity": course.capacity,
+        "seats_left": course.seats.seats_left if course.capacity is not None and hasattr(course, 'seats') else None,
+        "enrollment": enrollment_row(enrollment) if enrollment else None,
+    })
+
+
+def enrollment_row(enrollment):
+    return {
+        "course": enrollment.course_id,
+        "status": enrollment.status,
+        "position": enrollments.waitlist_position(enrollment),
+        "created_at": enrollment.created_at.isoformat(),
+    }
+
+
+@login_required
+@require_POST
+def enroll_course(request, course_id):
+    """Take a seat in the course, or join its waitlist when it is full"""
+    course = get_object_or_404(Course, id=course_id)
+    enrollment = enrollments.enroll(course, request.user)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({"success": True, "enrollment": enrollment_row(enrollment)})
+    if enrollment.status == 'enrolled':
+        messages.success(request, f"You are enrolled in {course.name}.")
+    else:
+        messages.info(request, f"{course.name} is full; you are number {enrollments.waitlist_position(enrollment)} on the waitlist.")
+    return redirect("core:courses_list")
+
+
+@login_required
+@require_POST
+def cancel_enrollment(request, course_id):
+    """Leave a course or its waitlist; a freed seat goes to the head of the waitlist"""
+    course = get_object_or_404(Course, id=course_id)
+    if not enrollments.cancel(course, request.user):
+        return JsonResponse({"success": False, "message": "You are not enrolled in this course."}, status=404)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({"success": True})
+    messages.success(request, f"You left {course.name}.")
+    return redirect("core:courses_list")
+
+
+def _course_suggestions(ranked):
+    """Rows of the ranked (course id, score) pairs, in rank order."""
+    courses = Course.objects.in_bulk([course_id for course_id, _ in ranked])
+    return [
+        {
+            "id": course_id,
+            "name": courses[course_id].name,
+            "level": courses[course_id].level,
+            "level_display": courses[course_id].get_level_display(),
+            "score": round(score, 4),
+        }
+        for course_id, score in ranked
+        if course_id in courses
+    ]
+
+
+def _suggestion_limit(request):
+    try:
+        return max(1, min(int(request.GET.get('limit', similar_courses.DEFAULT_LIMIT)), similar_courses.MAX_LIMIT))
+    except ValueError:
+        return similar_courses.DEFAULT_LIMIT
+
+
+@login_required
+def related_courses(request, course_id):
+    """Courses whose text is closest to this one, nearest level first"""
+    ranked = similar_courses.index.similar(course_id, _suggestion_limit(request))
+    if ranked is None:
+        raise Http404("No such course")
+    return JsonResponse({"courses": _course_suggestions(ranked)})
+
+
+@login_required
+def recommended_courses(request):
+    """Courses related to the projects the user is assigned to"""
+    level = request.GET.get('level', '')
+    level = int(level) if level.isdigit() else None
+    ranked = similar_courses.for_user(request.user, _suggestion_limit(request), level)
+    return JsonResponse({"courses": _course_suggestions(ranked)})
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def add_course(request):
     if request.method == "POST":
         form = CourseForm(request.POST)
         if form.is_valid():
-            form.save()
+            course = form.save()
+            if course.capacity is not None:
+                enrollments.sync_capacity(course)
 #            messages.success(request, "Course added successfully.")
             return redirect("core:courses_list")
     else:
@@ -268,6 +796,8 @@ def edit_course(request, course_id):
         form = CourseForm(request.POST, instance=course)
         if form.is_valid():
             form.save()
+            if 'capacity' in form.changed_data:
+                enrollments.sync_capacity(course)
 #            messages.success(request, "Course updated successfully.")
             return redirect("core:courses_list")
     else:
@@ -300,7 +830,7 @@ def apply_to_project(request, project_id):
     if request.user.is_staff:
         return JsonResponse({"success": False, "message": "Staff cannot apply"}, status=403)
 
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.visible(), id=project_id)
 
     # Check if already applied or assigned
     if Application.objects.filter(user=request.user, project=project).exists():
@@ -320,11 +850,14 @@ def accept_application(request, application_id):
     application = get_object_or_404(Application, id=application_id)
 
     if application.status == 'pending':
-        application.status = 'accepted'
-        application.save()
-
-        # Create assignment
-        Assignment.objects.get_or_create(user=application.user, project=application.project)
+        with transaction.atomic():
+            application.status = 'accepted'
+            application.decided_at = timezone.now()
+            application.save()
+
+            # Create assignment
+            Assignment.objects.get_or_create(user=application.user, project=application.project)
+            notifications.application_decided(application)
         #messages.success(request, f"{application.user.username} has been accepted to {application.project.name}")
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -339,8 +872,11 @@ def reject_application(request, application_id):
     application = get_object_or_404(Application, id=application_id)
 
     if application.status == 'pending':
-        application.status = 'rejected'
-        application.save()
+        with transaction.atomic():
+            application.status = 'rejected'
+            application.decided_at = timezone.now()
+            application.save()
+            notifications.application_decided(application)
         #messages.success(request, f"Application from {application.user.username} has been rejected")
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -390,7 +926,7 @@ def add_project(request):
 @login_required
 @user_passes_test(is_staff_user)
 def edit_project(request, project_id):
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.visible(), id=project_id)
     if request.method == "POST":
         form = ProjectForm(request.POST, instance=project)
         if form.is_valid():
@@ -405,51 +941,81 @@ def edit_project(request, project_id):
 @login_required
 @user_passes_test(is_staff_user)
 def delete_project(request, project_id):
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.visible(), id=project_id)
     if request.method == "POST":
         project_name = project.name
-        project.delete()
+        # Hidden now, removed with its applications and assignments in the background
+        task = deletion.schedule_deletion(project)
 
         # Check for AJAX request
         is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
         if is_ajax:
-            return JsonResponse({"success": True, "message": f"Project '{project_name}' deleted."})
+            return JsonResponse({"success": True, "message": f"Project '{project_name}' deleted.", "task_id": task.id})
 
         #messages.success(request, "Project deleted.")
         return redirect("core:project_list")
     return redirect("core:project_list")
 
 
+MANAGE_USERS_PAGE_SIZE = 50
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def admin_manage_users(request):
-    user_profiles = UserProfile.objects.select_related("user").all()
-    return render(request, "core/admin_manage_users.html", {"user_profiles": user_profiles})
+    """
+    One page of users by username. The search box suggests users from the
+    autocomplete index; `q` narrows the list to a username or email prefix
+    and `user` to the suggestion picked.
+    """
+    user_profiles = (
+        UserProfile.objects.select_related("user").exclude(user_id__in=deletion.pending_ids(User))
+        .prefetch_related(Prefetch('user__assignment_set', queryset=Assignment.objects.select_related('project')))
+    )
+    search_query = request.GET.get('q', '').strip()
+    if search_query:
+        user_profiles = user_profiles.filter(
+            Q(user__username__istartswith=search_query) | Q(user__email__istartswith=search_query)
+        )
+    user_filter = request.GET.get('user', '')
+    if user_filter.isdigit():
+        user_profiles = user_profiles.filter(user_id=int(user_filter))
+    after = request.GET.get('after', '')
+    if after:
+        user_profiles = user_profiles.filter(user__username__gt=after)
+    page = list(user_profiles.order_by('user__username')[:MANAGE_USERS_PAGE_SIZE + 1])
+    next_after = page[MANAGE_USERS_PAGE_SIZE - 1].user.username if len(page) > MANAGE_USERS_PAGE_SIZE else None
+    return render(request, "core/admin_manage_users.html", {
+        "user_profiles": page[:MANAGE_USERS_PAGE_SIZE],
+        "search_query": search_query,
+        "next_after": next_after,
+    })
 
 
 @login_required
 @user_passes_test(is_staff_user)
 def assign_user_to_project(request, user_id):
-    user = get_object_or_404(User, id=user_id)
+    user = get_object_or_404(User.objects.filter(is_active=True), id=user_id)
 
     if request.method == "POST":
         project_id = request.POST.get("project_id")
         if project_id:
-            project = get_object_or_404(Project, id=project_id)
+            project = get_object_or_404(Project.objects.visible(), id=project_id)
             Assignment.objects.get_or_create(user=user, project=project)
             #messages.success(request, f"{user.username} assigned to {project.name}.")
             return redirect("core:admin_manage_users")
 
     # Get all projects with search capability
     search_query = request.GET.get('q', '')
-    projects = Project.objects.all()
+    projects = Project.objects.visible()
 
     if search_query:
         projects = projects.filter(name__icontains=search_query)
 
-    # Get projects user is already assigned to
-    assigned_project_ids = Assignment.objects.filter(user=user).values_list('project_id', flat=True)
+    # Get projects user is already assigned to (a set, so the template's
+    # membership test doesn't re-run a query per row)
+    assigned_project_ids = set(Assignment.objects.filter(user=user).values_list('project_id', flat=True))
 
     return render(request, "core/assign_user_to_project.html", {
         "user": user,
@@ -459,18 +1025,191 @@ def assign_user_to_project(request, user_id):
     })
 
 
+@login_required
+@user_passes_test(is_staff_user)
+def bulk_assign_users(request):
+    """Assign many users to many projects in one submission"""
+    result = None
+    if request.method == "POST":
+        form = BulkAssignForm(request.POST, request.FILES)
+        if form.is_valid():
+            created, existing = bulk_assign(form.pairs)
+            result = {"created": created, "already_existing": existing}
+
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({"success": True, **result})
+            messages.success(request, f"{created} assignment(s) created, {existing} already existed.")
+            form = BulkAssignForm()
+        elif request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({"success": False, "errors": form.errors.get_json_data()}, status=400)
+    else:
+        form = BulkAssignForm()
+    return render(request, "core/bulk_assign.html", {"form": form, "result": result})
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def autocomplete_search(request, kind):
+    """Top-K prefix matches for project names or usernames/emails"""
+    index = autocomplete.indexes.get(kind)
+    if index is None:
+        return JsonResponse({"success": False, "message": "Unknown index"}, status=404)
+
+    prefix = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT)), autocomplete.MAX_LIMIT)
+    except ValueError:
+        limit = autocomplete.DEFAULT_LIMIT
+    results = index.search(prefix, limit) if prefix else []
+    return JsonResponse({"results": results})
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def export_data(request, kind):
+    """Stream projects, applications or assignments as CSV or NDJSON"""
+    fmt = request.GET.get('format', 'csv')
+    filters = {name: request.GET.get(name) for name in ('project', 'status', 'since', 'until')}
+    try:
+        content = exports.export(kind, fmt, **filters)
+    except exports.ExportError as exc:
+        return JsonResponse({"success": False, "message": str(exc)}, status=400)
+
+    response = StreamingHttpResponse(content, content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
+
+
+INBOX_PAGE_SIZE = 50
+INBOX_MAX_PAGE_SIZE = 200
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def mentor_inbox(request):
+    """Pending applications to every project the current user mentors, newest first"""
+    pending = Application.objects.filter(
+        status='pending',
+        project__mentors=request.user,
+        project__deletion_pending=False,
+        user__is_active=True,
+    )
+    # One GROUP BY for the per-project badges, independent of the page shown
+    per_project = list(
+        pending.values('project_id', 'project__name').annotate(n=Count('id')).order_by('project__name')
+    )
+
+    project_filter = request.GET.get('project', '')
+    if project_filter.isdigit():
+        pending = pending.filter(project_id=int(project_filter))
+    try:
+        limit = min(max(int(request.GET.get('limit', INBOX_PAGE_SIZE)), 1), INBOX_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = INBOX_PAGE_SIZE
+    cursor = request.GET.get('cursor') or None
+    try:
+        applications, next_cursor = keyset_page(
+            pending.select_related('user', 'project').only(
+                'id', 'created_at', 'user__username', 'user__email', 'project__name',
+            ),
+            cursor, limit,
+        )
+    except InvalidCursor as exc:
+        return JsonResponse({"success": False, "message": str(exc)}, status=400)
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.GET.get('format') == 'json':
+        return JsonResponse({
+            "total": sum(row['n'] for row in per_project),
+            "projects": [
+                {"id": row['project_id'], "name": row['project__name'], "pending": row['n']}
+                for row in per_project
+            ],
+            "applications": [
+                {"id": app.id, "created_at": app.created_at.isoformat(),
+                 "user": {"id": app.user_id, "username": app.user.username, "email": app.user.email},
+                 "project": {"id": app.project_id, "name": app.project.name}}
+                for app in applications
+            ],
+            "next_cursor": next_cursor,
+        })
+    return render(request, "core/mentor_inbox.html", {
+        "applications": applications,
+        "per_project": per_project,
+        "total": sum(row['n'] for row in per_project),
+        "project_filter": project_filter,
+        "next_cursor": next_cursor,
+    })
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def analytics_data(request):
+    """Club analytics for the last `days` days, read from the daily rollups"""
+    try:
+        days = min(max(int(request.GET.get('days', analytics.DEFAULT_DAYS)), 1), analytics.MAX_DAYS)
+    except ValueError:
+        days = analytics.DEFAULT_DAYS
+    analytics.schedule_refresh()
+    return JsonResponse(analytics.summary(days))
+
+
+JOB_STATUS_PAGE_SIZE = 50
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def job_status(request):
+    """Background job counts and the most recent jobs"""
+    counts = dict.fromkeys(dict(Job.STATUS_CHOICES), 0)
+    counts.update(Job.objects.values_list('status').annotate(n=Count('id')).order_by())
+    status_filter = request.GET.get('status', '')
+    recent = Job.objects.defer('payload', 'result').order_by('-id')
+    if status_filter in counts:
+        recent = recent.filter(status=status_filter)
+    recent = recent[:JOB_STATUS_PAGE_SIZE]
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            "counts": counts,
+            "jobs": [
+                {"id": job.id, "name": job.name, "status": job.status, "attempts": job.attempts,
+                 "run_after": job.run_after.isoformat(), "error": job.error_summary}
+                for job in recent
+            ],
+        })
+    return render(request, "core/job_status.html", {
+        "counts": counts,
+        "jobs": recent,
+        "status_filter": status_filter,
+    })
+
+
+@login_required
+@user_passes_test(is_staff_user)
+@require_POST
+def retry_job(request, job_id):
+    """Queue a failed job again"""
+    retried = jobs.retry(job_id)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        if not retried:
+            return JsonResponse({"success": False, "message": "Only failed jobs can be retried"}, status=400)
+        return JsonResponse({"success": True, "message": "Job queued again"})
+    return redirect("core:job_status")
+
+
 @login_required
 @user_passes_test(is_admin_user)
 def delete_user(request, user_id):
     user = get_object_or_404(User, id=user_id)
     if request.method == "POST":
         username = user.username
-        user.delete()
+        # Deactivated now, removed with everything it owns in the background
+        task = deletion.schedule_deletion(user)
 
         # Check for AJAX request
         is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
         if is_ajax:
-            return JsonResponse({"success": True, "message": f"User '{username}' deleted successfully."})
+            return JsonResponse({"success": True, "message": f"User '{username}' deleted successfully.", "task_id": task.id})
 
     return redirect("core:admin_manage_users")
 
@@ -480,7 +1219,7 @@ def delete_user(request, user_id):
 @require_POST
 def mentor_project(request, project_id):
     """Staff can assign themselves as mentor to a project"""
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.visible(), id=project_id)
 
     # Add the current user as a mentor
     project.mentors.add(request.user)
@@ -496,7 +1235,7 @@ def mentor_project(request, project_id):
 @require_POST
 def unmentor_project(request, project_id):
     """Staff can remove themselves as mentor from a project"""
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project.objects.visible(), id=project_id)
 
     # Remove the current user as a mentor
     project.mentors.remove(request.user)
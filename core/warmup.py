@@ -0,0 +1,218 @@
+"""
+Cache prewarming for fresh workers.
+
+warm_caches() compiles the hot templates, loads the reference data, primes
+the first (unfiltered) page of the project and course lists for every role
+and reads the main tables and indexes so SQLite has them in its page cache.
+It runs in a background thread of each worker when CORE_WARMUP_ON_STARTUP
+is set (see project/wsgi.py); until it has finished, the /ready endpoint
+answers 503.
+
+The `warm_caches` management command and job run in a process of their own,
+so they only do the steps whose effect outlives that process (see
+warm_shared()): priming the list caches, which needs a cache backend shared
+between processes, and reading the indexes into the database's page cache.
+Templates and reference data are per process and are left to the workers.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.template.loader import get_template
+
+from . import facets, refdata
+from .invalidation import bus
+from .models import Application, Assignment, Category, Course, ProgrammingLanguage, Project
+
+logger = logging.getLogger(__name__)
+
+HOT_TEMPLATES = [
+    'core/base.html',
+    'core/home.html',
+    'core/project_list.html',
+    'core/courses_list.html',
+    'core/_category_filter.html',
+    'core/_language_filter.html',
+    'registration/login.html',
+]
+
+ROLES = ('user', 'staff', 'admin')
+
+HOT_MODELS = [User, Project, Application, Assignment, Course, Category, ProgrammingLanguage]
+
+# Cache backends that keep their entries in the process that wrote them
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class ProcessLocalCache(Exception):
+    pass
+
+
+def shared_cache():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+class WarmupState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.started_at = None
+        self.finished_at = None
+        self.steps = {}
+        self.error = None
+
+    @property
+    def ready(self):
+        # Workers that don't warm up on startup are ready straight away
+        return self._done.is_set() or not getattr(settings, 'CORE_WARMUP_ON_STARTUP', False)
+
+    def start(self):
+        with self._lock:
+            self._done.clear()
+            self.started_at = time.time()
+            self.finished_at = None
+            self.steps = {}
+            self.error = None
+
+    def record(self, step, seconds):
+        with self._lock:
+            self.steps[step] = round(seconds, 4)
+
+    def finish(self, error=None):
+        with self._lock:
+            self.finished_at = time.time()
+            self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'steps': dict(self.steps),
+                'error': self.error,
+            }
+
+
+state = WarmupState()
+
+
+def warm_templates():
+    for name in HOT_TEMPLATES:
+        get_template(name)
+
+
+def warm_reference_data():
+    refdata.categories()
+    refdata.programming_languages()
+
+
+def warm_lists():
+    from . import views
+
+    views.category_filter_fragment()
+    views.language_filter_fragment()
+    for role in ROLES:
+        views.cached_project_list('', [], role)
+        views.cached_courses_list('', [], '', role)
+    facets.cached_facet_counts()
+    views.cached_course_facets('', [], '')
+
+
+def index_columns(model):
+    """Column lists of the model's indexes: single fields, Meta.indexes and unique constraints."""
+    opts = model._meta
+    columns = [
+        (field.attname,) for field in opts.concrete_fields
+        if not field.primary_key and (field.db_index or field.unique)
+    ]
+    composite = [index.fields for index in opts.indexes if index.fields]
+    composite += [constraint.fields for constraint in opts.constraints if getattr(constraint, 'fields', None)]
+    composite += list(opts.unique_together)
+    for names in composite:
+        columns.append(tuple(opts.get_field(name.lstrip('-')).attname for name in names))
+    return list(dict.fromkeys(columns))
+
+
+def warm_indexes():
+    """Read every hot table and walk each of its indexes once."""
+    for model in HOT_MODELS:
+        model.objects.count()
+        for columns in index_columns(model):
+            # Ordered by and selecting only the indexed columns, so the index alone answers it
+            model.objects.order_by(*columns).values_list(*columns).first()
+
+
+STEPS = [
+    ('templates', warm_templates),
+    ('reference_data', warm_reference_data),
+    ('lists', warm_lists),
+    ('indexes', warm_indexes),
+]
+
+
+# Steps whose effect is visible to other processes
+SHARED_STEPS = ('lists', 'indexes')
+
+
+def warm_caches(steps=None):
+    """Run every warmup step (or the named ones), recording durations on `state`."""
+    state.start()
+    try:
+        # Record the current generations first so the first request's
+        # check doesn't drop what is loaded here
+        bus.check()
+        for name, step in STEPS:
+            if steps is not None and name not in steps:
+                continue
+            started = time.perf_counter()
+            step()
+            state.record(name, time.perf_counter() - started)
+    except Exception as exc:
+        logger.exception("Cache warmup failed")
+        state.finish(error=str(exc))
+        raise
+    state.finish()
+    return state.snapshot()
+
+
+def warm_shared():
+    """
+    Warm what the serving workers share with this process; refuses with a
+    process-local cache, where priming the lists here would reach no worker.
+    """
+    if not shared_cache():
+        raise ProcessLocalCache(
+            f"The default cache ({settings.CACHES['default']['BACKEND']}) is local to each process, so "
+            "warming it here doesn't reach the serving workers. Configure a shared cache backend, or set "
+            "CORE_WARMUP_ON_STARTUP to warm every worker as it starts."
+        )
+    return warm_caches(SHARED_STEPS)
+
+
+def start_background_warmup():
+    """Warm up in a daemon thread; /ready reports 503 until it is done."""
+
+    def run():
+        try:
+            warm_caches()
+        except Exception:
+            # Logged above; serve cold rather than never becoming ready
+            pass
+        finally:
+            from django.db import connection
+            connection.close()
+
+    state.start()
+    thread = threading.Thread(target=run, name='core-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -34,6 +34,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.InvalidationMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -66,9 +67,65 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Transactions take the write lock when they start, so concurrent
+        # writers (e.g. course enrollment) wait for it instead of failing
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+# ---------------------------
+# CACHE
+# ---------------------------
+# Catalog queries and fragments are cached with tag-based invalidation
+# (see core/caching.py). The file-based backend works as well:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'core-catalog',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
     }
 }
 
+# Process-local caches are invalidated across workers through generations
+# stored in the database (core/invalidation.py). When all workers run on one
+# host, a shared memory-mapped file avoids the per-request query:
+# CORE_INVALIDATION_MMAP_PATH = BASE_DIR / 'cache-generations'
+
+# Warm caches in every worker at startup (project/wsgi.py); /ready reports
+# 503 until warmup has finished. `manage.py warm_caches` runs in a process of
+# its own, so it only primes the list caches with a shared backend (such as
+# the file-based one above) and refuses with LocMemCache.
+CORE_WARMUP_ON_STARTUP = False
+
+# Background jobs (core/jobs.py) are run by `manage.py run_workers`, with this
+# many threads unless --threads is given. Exports written by jobs go to
+# CORE_EXPORT_DIR.
+CORE_JOB_WORKER_THREADS = 2
+CORE_EXPORT_DIR = BASE_DIR / 'exports'
+
+# Dataset library (core/datasets.py): files are stored under CORE_DATASET_DIR
+# by content hash, and each user may upload CORE_DATASET_QUOTA bytes. Behind
+# nginx or Apache, set CORE_DATASET_SENDFILE to 'X-Accel-Redirect' (with the
+# internal location CORE_DATASET_ACCEL_PREFIX) or 'X-Sendfile' to let the
+# front server send the files.
+CORE_DATASET_DIR = BASE_DIR / 'datasets'
+CORE_DATASET_QUOTA = 1024 ** 3
+CORE_DATASET_SENDFILE = None
+# CORE_DATASET_ACCEL_PREFIX = '/protected/datasets/'
+
+# Prediction challenges (core/challenges.py): submissions up to
+# CORE_SUBMISSION_MAX_SIZE bytes, CORE_DAILY_SUBMISSIONS per participant a
+# day, scored by CORE_SCORING_WORKERS processes (None: one per CPU, 0: in the
+# job worker itself).
+CORE_SUBMISSION_MAX_SIZE = 1024 ** 3
+CORE_DAILY_SUBMISSIONS = 5
+CORE_SCORING_WORKERS = None
+
 # ---------------------------
 # PASSWORD VALIDATION
 # ---------------------------
@@ -106,6 +163,10 @@ LOGOUT_REDIRECT_URL = '/'
 # ---------------------------
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Seconds a notification waits in the outbox (core/notifications.py) so that
+# several decisions for one user go out as one email
+CORE_NOTIFICATION_DELAY = 30
+
 # ---------------------------
 # DEFAULT PRIMARY KEY
 # ---------------------------
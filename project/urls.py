@@ -1,5 +1,8 @@
+from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path('', include('core.urls')),
+    # core.urls already owns the admin/ prefix for the in-app admin views
+    path('django-admin/', admin.site.urls),
 ]
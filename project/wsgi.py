@@ -13,3 +13,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# Optional warmup hook: each worker primes its caches in the background and
+# /ready answers 503 until it is done.
+from django.conf import settings
+
+if getattr(settings, 'CORE_WARMUP_ON_STARTUP', False):
+    from core.warmup import start_background_warmup
+
+    start_background_warmup()
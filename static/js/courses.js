@@ -12,6 +12,7 @@ function getCookie(name) {
 const csrftoken = getCookie('csrftoken');
 let currentCourses = [];
 let sortOrder = { column: null, asc: true };
+const courseDescriptions = new Map();
 
 async function fetchCourses() {
     const q = document.getElementById('q')?.value || '';
@@ -43,6 +44,21 @@ async function fetchCourses() {
     const data = await rsp.json();
     currentCourses = data.courses;
     renderCourses(currentCourses);
+    renderFacets(data.facets);
+}
+
+function renderFacets(facets) {
+    if (!facets) return;
+    document.querySelectorAll('.language-checkbox + label .facet-count').forEach(badge => {
+        badge.textContent = facets.languages[badge.dataset.facet] ?? 0;
+    });
+    // Level counts ignore the selected level, so "All Levels" is their sum
+    const allLevels = Object.values(facets.levels).reduce((a, b) => a + b, 0);
+    document.querySelectorAll('#levelFilter option').forEach(option => {
+        option.dataset.label = option.dataset.label || option.textContent;
+        const count = option.value ? facets.levels[option.value] ?? 0 : allLevels;
+        option.textContent = `${option.dataset.label} (${count})`;
+    });
 }
 
 function renderCourses(courses) {
@@ -77,17 +93,23 @@ function renderCourses(courses) {
         const levelHTML = `<span class="badge ${levelBadgeClass}">${c.level_display}</span>`;
 
         // Build actions column
-        let actionsHTML = '';
+        let actionsHTML = `<button class="btn btn-sm btn-outline-primary enroll-course-btn" data-id="${c.id}">Enroll</button>`;
         if (c.is_staff) {
-            actionsHTML = `
+            actionsHTML += `
                 <a href="/staff/courses/edit/${c.id}/" class="btn btn-sm btn-warning">Edit</a>
                 <button class="btn btn-sm btn-danger delete-course-btn" data-id="${c.id}">Delete</button>
             `;
         }
 
+        // List payload only carries an excerpt; the full text is loaded on demand
+        let descriptionHTML = courseDescriptions.get(c.id) || c.description;
+        if (c.description_truncated && !courseDescriptions.has(c.id)) {
+            descriptionHTML += ` <a href="#" class="expand-description-btn" data-id="${c.id}">more</a>`;
+        }
+
         tr.innerHTML = `
             <td>${c.name}</td>
-            <td>${c.description}</td>
+            <td class="description-cell">${descriptionHTML}</td>
             <td>${levelHTML}</td>
             <td>${languagesHTML}</td>
             <td>${actionsHTML}</td>
@@ -95,6 +117,40 @@ function renderCourses(courses) {
         tbody.appendChild(tr);
     });
 
+    // Add event listeners to expand truncated descriptions
+    document.querySelectorAll('.expand-description-btn').forEach(link => {
+        link.addEventListener('click', async (event) => {
+            event.preventDefault();
+            const courseId = Number(link.dataset.id);
+            const detailResp = await fetch(`/courses/${courseId}/`, {
+                headers: { 'x-requested-with': 'XMLHttpRequest' },
+            });
+            if (!detailResp.ok) return;
+
+            const detail = await detailResp.json();
+            courseDescriptions.set(courseId, detail.description);
+            link.closest('.description-cell').textContent = detail.description;
+        });
+    });
+
+    // Enroll, or join the waitlist of a full course
+    document.querySelectorAll('.enroll-course-btn').forEach(btn => {
+        btn.addEventListener('click', async () => {
+            const enrollResp = await fetch(`/courses/${btn.dataset.id}/enroll/`, {
+                method: 'POST',
+                headers: {
+                    'X-CSRFToken': csrftoken,
+                    'X-Requested-With': 'XMLHttpRequest',
+                },
+            });
+            if (!enrollResp.ok) return;
+
+            const { enrollment } = await enrollResp.json();
+            btn.disabled = true;
+            btn.textContent = enrollment.status === 'enrolled' ? 'Enrolled' : `Waitlisted (#${enrollment.position})`;
+        });
+    });
+
     // Add event listeners to delete course buttons (staff only)
     document.querySelectorAll('.delete-course-btn').forEach(btn => {
         btn.addEventListener('click', async () => {
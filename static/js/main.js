@@ -12,6 +12,7 @@ function getCookie(name) {
 const csrftoken = getCookie('csrftoken');
 let currentProjects = [];
 let sortOrder = { column: null, asc: true };
+const projectDescriptions = new Map();
 
 async function fetchProjects() {
     const q = document.getElementById('q')?.value || '';
@@ -27,6 +28,10 @@ async function fetchProjects() {
         url += `&category=${encodeURIComponent(catId)}`;
     });
 
+    document.querySelectorAll('.flag-checkbox:checked').forEach(cb => {
+        url += `&flag=${encodeURIComponent(cb.value)}`;
+    });
+
     const rsp = await fetch(url, {
         headers: { 'x-requested-with': 'XMLHttpRequest' },
         method: 'GET',
@@ -37,6 +42,16 @@ async function fetchProjects() {
     const data = await rsp.json();
     currentProjects = data.projects;
     renderProjects(currentProjects);
+    renderFacets(data.facets);
+}
+
+function renderFacets(facets) {
+    if (!facets) return;
+    document.querySelectorAll('.facet-count').forEach(badge => {
+        const [kind, key] = badge.dataset.facet.split(/-(.*)/);
+        const counts = kind === 'category' ? facets.categories : facets.flags;
+        badge.textContent = counts[key] ?? 0;
+    });
 }
 
 function renderProjects(projects) {
@@ -113,9 +128,15 @@ function renderProjects(projects) {
             }
         }
 
+        // List payload only carries an excerpt; the full text is loaded on demand
+        let descriptionHTML = projectDescriptions.get(p.id) || p.description;
+        if (p.description_truncated && !projectDescriptions.has(p.id)) {
+            descriptionHTML += ` <a href="#" class="expand-description-btn" data-id="${p.id}">more</a>`;
+        }
+
         tr.innerHTML = `
             <td>${p.name}</td>
-            <td>${p.description}</td>
+            <td class="description-cell">${descriptionHTML}</td>
             <td>${categoriesHTML}</td>
             <td>${mentorsHTML}</td>
             <td>${participantsHTML}</td>
@@ -124,6 +145,22 @@ function renderProjects(projects) {
         tbody.appendChild(tr);
     });
 
+    // Add event listeners to expand truncated descriptions
+    document.querySelectorAll('.expand-description-btn').forEach(link => {
+        link.addEventListener('click', async (event) => {
+            event.preventDefault();
+            const projectId = Number(link.dataset.id);
+            const detailResp = await fetch(`/projects/${projectId}/`, {
+                headers: { 'x-requested-with': 'XMLHttpRequest' },
+            });
+            if (!detailResp.ok) return;
+
+            const detail = await detailResp.json();
+            projectDescriptions.set(projectId, detail.description);
+            link.closest('.description-cell').textContent = detail.description;
+        });
+    });
+
     // Add event listeners to apply buttons
     document.querySelectorAll('.apply-btn').forEach(btn => {
         btn.addEventListener('click', async () => {
@@ -291,8 +328,8 @@ if (qInput) {
     });
 }
 
-// Filter by category checkboxes
-document.querySelectorAll('.category-checkbox').forEach(checkbox => {
+// Filter by category and flag checkboxes
+document.querySelectorAll('.category-checkbox, .flag-checkbox').forEach(checkbox => {
     checkbox.addEventListener('change', () => {
         fetchProjects();
     });